@@ -0,0 +1,166 @@
+"""
+Video Frame Extraction Benchmark
+
+Times frame extraction for the video analysis path and reports its peak RSS,
+on real clips or on synthetic 30 s and 60 s 720p and 10 s 4K clips when no
+paths are given:
+
+    python -m benchmarks.video_frames [clip.mp4 ...] [--runs 3]
+
+"seek" is the previous approach (a CAP_PROP_POS_FRAMES seek per target frame
+plus a BGR->RGB->BGR round trip) kept here as the baseline, "grab_all" walks
+every frame with grab(), and "forward" is utils.video_processing.read_frames_forward
+(grab() across short gaps, forward seeks across long ones). "keyframes" is the
+full extract_frames_opencv path: candidate frames scored for scene changes,
+sharpness and near-duplicates, fitted to the frame token budget. "ffmpeg" is the
+single-process rawvideo path that scales frames while decoding (only when ffmpeg
+is on the PATH), used first for videos larger than the frame budget.
+
+Each method runs in a fresh process with its peak RSS (VmHWM, Linux) reset first;
+"decode" is the growth over the RSS before extraction, and "child" is the
+sampled peak RSS of the ffmpeg subprocess.
+"""
+
+import os
+import sys
+import time
+import shutil
+import threading
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.video_processing import extract_frames_opencv, extract_frames_ffmpeg, probe_video_metadata, read_frames_forward
+
+def make_clip(path: str, seconds: int, fps: int = 30, size=(1280, 720)) -> str:
+    """Write a synthetic clip with moving content so frames differ."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    for i in range(seconds * fps):
+        frame = np.roll(background, i * 4, axis=1)
+        cv2.putText(frame, str(i), (100, 300), cv2.FONT_HERSHEY_SIMPLEX, 6, (255, 255, 255), 12)
+        writer.write(frame)
+    writer.release()
+    return path
+
+def extract_seek(path: str):
+    """Baseline: one seek per target frame and an RGB round trip."""
+    cap = cv2.VideoCapture(path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for i in range(10):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(i * frame_count / 10))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(cv2.cvtColor(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), cv2.COLOR_RGB2BGR))
+    cap.release()
+    return frames
+
+def extract_grab_all(path: str):
+    """Walk every frame with grab() and retrieve only the targets."""
+    cap = cv2.VideoCapture(path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    targets = {int(i * frame_count / 10) for i in range(10)}
+    frames = []
+    for index in range(frame_count):
+        if not cap.grab():
+            break
+        if index in targets:
+            frames.append(cap.retrieve()[1])
+    cap.release()
+    return frames
+
+def extract_forward(path: str):
+    cap = cv2.VideoCapture(path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = [frame for _, frame in read_frames_forward(cap, [int(i * frame_count / 10) for i in range(10)])]
+    cap.release()
+    return frames
+
+def extract_keyframes(path: str):
+    return extract_frames_opencv({"file_path": path})
+
+def extract_ffmpeg(path: str):
+    details = {"file_path": path}
+    probe_video_metadata(details)
+    if not details.get("duration_seconds"):
+        # No ffprobe: take the size and duration from OpenCV's container metadata
+        cap = cv2.VideoCapture(path)
+        details["width"] = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        details["height"] = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        details["duration_seconds"] = cap.get(cv2.CAP_PROP_FRAME_COUNT) / cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+    return extract_frames_ffmpeg(details)
+
+METHODS = {"seek": extract_seek, "grab_all": extract_grab_all, "forward": extract_forward, "keyframes": extract_keyframes}
+if shutil.which("ffmpeg"):
+    METHODS["ffmpeg"] = extract_ffmpeg
+
+def _status_mb(pid: int, field: str) -> float:
+    """A memory field of /proc/<pid>/status (e.g. VmRSS, VmHWM) in MB, 0 once the process is gone."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith(field + ":")) / 1024
+    except (OSError, StopIteration):
+        return 0.0
+
+def _watch_children(peaks: dict, stop: threading.Event) -> None:
+    """Sample the high-water RSS of this process's children (the ffmpeg decoder) until stopped."""
+    pid = os.getpid()
+    while not stop.wait(0.02):
+        try:
+            with open(f"/proc/{pid}/task/{pid}/children") as f:
+                children = f.read().split()
+        except OSError:
+            continue
+        for child in children:
+            peaks[child] = max(peaks.get(child, 0.0), _status_mb(int(child), "VmHWM"))
+
+def measure(name: str, clip: str, runs: int):
+    """Run one method in this (fresh) process: frame count, median ms, peak, decode growth and child peak RSS."""
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")  # Reset the peak RSS (VmHWM) to the current RSS
+    baseline = _status_mb(os.getpid(), "VmRSS")
+    child_peaks, stop = {}, threading.Event()
+    watcher = threading.Thread(target=_watch_children, args=(child_peaks, stop))
+    watcher.start()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        frames = METHODS[name](clip)
+        timings.append(time.perf_counter() - start)
+    stop.set()
+    watcher.join()
+    peak = _status_mb(os.getpid(), "VmHWM")
+    return len(frames), statistics.median(timings) * 1000, peak, peak - baseline, max(child_peaks.values(), default=0.0)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("clips", nargs="*", help="Video files (default: synthetic 30 s and 60 s clips)")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    clips = args.clips
+    if not clips:
+        temp_dir = tempfile.mkdtemp()
+        clips = [make_clip(os.path.join(temp_dir, f"clip_{s}s.mp4"), s) for s in (30, 60)]
+        clips.append(make_clip(os.path.join(temp_dir, "clip_10s_4k.mp4"), 10, size=(3840, 2160)))
+
+    context = multiprocessing.get_context("spawn")
+    for clip in clips:
+        print(f"{os.path.basename(clip)}:")
+        for name in METHODS:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                count, median_ms, peak, decode, child = pool.submit(measure, name, clip, args.runs).result()
+            print(f"  {name:<12} {count:>2} frames  median {median_ms:8.1f} ms  "
+                  f"peak RSS {peak:7.1f} MB  decode +{decode:6.1f} MB  child {child:6.1f} MB")
+
+if __name__ == "__main__":
+    main()
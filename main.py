@@ -15,7 +15,7 @@ import shutil
 import pprint
 
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -26,17 +26,26 @@ from utils.prompts import NEW_PROMPT
 from utils import openai_client
 # Updated imports for the refactored modules
 from utils.media_analysis import analyze_media
+from utils.media_validation import validate_files
 from utils.video_processing import extract_frames_and_analyze_video, analyze_frames
 from utils.story_generation import (
     generate_story_from_image,
     generate_story_from_multiple_images, 
-    generate_story_from_video,
-    parse_openai_response
+    generate_story_from_video
 )
 # Import date verification modules
-from utils.date_extraction import extract_date_from_image
+from utils.date_extraction import extract_date_from_image, cascade_stats as date_cascade_stats
 from utils.date_verification import verify_production_date, format_verification_response
-from utils.cost_utils import get_model_cost, USD_TO_THB_RATE
+from utils.claim_pipeline import (
+    build_date_verification_response,
+    build_skipped_assessment,
+    add_total_costs,
+    run_claim_assessment,
+    stream_claim_assessment
+)
+from utils.claim_precheck import run_date_precheck, sign_date_verification, record_avoided_call
+from utils import metrics, rate_limiter, deployment_pool, hedging, request_coalescing, criteria_selection
+from utils.result_cache import result_cache
 
 # --- Configuration & Setup --- 
 
@@ -97,12 +106,6 @@ except Exception as e:
     logger.error(f"Error mounting static files: {e}")
     # This is a warning, but we'll continue as API endpoints may still work
 
-# Dynamically determine cost based on model
-active_model = openai_client.get_active_model()
-model_cost = get_model_cost(active_model)
-INPUT_COST_USD_PER_MILLION = model_cost["input"]
-OUTPUT_COST_USD_PER_MILLION = model_cost["output"]
-
 # --- FastAPI Lifecycle Events ---
 
 @app.on_event("startup")
@@ -110,17 +113,18 @@ async def startup_event():
     """Initialize resources on application startup"""
     logger.info("Application starting up, initializing OpenAI client...")
     try:
-        openai_client.initialize_openai_client()
+        await openai_client.initialize_openai_client()
     except Exception as e:
         logger.error(f"Error initializing OpenAI client: {e}")
-        # The application will continue but may not work correctly
+        # The application will continue; the health probe keeps retrying in the background
+    openai_client.start_health_probes()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on application shutdown"""
     logger.info("Application shutting down, cleaning up resources...")
     try:
-        openai_client.cleanup_client()
+        await openai_client.cleanup_client()
     except Exception as e:
         logger.error(f"Error during cleanup: {e}")
 
@@ -170,6 +174,20 @@ async def read_manual(request: Request):
         logger.exception(f"Error reading manual HTML file: {e}")
         raise HTTPException(status_code=500, detail="Internal server error: Could not load user manual.")
 
+@app.get("/stats/")
+async def get_stats():
+    """Returns process-wide counters for the cost/latency optimizations."""
+    return JSONResponse(content={
+        "counters": metrics.snapshot(),
+        "result_cache": result_cache.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "deployments": deployment_pool.pool.stats(),
+        "hedging": hedging.stats(),
+        "coalescing": {"in_flight": request_coalescing.in_flight_count()},
+        "date_cascade": date_cascade_stats(),
+        "criteria_selection": criteria_selection.stats()
+    })
+
 @app.post("/verify-date/")
 async def verify_date_endpoint(
     file: UploadFile = File(..., description="Image file of bottle label showing production date")
@@ -191,47 +209,15 @@ async def verify_date_endpoint(
         # Extract production date from the image
         extraction_result = await extract_date_from_image(file)
         
-        # Check if extraction was successful
-        if extraction_result["status"] == "ERROR":
-            return JSONResponse(
-                content={
-                    "english": {
-                        "status": "ERROR",
-                        "message": extraction_result["error"]
-                    },
-                    "thai": {
-                        "status": "ข้อผิดพลาด",
-                        "message": f"เกิดข้อผิดพลาดในการดึงข้อมูลวันที่ผลิต: {extraction_result['error']}"
-                    },
-                    "token_usage": extraction_result["token_usage"]
-                }
-            )
-        
-        # Verify the production date
-        verification_result = verify_production_date(extraction_result["production_date"])
-
-        logger.info(f"Verification result: {verification_result}")
-        
-        # Format the response
-        response_data = format_verification_response(verification_result)
-        
-        # Add token usage information to the response
-        response_data["token_usage"] = extraction_result["token_usage"]
-
-        logger.info(f"response data: {response_data}")
+        # Verify the date and format the response (with token usage and costs)
+        response_data = build_date_verification_response(extraction_result)
 
-        # Calculate cost in THB
-        input_tokens = extraction_result["token_usage"]["input_tokens"]
-        output_tokens = extraction_result["token_usage"]["output_tokens"]
-        input_cost_thb = input_tokens * INPUT_COST_USD_PER_MILLION * USD_TO_THB_RATE / 1000000
-        output_cost_thb = output_tokens * OUTPUT_COST_USD_PER_MILLION * USD_TO_THB_RATE / 1000000
-
-        response_data["input_cost_thb"] = input_cost_thb
-        response_data["output_cost_thb"] = output_cost_thb
+        # Sign the result so /claimability/ can trust it without re-checking
+        if response_data["english"]["status"] in ("ELIGIBLE", "INELIGIBLE"):
+            response_data["verification_token"] = sign_date_verification(response_data)
 
         logger.info(f"response data final: {response_data}")
 
-        
         return JSONResponse(content=response_data)
     
     except HTTPException as e:
@@ -255,7 +241,8 @@ async def verify_date_endpoint(
 async def analyze_media_endpoint(
     files: List[UploadFile] = File(..., description="Media files (JPG, PNG images or MP4 video)"),
     prompt: Optional[str] = Form(None), # Make prompt optional
-    date_verification = Form(None, description="Optional date verification result")
+    date_verification: Optional[str] = Form(None, description="Optional date verification result (JSON)"),
+    date_verification_token: Optional[str] = Form(None, description="Optional signed token from /verify-date/")
 ):
     """
     Endpoint to receive media files and an optional prompt for analysis.
@@ -263,69 +250,33 @@ async def analyze_media_endpoint(
     Maximum file size: 10MB per image, 50MB for video.
     
     If date_verification is provided and shows the bottle is ineligible,
-    the damage assessment will be skipped.
+    the damage assessment will be skipped. When a signed verification token
+    from /verify-date/ is sent (as date_verification_token or inside the
+    date_verification JSON), its status is used instead of the client JSON.
     
     Delegates the core logic to the analyze_media function.
     """
     try:
-        # Check if date verification was provided and bottle is ineligible
-        if date_verification and isinstance(date_verification, dict):
-            # Parse the date_verification if it was sent as a JSON string
-            if isinstance(date_verification, str):
-                try:
-                    date_verification = json.loads(date_verification)
-                except json.JSONDecodeError:
-                    logger.error("Invalid JSON in date_verification parameter")
-                    date_verification = None
-            
-            # Check eligibility status
-            status = (date_verification.get("english", {}) or {}).get("status")
-            if status == "INELIGIBLE":
-                # Return early with ineligibility message
-                return JSONResponse(content={
-                    "english": "This bottle is not eligible for claim assessment as it exceeds the 120-day production limit.",
-                    "thai": "ขวดนี้ไม่มีสิทธิ์ได้รับการประเมินการเคลมเนื่องจากเกินกำหนด 120 วันหลังจากวันผลิต",
-                    "date_verification": date_verification
-                })
+        # Parse, validate and (if signed) authenticate the date check once
+        precheck = run_date_precheck(date_verification, date_verification_token)
+        date_verification = precheck.date_verification
+
+        if precheck.is_ineligible:
+            # Skip the paid damage assessment for ineligible bottles
+            record_avoided_call()
+            logger.info(f"Skipping damage assessment for ineligible bottle (token verified: {precheck.verified})")
+            return JSONResponse(content=add_total_costs(build_skipped_assessment(date_verification), date_verification))
         
-        # Pass empty string if prompt is None
         result = await analyze_media(files=files, prompt=NEW_PROMPT) 
 
         logger.info(f"result: {result}")
 
-        # --- Convert date_verification from string to dict if needed ---
-        if date_verification:
-            if isinstance(date_verification, str):
-                try:
-                    date_verification = json.loads(date_verification)
-                except json.JSONDecodeError:
-                    logger.error("Invalid JSON in date_verification parameter")
-                    raise HTTPException(status_code=400, detail="Invalid JSON format for date_verification")
-
-        
         # If we have date verification, include it in the response
         if date_verification:
             result["date_verification"] = date_verification
 
-        input_tokens_damage = result.get("input_tokens", 0)
-        output_tokens_damage = result.get("output_tokens", 0)
-
-        input_tokens_date = date_verification.get("token_usage", {}).get("input_tokens", 0) if date_verification else 0
-        output_tokens_date = date_verification.get("token_usage", {}).get("output_tokens", 0) if date_verification else 0
-
-        total_input_tokens = input_tokens_damage + input_tokens_date
-        total_output_tokens = output_tokens_damage + output_tokens_date
-
-        total_input_cost_thb = total_input_tokens * INPUT_COST_USD_PER_MILLION * USD_TO_THB_RATE / 1_000_000
-        total_output_cost_thb = total_output_tokens * OUTPUT_COST_USD_PER_MILLION * USD_TO_THB_RATE / 1_000_000
-        total_cost_thb = total_input_cost_thb + total_output_cost_thb
-        total_cost_usd = total_cost_thb / USD_TO_THB_RATE
-
-        # Add combined result back
-        result["total_input_tokens"] = total_input_tokens
-        result["total_output_tokens"] = total_output_tokens
-        result["total_cost_thb"] = total_cost_thb
-        result["total_cost_usd"] = total_cost_usd
+        # Add combined token/cost totals for date verification + damage analysis
+        add_total_costs(result, date_verification)
 
 
         logger.info(f"result final: {result}")
@@ -347,6 +298,86 @@ async def analyze_media_endpoint(
         logger.exception("An unexpected error occurred in the /analyze endpoint.")
         raise HTTPException(status_code=500, detail=f"An unexpected server error occurred: {str(e)}")
 
+@app.post("/claims/")
+async def submit_claim_endpoint(
+    label_file: UploadFile = File(..., description="Image file of bottle label showing production date"),
+    files: List[UploadFile] = File(..., description="Damage media files (JPG, PNG images or MP4 video)")
+):
+    """
+    Single-shot claim endpoint: verifies the production date and assesses the damage
+    in one request.
+    
+    Date extraction and damage analysis run concurrently; the damage analysis is
+    cancelled as soon as the date check shows the bottle is not ELIGIBLE.
+    """
+    try:
+        # Validate label file type (only accept images)
+        if not label_file.content_type or not label_file.content_type.startswith('image/'):
+            raise HTTPException(
+                status_code=415, 
+                detail="Unsupported label file type. Please upload an image file (JPG, PNG)."
+            )
+
+        result = await run_claim_assessment(label_file, files)
+
+        logger.info(f"claim result final: {result}")
+
+        return JSONResponse(content=result)
+
+    except HTTPException as e:
+        # Re-raise known HTTP exceptions from analyze_media
+        raise e
+    except OpenAIError as e:
+        logger.error(f"OpenAI API error in claims endpoint: {e}")
+        detail = f"OpenAI API Error: {e.message}" if hasattr(e, 'message') else str(e)
+        status_code = e.status_code if hasattr(e, 'status_code') else 503
+        raise HTTPException(status_code=status_code, detail=detail)
+    except Exception as e:
+        logger.exception("An unexpected error occurred in the /claims endpoint.")
+        raise HTTPException(status_code=500, detail=f"An unexpected server error occurred: {str(e)}")
+
+def _sse(event: Dict[str, Any]) -> str:
+    """Format an event as a Server-Sent Events message (the event type is the SSE event name)."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@app.post("/claims/stream/")
+async def stream_claim_endpoint(
+    label_file: UploadFile = File(..., description="Image file of bottle label showing production date"),
+    files: List[UploadFile] = File(..., description="Damage media files (JPG, PNG images or MP4 video)")
+):
+    """
+    Streaming variant of /claims/ using Server-Sent Events.
+    
+    Emits 'stage' progress events, the 'date_verification' result, 'delta' chunks
+    of the damage assessment text as the model generates it, and a final 'result'
+    event with the same body /claims/ returns. Errors after the stream has started
+    are sent as an 'error' event with status_code and detail.
+    """
+    # Validate before streaming so bad uploads still get a proper HTTP status
+    if not label_file.content_type or not label_file.content_type.startswith('image/'):
+        raise HTTPException(
+            status_code=415, 
+            detail="Unsupported label file type. Please upload an image file (JPG, PNG)."
+        )
+    await validate_files(files)
+
+    async def event_stream():
+        try:
+            async for event in stream_claim_assessment(label_file, files):
+                yield _sse(event)
+        except HTTPException as e:
+            yield _sse({"type": "error", "status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.exception("An unexpected error occurred in the /claims/stream endpoint.")
+            yield _sse({"type": "error", "status_code": 500, "detail": f"An unexpected server error occurred: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so events reach the browser as they are produced
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting Uvicorn server...")
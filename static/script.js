@@ -27,7 +27,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const loadingIndicator = document.getElementById('loading');
     
     // Results content
-    // const englishCaptionP = document.querySelector('#english-caption p');
+    const englishCaptionP = document.querySelector('#english-caption p');
     const thaiCaptionP = document.querySelector('#thai-caption p');
     const inputTokensSpan = document.querySelector('#input-tokens');
     const outputTokensSpan = document.querySelector('#output-tokens');
@@ -154,8 +154,9 @@ document.addEventListener('DOMContentLoaded', function() {
         loadingIndicator.querySelector('p').textContent = i18next.t('date_verification_loading');
     
         try {
-            const dateVerificationResult = await verifyDate();
-            console.log("📦 sending label file:", labelFileInput.files[0]);
+            // Date verification and damage assessment run together on the server
+            const claimResult = await submitClaim();
+            const dateVerificationResult = claimResult.date_verification;
 
             console.log("✅ calling updateDateVerificationUI with:", dateVerificationResult);
             updateDateVerificationUI(dateVerificationResult);
@@ -165,12 +166,9 @@ document.addEventListener('DOMContentLoaded', function() {
             const damageClaimInfo = document.getElementById('damage-claim-info');
             damageClaimInfo.textContent = '❌ ไม่เป็นความเสียหายที่สามารถเคลมได้'
     
-            if (isDateEligible) {
-                loadingIndicator.querySelector('p').textContent = i18next.t('loading');
-                const damageResult = await analyzeDamage(dateVerificationResult);
-    
-                updateDamageResultUI(damageResult);
-                isDamageClaimable = damageResult.claimable === true;
+            if (isDateEligible && !claimResult.damage_assessment_skipped) {
+                updateDamageResultUI(claimResult);
+                isDamageClaimable = claimResult.claimable === true;
                 damageClaimInfo.textContent = isDamageClaimable ? '✅ เป็นความเสียหายที่สามารถเคลมได้' : '❌ ไม่เป็นความเสียหายที่สามารถเคลมได้';
             }
     
@@ -235,7 +233,8 @@ document.addEventListener('DOMContentLoaded', function() {
         claimBadge.classList.add('hidden');
         
         // Clear text content
-        // englishCaptionP.textContent = '...';
+        englishCaptionP.textContent = '...';
+        englishCaptionP.closest('#english-caption').classList.add('hidden');
         thaiCaptionP.textContent = '...';
         inputTokensSpan.textContent = '0';
         outputTokensSpan.textContent = '0';
@@ -271,51 +270,69 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     
-    // Verify date API call
-    async function verifyDate() {
-        const formData = new FormData();
-        formData.append('file', labelFileInput.files[0]); // Send only the first image for date verification
-        
-        const response = await fetch('/verify-date/', {
-            method: 'POST',
-            body: formData
-        });
-        
-        if (!response.ok) {
-            const errorData = await response.json();
-            throw new Error(errorData.english?.message || 'An error occurred during date verification.');
-        }
-        
-        
-        const result = await response.json();
-        console.log("🎯 API /verify-date/ response:", result);
-        return result;
-
-    }
-    
-    // Analyze damage API call
-    async function analyzeDamage(dateVerificationResult) {
+    // Submit claim API call (date verification + damage assessment in one request).
+    // Uses the streaming endpoint so progress, the date check and the assessment
+    // text are rendered as they arrive; resolves with the final /claims/ result.
+    async function submitClaim() {
         const formData = new FormData();
+        formData.append('label_file', labelFileInput.files[0]); // Send only the first image for date verification
         
         // Append each damage file
         for (let i = 0; i < damageFileInput.files.length; i++) {
             formData.append('files', damageFileInput.files[i]);
         }
         
-        // Append date verification data
-        formData.append('date_verification', JSON.stringify(dateVerificationResult));
-        
-        const response = await fetch('/claimability/', {
+        const response = await fetch('/claims/stream/', {
             method: 'POST',
             body: formData
         });
         
         if (!response.ok) {
             const errorData = await response.json();
-            throw new Error(errorData.detail || 'An error occurred during damage assessment.');
+            // 503 DEFERRED responses carry {status, message, retry_after_seconds}
+            const detail = errorData.detail && errorData.detail.message ? errorData.detail.message : errorData.detail;
+            throw new Error(detail || 'An error occurred during claim assessment.');
         }
         
-        return await response.json();
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let streamedText = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            // SSE messages are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const dataLine = message.split('\n').find(line => line.startsWith('data: '));
+                if (!dataLine) continue;
+                const event = JSON.parse(dataLine.slice(6));
+                
+                if (event.type === 'stage') {
+                    loadingIndicator.querySelector('p').textContent = i18next.t(`stage_${event.stage}`);
+                } else if (event.type === 'date_verification') {
+                    updateDateVerificationUI(event.date_verification);
+                } else if (event.type === 'delta') {
+                    // Show the assessment text as the model writes it
+                    streamedText += event.text;
+                    damageResultSection.classList.remove('hidden');
+                    englishCaptionP.closest('#english-caption').classList.remove('hidden');
+                    englishCaptionP.textContent = streamedText;
+                } else if (event.type === 'error') {
+                    const detail = event.detail && event.detail.message ? event.detail.message : event.detail;
+                    throw new Error(detail || 'An error occurred during claim assessment.');
+                } else if (event.type === 'result') {
+                    console.log("🎯 API /claims/stream/ result:", event.result);
+                    return event.result;
+                }
+            }
+        }
+        throw new Error('The connection closed before the claim assessment finished.');
     }
     
     // Update date verification UI
@@ -363,6 +380,10 @@ document.addEventListener('DOMContentLoaded', function() {
     function updateDamageResultUI(result) {
         damageResultSection.classList.remove('hidden');
         console.log(result)
+        if (result.english) {
+            englishCaptionP.closest('#english-caption').classList.remove('hidden');
+            englishCaptionP.textContent = result.english;
+        }
         if (result.thai) {
             document.querySelector('#thai-caption p').textContent = result.thai;
         }
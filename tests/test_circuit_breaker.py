@@ -0,0 +1,84 @@
+"""Tests for the half-open trial handling in utils/circuit_breaker.py."""
+
+import time
+
+import pytest
+
+from utils.circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN, FAILURE_THRESHOLD, TRIAL_TIMEOUT_SECONDS
+)
+from utils.deployment_pool import Deployment, DeploymentPool
+
+def _opened_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test")
+    for _ in range(FAILURE_THRESHOLD):
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    return breaker
+
+def test_trial_claimed_once_cooldown_expires():
+    breaker = _opened_breaker()
+    now = breaker.open_until
+    breaker.before_call(now)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.available(now)
+
+def test_released_trial_is_available_again():
+    breaker = _opened_breaker()
+    now = breaker.open_until
+    trial = breaker.before_call(now)
+    breaker.release_trial(now, trial)
+    assert breaker.state == OPEN
+    assert breaker.available(now)
+
+def test_release_after_resolution_is_a_no_op():
+    breaker = _opened_breaker()
+    now = breaker.open_until
+    trial = breaker.before_call(now)
+    breaker.record_success()
+    breaker.release_trial(now, trial)
+    assert breaker.state == CLOSED
+
+def test_failed_trial_reopens():
+    breaker = _opened_breaker()
+    now = breaker.open_until
+    trial = breaker.before_call(now)
+    breaker.record_failure()
+    breaker.release_trial(now, trial)
+    assert breaker.state == OPEN
+    assert not breaker.available(now)
+
+def test_call_sent_while_closed_claims_no_trial():
+    breaker = CircuitBreaker("test")
+    assert breaker.before_call(0.0) is None
+
+def test_cancelled_non_trial_call_keeps_the_trial():
+    pool = DeploymentPool()
+    deployment = Deployment("primary", object())
+    pool.configure([deployment])
+    # A call starts while closed, then the deployment fails and another call takes the trial
+    _, earlier = pool.choose("gpt-4o")
+    for _ in range(FAILURE_THRESHOLD):
+        pool.record_failure(deployment)
+    breaker = deployment.breaker
+    breaker.open_until = time.monotonic()
+    _, trial = pool.choose("gpt-4o")
+    assert trial is not None
+    # The first call is cancelled: it owns no trial, so a second one must not be allowed
+    pool.release_trial(deployment, earlier)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        pool.choose("gpt-4o")
+    # The trial call itself can still give the trial back
+    pool.release_trial(deployment, trial)
+    assert pool.choose("gpt-4o")[1] is not None
+
+def test_timed_out_trial_cannot_release_its_successor():
+    breaker = _opened_breaker()
+    now = breaker.open_until
+    stale = breaker.before_call(now)
+    later = now + TRIAL_TIMEOUT_SECONDS
+    assert breaker.before_call(later) == later
+    breaker.release_trial(later, stale)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.available(later)
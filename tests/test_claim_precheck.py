@@ -0,0 +1,43 @@
+"""Tests for parsing and authenticating the date check in utils/claim_precheck.py."""
+
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from utils.claim_precheck import parse_date_verification, run_date_precheck, sign_date_verification
+
+def _token(status: str) -> str:
+    return sign_date_verification({"english": {"status": status}, "token_usage": {}})
+
+@pytest.mark.parametrize("english", ["INELIGIBLE", ["INELIGIBLE"], 1])
+def test_non_object_sections_are_rejected(english):
+    with pytest.raises(HTTPException) as excinfo:
+        parse_date_verification(json.dumps({"english": english}))
+    assert excinfo.value.status_code == 400
+    with pytest.raises(HTTPException):
+        parse_date_verification({"thai": english})
+
+@pytest.mark.parametrize("english", ["INELIGIBLE", ["INELIGIBLE"]])
+def test_non_object_sections_are_rejected_with_token(english):
+    raw = json.dumps({"english": english, "verification_token": _token("INELIGIBLE")})
+    with pytest.raises(HTTPException) as excinfo:
+        run_date_precheck(raw)
+    assert excinfo.value.status_code == 400
+
+def test_null_english_without_token_has_no_status():
+    precheck = run_date_precheck(json.dumps({"english": None}))
+    assert precheck.status is None
+
+def test_null_english_with_token_takes_signed_status():
+    precheck = run_date_precheck(json.dumps({"english": None}), _token("INELIGIBLE"))
+    assert precheck.verified and precheck.is_ineligible
+    assert precheck.date_verification["english"] == {"status": "INELIGIBLE"}
+
+def test_missing_english_with_token_takes_signed_status():
+    precheck = run_date_precheck(json.dumps({"thai": {}}), _token("ELIGIBLE"))
+    assert precheck.date_verification["english"]["status"] == "ELIGIBLE"
+
+def test_token_overrides_client_status():
+    raw = json.dumps({"english": {"status": "ELIGIBLE"}})
+    assert run_date_precheck(raw, _token("INELIGIBLE")).status == "INELIGIBLE"
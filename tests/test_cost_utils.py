@@ -0,0 +1,29 @@
+"""Tests for the token cost helpers in utils/cost_utils.py."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from utils.cost_utils import get_cached_tokens, get_input_cost_usd, get_model_cost
+
+def test_uncached_input_cost():
+    assert get_input_cost_usd("gpt-4.1", 1_000_000) == pytest.approx(2.00)
+
+def test_cached_tokens_are_billed_at_the_cached_rate():
+    # 600k uncached at $2.00/M + 400k cached at $0.50/M
+    assert get_input_cost_usd("gpt-4.1", 1_000_000, cached_tokens=400_000) == pytest.approx(1.40)
+
+def test_unknown_model_uses_the_fallback_rate():
+    assert get_model_cost("unknown-model") == {"input": 1.00, "cached_input": 1.00, "output": 1.00}
+    assert get_input_cost_usd("unknown-model", 500_000, cached_tokens=250_000) == pytest.approx(0.50)
+
+@pytest.mark.parametrize("usage, expected", [
+    (SimpleNamespace(input_tokens_details=SimpleNamespace(cached_tokens=1024)), 1024),  # Responses API
+    (SimpleNamespace(prompt_tokens_details=SimpleNamespace(cached_tokens=512)), 512),  # Chat Completions
+    (SimpleNamespace(prompt_tokens_details=SimpleNamespace(cached_tokens=None)), 0),
+    (SimpleNamespace(input_tokens_details=None), 0),
+    (SimpleNamespace(), 0),
+    (None, 0),
+])
+def test_get_cached_tokens(usage, expected):
+    assert get_cached_tokens(usage) == expected
@@ -0,0 +1,69 @@
+"""Tests for the date extraction cascade in utils/date_extraction.py."""
+
+import json
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from utils import date_extraction, metrics
+
+def _response(date_code):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps({"date_code": date_code})))],
+        usage=SimpleNamespace(prompt_tokens=100, completion_tokens=5, prompt_tokens_details=None),
+    )
+
+@pytest.fixture
+def cascade(monkeypatch):
+    """Two tiers; set `answers[model]` to a date code or an exception."""
+    answers = {}
+
+    async def create_chat_completion(model, **kwargs):
+        if isinstance(answers[model], Exception):
+            raise answers[model]
+        return _response(answers[model])
+
+    monkeypatch.setattr(date_extraction.openai_client, "get_date_extraction_models", lambda: ["cheap", "final"])
+    monkeypatch.setattr(date_extraction.openai_client, "create_chat_completion", create_chat_completion)
+    return answers
+
+def _old_code() -> str:
+    # A valid date well outside the plausible window: read correctly but escalated
+    return datetime(datetime.now().year - 3, 5, 7).strftime("%d%m%y")
+
+def test_plausible_cheap_answer_is_accepted(cascade):
+    cascade["cheap"] = datetime.now().strftime("%d%m%y")
+    code, tiers = asyncio.run(date_extraction._run_date_cascade([]))
+    assert code == cascade["cheap"]
+    assert [tier["model"] for tier in tiers] == ["cheap"]
+
+def test_earlier_code_kept_when_final_tier_reads_nothing(cascade):
+    cascade["cheap"], cascade["final"] = _old_code(), None
+    before = metrics.get_counter("date_cascade.cheap.kept_after_escalation")
+    code, tiers = asyncio.run(date_extraction._run_date_cascade([]))
+    assert code == cascade["cheap"]
+    assert len(tiers) == 2
+    assert metrics.get_counter("date_cascade.cheap.kept_after_escalation") == before + 1
+
+def test_earlier_code_kept_when_final_tier_reads_an_invalid_date(cascade):
+    cascade["cheap"], cascade["final"] = _old_code(), "310226"
+    code, _ = asyncio.run(date_extraction._run_date_cascade([]))
+    assert code == cascade["cheap"]
+
+def test_earlier_code_kept_when_final_tier_fails(cascade):
+    cascade["cheap"], cascade["final"] = _old_code(), ValueError("unparseable")
+    code, tiers = asyncio.run(date_extraction._run_date_cascade([]))
+    assert code == cascade["cheap"]
+    assert len(tiers) == 1
+
+def test_final_tier_answer_wins_when_both_read_a_date(cascade):
+    cascade["cheap"], cascade["final"] = _old_code(), datetime(2020, 1, 2).strftime("%d%m%y")
+    code, _ = asyncio.run(date_extraction._run_date_cascade([]))
+    assert code == cascade["final"]
+
+def test_final_tier_error_raised_without_earlier_code(cascade):
+    cascade["cheap"], cascade["final"] = None, ValueError("unparseable")
+    with pytest.raises(ValueError):
+        asyncio.run(date_extraction._run_date_cascade([]))
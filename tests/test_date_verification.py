@@ -0,0 +1,68 @@
+"""Tests for the DDMMYY label code conversion rules in utils/date_verification.py."""
+
+from datetime import datetime
+
+import pytest
+
+from utils.date_verification import apply_year_rules, convert_date_code, is_plausible_date_code, parse_date_code
+
+def test_example_code_converts_to_production_date():
+    assert convert_date_code("070526") == datetime(2025, 5, 7)
+
+@pytest.mark.parametrize("code, expected", [
+    ("150125", datetime(2024, 1, 15)),  # Label year 25 -> 2024, not touched by the rules
+    ("010125", datetime(2024, 1, 1)),
+    ("311224", datetime(2025, 12, 31)),  # Label year 24 -> 2023 -> too old, set to 2025
+    ("290225", datetime(2024, 2, 29)),  # 2024 is a leap year
+])
+def test_valid_codes(code, expected):
+    assert convert_date_code(code) == expected
+
+@pytest.mark.parametrize("year, expected", [
+    (2023, 2025),  # max_year boundary of the "too old" rule
+    (2024, 2024),
+    (2025, 2025),
+    (2026, 2025),  # min_year boundary of the "not produced yet" rule
+    (2030, 2025),
+])
+def test_year_rule_boundaries(year, expected):
+    assert apply_year_rules(year) == expected
+
+def test_custom_year_rules():
+    rules = [{"min_year": 2020, "max_year": 2021, "set_year": 2022}]
+    assert apply_year_rules(2021, rules) == 2022
+    assert apply_year_rules(2019, rules) == 2019
+    assert apply_year_rules(2019, []) == 2019
+
+@pytest.mark.parametrize("code", ["310226", "000000", "320125", "011325", "290226"])
+def test_invalid_calendar_dates(code):
+    with pytest.raises(ValueError):
+        convert_date_code(code)
+
+@pytest.mark.parametrize("code", ["", None, "07052", "0705261", "07O526", "07 05 26"])
+def test_non_six_digit_input(code):
+    with pytest.raises(ValueError):
+        convert_date_code(code)
+
+@pytest.mark.parametrize("text, expected", [
+    ("070526", "070526"),
+    ("Date code: 070526.", "070526"),
+    ("NONE", None),
+    ("", None),
+    (None, None),
+    ("0705261", None),  # 7 digits is not a date code
+    ("12345 070526", "070526"),
+])
+def test_parse_date_code(text, expected):
+    assert parse_date_code(text) == expected
+
+@pytest.mark.parametrize("code, plausible", [
+    ("070526", True),   # Printed 2025-05-07
+    ("070525", True),   # Printed 2024-05-07
+    ("070519", False),  # Printed 2018: misread year, even though the rules would clamp it to 2025
+    ("070599", False),  # Printed 2098: misread year
+    ("310226", False),  # Not a calendar date
+    (None, False),
+])
+def test_plausibility_checks_the_printed_year(code, plausible):
+    assert is_plausible_date_code(code, today=datetime(2025, 9, 1)) == plausible
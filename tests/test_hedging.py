@@ -0,0 +1,57 @@
+"""Tests for hedging slow calls in utils/hedging.py."""
+
+import time
+import asyncio
+
+import pytest
+
+from utils import hedging
+
+@pytest.fixture
+def hedge_after_a_short_delay(monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGING_ENABLED", True)
+    monkeypatch.setattr(hedging, "HEDGE_MIN_DELAY_SECONDS", 0.05)
+    monkeypatch.setattr(hedging, "_trackers", {})
+    tracker = hedging._get_tracker("test")
+    tracker.latencies.extend([0.01] * hedging.HEDGE_MIN_SAMPLES)
+    tracker.hedged.extend([False] * 100)
+
+def test_stalled_call_is_hedged(hedge_after_a_short_delay):
+    delays = iter([1.0, 0.01])
+    cancelled = []
+
+    async def call():
+        delay = next(delays)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    assert asyncio.run(hedging.hedged_call("test", call)) == 0.01
+    assert cancelled == [1.0]
+
+def test_finished_loser_is_discarded(hedge_after_a_short_delay):
+    discarded = []
+    calls = []
+
+    async def call():
+        index = len(calls)
+        calls.append(index)
+        # The primary finishes right after the hedge fires
+        await asyncio.sleep(0.06 if index == 0 else 0.01)
+        return f"stream-{index}"
+
+    async def discard(result):
+        discarded.append(result)
+
+    async def scenario():
+        # Both calls finish before the event loop looks at either
+        hedged = asyncio.create_task(hedging.hedged_call("test", call, discard=discard))
+        await asyncio.sleep(0.055)
+        time.sleep(0.1)  # Block the loop so both calls are done when it resumes
+        return await hedged
+
+    winner = asyncio.run(scenario())
+    assert len(discarded) == 1 and discarded[0] != winner
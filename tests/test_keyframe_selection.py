@@ -0,0 +1,56 @@
+"""Tests for candidate sampling and keyframe selection in utils/keyframe_selection.py."""
+
+import cv2
+import numpy as np
+import pytest
+
+from utils.keyframe_selection import candidate_count, candidate_indices, select_keyframes, KEYFRAME_MAX_CANDIDATES
+
+def _scene(seed: int) -> np.ndarray:
+    """A 640x360 frame of random coloured rectangles on a seed-dependent background."""
+    rng = np.random.default_rng(seed)
+    frame = np.full((360, 640, 3), rng.integers(0, 255, 3), dtype=np.uint8)
+    for _ in range(20):
+        x, y = rng.integers(0, 600), rng.integers(0, 330)
+        cv2.rectangle(frame, (int(x), int(y)), (int(x) + 40, int(y) + 30), [int(c) for c in rng.integers(0, 255, 3)], -1)
+    return frame
+
+def _blurred(frame: np.ndarray) -> np.ndarray:
+    return cv2.GaussianBlur(frame, (21, 21), 0)
+
+@pytest.mark.parametrize("duration, expected", [(5, 20), (10, 20), (60, 30), (3600, KEYFRAME_MAX_CANDIDATES)])
+def test_candidate_count_has_a_floor_and_a_cap(duration, expected):
+    assert candidate_count(duration, min_count=20) == expected
+
+def test_candidate_indices_are_capped_by_frame_count():
+    assert candidate_indices(12, 30, min_count=20) == list(range(12))
+    indices = candidate_indices(300, 30, min_count=20)
+    assert len(indices) == 20 and indices == sorted(indices) and indices[0] == 0 and indices[-1] < 300
+
+def test_sharpest_frame_of_each_scene_is_kept():
+    frames = []
+    for scene in range(3):
+        sharp = _scene(scene)
+        frames += [_blurred(sharp), sharp, _blurred(sharp)]
+    selected, stats = select_keyframes(enumerate(frames), max_frames=10)
+    assert stats["scenes"] == 3
+    assert stats["frame_indices"] == [1, 4, 7]
+    assert all(np.array_equal(frame, frames[i]) for frame, i in zip(selected, stats["frame_indices"]))
+
+def test_repeated_scene_is_dropped_as_duplicate():
+    first, second = _scene(0), _scene(1)
+    _, stats = select_keyframes(enumerate([first, second, first]), max_frames=10)
+    assert stats["scenes"] == 3
+    assert stats["duplicates_dropped"] == 1
+    assert stats["selected"] == 2
+
+def test_selection_fits_the_frame_budget():
+    _, stats = select_keyframes(enumerate(_scene(seed) for seed in range(6)), max_frames=2)
+    assert stats["scenes"] == 6
+    assert stats["selected"] == 2
+    assert stats["frame_indices"] == sorted(stats["frame_indices"])
+
+def test_no_frames():
+    assert select_keyframes(iter([]), max_frames=5) == ([], {
+        "candidates": 0, "scenes": 0, "duplicates_dropped": 0, "selected": 0, "frame_indices": [],
+    })
@@ -0,0 +1,46 @@
+"""Tests for joining calls and releasing inputs in utils/request_coalescing.py."""
+
+import asyncio
+
+from utils import request_coalescing
+
+def test_follower_gets_result_after_leader_leaves():
+    released = []
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return {"answer": 1}
+
+    async def scenario():
+        leader = asyncio.create_task(request_coalescing.run_once("key", call, lambda: released.append("leader")))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(request_coalescing.run_once("key", call, lambda: released.append("follower")))
+        await asyncio.sleep(0)
+        # The follower's inputs are not used by the shared call
+        assert released == ["follower"]
+        leader.cancel()
+        result = await follower
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == {"answer": 1}
+    # The leader's inputs were kept until the shared call finished
+    assert released == ["follower", "leader"]
+    assert request_coalescing.in_flight_count() == 0
+
+def test_abandoned_call_still_releases_inputs():
+    released = []
+
+    async def call():
+        await asyncio.sleep(1)
+
+    async def scenario():
+        leader = asyncio.create_task(request_coalescing.run_once("key", call, lambda: released.append("leader")))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert released == ["leader"]
+    assert request_coalescing.in_flight_count() == 0
@@ -0,0 +1,80 @@
+"""Tests for compact verdict validation (utils/structured_output.py) and rendering (utils/verdict_rendering.py)."""
+
+import copy
+import json
+
+import pytest
+
+from utils.structured_output import VERDICT_SCHEMA, STORY_SCHEMA, PART_CONDITIONS, VERDICT_REASONS, parse_structured
+from utils.verdict_rendering import render_verdict, render_assessment
+
+VERDICT = {
+    "claimable": True,
+    "chang_bottle": True,
+    "cap": {"pass": True, "condition": "sealed"},
+    "neck": {"pass": True, "condition": "intact"},
+    "body": {"pass": True, "condition": "intact"},
+    "bottom": {"pass": True, "condition": "clean_separation"},
+    "reason": "clean_base_separation",
+}
+
+def test_valid_verdict_parses():
+    assert parse_structured(json.dumps(VERDICT), VERDICT_SCHEMA) == VERDICT
+
+def test_extra_keys_are_dropped():
+    verdict = copy.deepcopy(VERDICT)
+    verdict["notes"] = "x"
+    verdict["cap"]["confidence"] = 0.9
+    assert parse_structured(json.dumps(verdict), VERDICT_SCHEMA) == VERDICT
+
+@pytest.mark.parametrize("mutate", [
+    lambda v: v.pop("reason"),
+    lambda v: v.update(reason="because"),
+    lambda v: v.update(claimable="yes"),
+    lambda v: v.update(cap="sealed"),
+    lambda v: v["cap"].pop("pass"),
+    lambda v: v["neck"].pop("condition"),
+    lambda v: v["body"].update(condition="broken"),
+    lambda v: v["bottom"].update({"pass": 1}),
+])
+def test_malformed_verdict_raises_value_error(mutate):
+    verdict = copy.deepcopy(VERDICT)
+    mutate(verdict)
+    with pytest.raises(ValueError):
+        parse_structured(json.dumps(verdict), VERDICT_SCHEMA)
+
+@pytest.mark.parametrize("content", ["", "not json", "[]"])
+def test_non_object_content_raises_value_error(content):
+    with pytest.raises(ValueError):
+        parse_structured(content, STORY_SCHEMA)
+
+def test_render_english():
+    assert render_verdict(VERDICT, "en") == (
+        "**Bottle Assessment:**\n"
+        "✅ Cap: present and tightly closed\n"
+        "✅ Neck: intact\n"
+        "✅ Body: intact\n"
+        "✅ Bottom: detached as one clean piece\n"
+        f"✅ **CLAIM** {json.load(open('static/locales/en.json', encoding='utf-8'))['verdict']['reasons']['clean_base_separation']}"
+    )
+
+def test_not_chang_skips_the_parts():
+    verdict = dict(VERDICT, claimable=False, chang_bottle=False, reason="not_chang")
+    lines = render_verdict(verdict, "en").splitlines()
+    assert len(lines) == 2
+    assert lines[1].startswith("❌ **UNCLAIM**")
+
+@pytest.mark.parametrize("language", ["en", "th"])
+def test_every_code_has_a_template(language):
+    with open(f"static/locales/{language}.json", encoding="utf-8") as f:
+        templates = json.load(f)["verdict"]
+    for part, conditions in PART_CONDITIONS.items():
+        assert set(conditions) <= set(templates["conditions"][part])
+    assert set(VERDICT_REASONS) <= set(templates["reasons"])
+
+def test_render_assessment_fields():
+    assessment = render_assessment(VERDICT)
+    assert assessment["claimable"] is True
+    assert assessment["english"].startswith("**Bottle Assessment:**")
+    assert assessment["thai"].startswith("**ผลการประเมินขวด:**")
+    assert assessment["verdict"] is VERDICT
@@ -0,0 +1,55 @@
+"""Tests for the MP4 'moov' box locator in utils/video_upload.py."""
+
+import struct
+
+import pytest
+
+from utils.video_upload import MoovLocator
+
+def _box(box_type: bytes, payload_size: int) -> bytes:
+    return struct.pack(">I", 8 + payload_size) + box_type + b"\0" * payload_size
+
+def _large_box(box_type: bytes, payload_size: int) -> bytes:
+    """A box with a 64-bit size (size field 1, then the real size after the type)."""
+    return struct.pack(">I", 1) + box_type + struct.pack(">Q", 16 + payload_size) + b"\0" * payload_size
+
+def _feed(data: bytes, chunk_size: int) -> MoovLocator:
+    locator = MoovLocator()
+    for offset in range(0, len(data), chunk_size):
+        locator.feed(offset, data[offset:offset + chunk_size])
+    return locator
+
+FAST_START = _box(b"ftyp", 24) + _box(b"moov", 500) + _box(b"free", 0) + _box(b"mdat", 5000)
+MOOV_AT_END = _box(b"ftyp", 24) + _large_box(b"mdat", 5000) + _box(b"moov", 500)
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 16, 1024, 1 << 20])
+def test_moov_first(chunk_size):
+    locator = _feed(FAST_START, chunk_size)
+    assert locator.done
+    assert locator.moov_end == 32 + 508
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 16, 4096])
+def test_moov_after_a_64_bit_mdat(chunk_size):
+    locator = _feed(MOOV_AT_END, chunk_size)
+    assert locator.moov_end == len(MOOV_AT_END)
+
+def test_moov_header_seen_before_its_body_is_written():
+    # receive_video only probes once `received >= moov_end`
+    written = MOOV_AT_END[:-100]
+    locator = _feed(written, 1024)
+    assert locator.moov_end == len(MOOV_AT_END) > len(written)
+
+def test_moov_not_reached_yet():
+    locator = _feed(MOOV_AT_END[:1000], 64)
+    assert locator.moov_end is None
+    assert not locator.done
+
+def test_box_running_to_end_of_file_stops_the_scan():
+    locator = _feed(_box(b"ftyp", 24) + struct.pack(">I", 0) + b"mdat" + b"\0" * 100, 16)
+    assert locator.done
+    assert locator.moov_end is None
+
+def test_not_an_mp4():
+    locator = _feed(b"\x00\x00\x00\x02garbage" * 10, 16)
+    assert locator.done
+    assert locator.moov_end is None
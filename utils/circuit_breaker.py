@@ -0,0 +1,120 @@
+"""
+Circuit Breaker Utility Module
+
+This module keeps an Azure OpenAI outage from tying up worker slots. Each
+deployment has a breaker:
+- closed: calls flow normally; consecutive failures are counted
+- open: calls are refused immediately (no connect/read timeouts) for a cool-down
+  that doubles on each re-open
+- half-open: once the cool-down expires (or a background probe succeeds), a
+  single trial call is let through; success closes the breaker, failure re-opens it
+
+When every deployment for a model is open, callers get a CircuitOpenError, which
+endpoints return as a 503 "DEFERRED" response with a Retry-After header.
+"""
+
+import os
+import math
+import time
+import logging
+from typing import Dict, Any, Optional
+from fastapi import HTTPException
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+OPEN_BASE_SECONDS = float(os.getenv("CIRCUIT_OPEN_BASE_SECONDS", "30"))
+OPEN_MAX_SECONDS = float(os.getenv("CIRCUIT_OPEN_MAX_SECONDS", "300"))
+TRIAL_TIMEOUT_SECONDS = float(os.getenv("CIRCUIT_TRIAL_TIMEOUT_SECONDS", "60"))  # Allow a new trial if one hangs
+
+class CircuitOpenError(HTTPException):
+    """Raised instead of calling Azure while the circuit for a model is open."""
+
+    def __init__(self, retry_after: float, message: str = "Analysis service is temporarily unavailable."):
+        seconds = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=503,
+            detail={"status": "DEFERRED", "message": f"{message} Please retry in {seconds}s.",
+                    "retry_after_seconds": seconds},
+            headers={"Retry-After": str(seconds)}
+        )
+        self.retry_after = seconds
+
+class CircuitBreaker:
+    """Closed/open/half-open state machine for one deployment."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opens = 0
+        self.open_until = 0.0
+        self.trial_started = 0.0
+
+    def retry_in(self, now: float) -> float:
+        """Seconds until the breaker will let a trial call through (0 if now)."""
+        return max(0.0, self.open_until - now) if self.state == OPEN else 0.0
+
+    def available(self, now: float) -> bool:
+        """Whether a call could be sent now (without claiming the half-open trial)."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return now >= self.open_until
+        return now - self.trial_started >= TRIAL_TIMEOUT_SECONDS
+
+    def before_call(self, now: float) -> Optional[float]:
+        """
+        Claim the trial slot when a call is sent to a recovering deployment.
+
+        Returns:
+            The trial's start time if this call claimed the trial (pass it to
+            release_trial), else None
+        """
+        if self.state != CLOSED and self.available(now):
+            if self.state == OPEN:
+                logger.info(f"Circuit for {self.name} half-open: sending a trial call")
+            self.state = HALF_OPEN
+            self.trial_started = now
+            return now
+        return None
+
+    def release_trial(self, now: float, trial_started: float) -> None:
+        """
+        Give back an unresolved trial (e.g. a cancelled call) so the next call can take it.
+
+        Only the call that claimed the trial (identified by its start time) can
+        release it, so other calls ending during a trial never allow a second one.
+        """
+        if self.state == HALF_OPEN and self.trial_started == trial_started:
+            self.state = OPEN
+            self.open_until = now
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info(f"Circuit for {self.name} closed after a successful call")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opens = 0
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= FAILURE_THRESHOLD:
+            cooldown = min(OPEN_MAX_SECONDS, OPEN_BASE_SECONDS * (2 ** self.opens))
+            self.opens += 1
+            self.state = OPEN
+            self.open_until = time.monotonic() + cooldown
+            logger.warning(f"Circuit for {self.name} opened for {cooldown:.0f}s after "
+                           f"{self.consecutive_failures} consecutive failures")
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "open_for_seconds": round(self.retry_in(now), 1),
+        }
@@ -0,0 +1,226 @@
+"""
+Claim Pipeline Utility Module
+
+This module runs a complete claim assessment for a single submission:
+production date verification from the label image and damage analysis of the
+bottle media. Both vision calls are started together so the total latency is
+roughly that of the slower call rather than their sum.
+"""
+
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, AsyncIterator
+from fastapi import UploadFile
+
+# Import from our utilities
+from utils import metrics
+from utils.prompts import NEW_PROMPT
+from utils.media_analysis import analyze_media, stream_media_analysis
+from utils.date_extraction import extract_date_from_image
+from utils.date_verification import verify_production_date, format_verification_response
+from utils.cost_utils import USD_TO_THB_RATE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def build_date_verification_response(extraction_result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turns a date extraction result into the /verify-date/ response structure.
+
+    Args:
+        extraction_result: The result from extract_date_from_image
+
+    Returns:
+        Dictionary with 'english' and 'thai' sections, token usage and THB costs
+    """
+    if extraction_result["status"] == "ERROR":
+        response_data = {
+            "english": {
+                "status": "ERROR",
+                "message": extraction_result["error"]
+            },
+            "thai": {
+                "status": "ข้อผิดพลาด",
+                "message": f"เกิดข้อผิดพลาดในการดึงข้อมูลวันที่ผลิต: {extraction_result['error']}"
+            }
+        }
+    else:
+        # Verify the production date
+        verification_result = verify_production_date(extraction_result["production_date"])
+        logger.info(f"Verification result: {verification_result}")
+        response_data = format_verification_response(verification_result)
+
+    # Add token usage and cost in THB (each cascade tier is billed at its own model's rates)
+    response_data["token_usage"] = extraction_result["token_usage"]
+    response_data["input_cost_thb"] = extraction_result.get("input_cost_usd", 0) * USD_TO_THB_RATE
+    response_data["output_cost_thb"] = extraction_result.get("output_cost_usd", 0) * USD_TO_THB_RATE
+    if extraction_result.get("cascade"):
+        response_data["models_used"] = [tier["model"] for tier in extraction_result["cascade"]]
+
+    return response_data
+
+def add_total_costs(result: Dict[str, Any], date_verification: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Adds combined token and cost totals (damage analysis + date verification) to a result.
+
+    Args:
+        result: The damage analysis result (modified in place)
+        date_verification: The date verification response, if any
+
+    Returns:
+        The same result dictionary with total_* fields added
+    """
+    input_tokens_damage = result.get("input_tokens", 0)
+    output_tokens_damage = result.get("output_tokens", 0)
+
+    token_usage = (date_verification or {}).get("token_usage", {}) or {}
+    input_tokens_date = token_usage.get("input_tokens", 0)
+    output_tokens_date = token_usage.get("output_tokens", 0)
+
+    total_input_tokens = input_tokens_damage + input_tokens_date
+    total_output_tokens = output_tokens_damage + output_tokens_date
+
+    # Each part carries its own cost (model rates, cached prompt discount, triage, cascade tiers)
+    total_input_cost_thb = (result.get("input_cost_usd", 0) * USD_TO_THB_RATE
+                            + (date_verification or {}).get("input_cost_thb", 0))
+    total_output_cost_thb = (result.get("output_cost_usd", 0) * USD_TO_THB_RATE
+                             + (date_verification or {}).get("output_cost_thb", 0))
+    total_cost_thb = total_input_cost_thb + total_output_cost_thb
+
+    result["total_input_tokens"] = total_input_tokens
+    result["total_output_tokens"] = total_output_tokens
+    result["total_cost_thb"] = total_cost_thb
+    result["total_cost_usd"] = total_cost_thb / USD_TO_THB_RATE
+    return result
+
+def build_skipped_assessment(date_verification: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the response returned when damage assessment is skipped because the
+    bottle failed the production date check.
+
+    Args:
+        date_verification: The date verification response
+
+    Returns:
+        Dictionary with 'english', 'thai', 'claimable' and the date verification
+    """
+    status = (date_verification.get("english", {}) or {}).get("status")
+    if status == "INELIGIBLE":
+        english = "This bottle is not eligible for claim assessment as it exceeds the 120-day production limit."
+        thai = "ขวดนี้ไม่มีสิทธิ์ได้รับการประเมินการเคลมเนื่องจากเกินกำหนด 120 วันหลังจากวันผลิต"
+    else:
+        english = "Damage assessment was skipped because the production date could not be verified."
+        thai = "ข้ามการประเมินความเสียหายเนื่องจากไม่สามารถตรวจสอบวันที่ผลิตได้"
+
+    return {
+        "english": english,
+        "thai": thai,
+        "claimable": False,
+        "damage_assessment_skipped": True,
+        "date_verification": date_verification
+    }
+
+async def run_claim_assessment(label_file: UploadFile, files: List[UploadFile]) -> Dict[str, Any]:
+    """
+    Runs date extraction and damage analysis concurrently for one claim.
+
+    The damage analysis is cancelled as soon as the date check comes back as
+    anything other than ELIGIBLE, so ineligible bottles stop consuming the
+    damage model's time.
+
+    Args:
+        label_file: Image of the bottle label showing the production date
+        files: Damage media files (images or a single video)
+
+    Returns:
+        Combined result with damage analysis, date verification and cost totals
+
+    Raises:
+        HTTPException: Propagated from analyze_media on validation or API errors
+    """
+    date_task = asyncio.create_task(extract_date_from_image(label_file))
+    damage_task = asyncio.create_task(analyze_media(files=files, prompt=NEW_PROMPT))
+
+    try:
+        extraction_result = await date_task
+        date_verification = build_date_verification_response(extraction_result)
+
+        status = (date_verification.get("english", {}) or {}).get("status")
+        if status != "ELIGIBLE":
+            logger.info(f"Date check returned {status}. Cancelling damage analysis.")
+            if damage_task.cancel():
+                metrics.increment("claims.damage_calls_cancelled")
+            return add_total_costs(build_skipped_assessment(date_verification), date_verification)
+
+        result = await damage_task
+        result["date_verification"] = date_verification
+        return add_total_costs(result, date_verification)
+
+    finally:
+        # Never leave the damage call running if we exit early (error or ineligible)
+        for task in (date_task, damage_task):
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(date_task, damage_task, return_exceptions=True)
+
+async def stream_claim_assessment(label_file: UploadFile, files: List[UploadFile]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of run_claim_assessment for progressive rendering.
+
+    The date check and the streamed damage analysis run concurrently as in
+    run_claim_assessment. Damage progress is buffered until the date check
+    returns, then relayed live; an ineligible date cancels the damage analysis.
+
+    Args:
+        label_file: Image of the bottle label showing the production date
+        files: Damage media files (already validated)
+
+    Yields:
+        {"type": "date_verification", ...}, then the stage/delta events of
+        stream_media_analysis, then {"type": "result", "result": ...} with the
+        same combined result as run_claim_assessment
+
+    Raises:
+        HTTPException: Propagated from the date check or damage analysis
+    """
+    events: "asyncio.Queue" = asyncio.Queue()
+
+    async def pump_damage_events() -> None:
+        try:
+            async for event in stream_media_analysis(files, NEW_PROMPT):
+                await events.put(event)
+        except Exception as e:
+            await events.put({"type": "error", "error": e})
+
+    date_task = asyncio.create_task(extract_date_from_image(label_file))
+    damage_task = asyncio.create_task(pump_damage_events())
+
+    try:
+        yield {"type": "stage", "stage": "date_check"}
+        date_verification = build_date_verification_response(await date_task)
+        yield {"type": "date_verification", "date_verification": date_verification}
+
+        status = (date_verification.get("english", {}) or {}).get("status")
+        if status != "ELIGIBLE":
+            logger.info(f"Date check returned {status}. Cancelling damage analysis.")
+            if damage_task.cancel():
+                metrics.increment("claims.damage_calls_cancelled")
+            yield {"type": "result", "result": add_total_costs(build_skipped_assessment(date_verification), date_verification)}
+            return
+
+        while True:
+            event = await events.get()
+            if event["type"] == "error":
+                raise event["error"]
+            if event["type"] == "result":
+                result = event["result"]
+                result["date_verification"] = date_verification
+                yield {"type": "result", "result": add_total_costs(result, date_verification)}
+                return
+            yield event
+
+    finally:
+        for task in (date_task, damage_task):
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(date_task, damage_task, return_exceptions=True)
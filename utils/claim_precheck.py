@@ -0,0 +1,184 @@
+"""
+Claim Pre-check Utility Module
+
+This module gates the paid damage assessment on the production date check.
+The date verification result sent by the client is parsed and validated once,
+and can be authenticated with a signed token issued by /verify-date/ so the
+server does not have to trust client-supplied JSON.
+"""
+
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+import logging
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+from fastapi import HTTPException
+
+from utils import metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+DATE_TOKEN_TTL_SECONDS = int(os.getenv("DATE_TOKEN_TTL_SECONDS", "3600"))
+REQUIRE_SIGNED_DATE_VERIFICATION = os.getenv("REQUIRE_SIGNED_DATE_VERIFICATION", "false").lower() == "true"
+VALID_STATUSES = ("ELIGIBLE", "INELIGIBLE", "ERROR")
+
+_secret = os.getenv("DATE_TOKEN_SECRET")
+if not _secret:
+    # Tokens signed with a per-process secret only verify on the same worker
+    logger.warning("DATE_TOKEN_SECRET is not set. Using a random per-process secret for date verification tokens.")
+    _secret = secrets.token_hex(32)
+DATE_TOKEN_SECRET = _secret.encode("utf-8")
+
+@dataclass
+class DatePrecheck:
+    """Outcome of the date pre-check for one damage assessment request."""
+    status: Optional[str]
+    date_verification: Optional[Dict[str, Any]]
+    verified: bool = False
+
+    @property
+    def is_ineligible(self) -> bool:
+        return self.status == "INELIGIBLE"
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(payload: bytes) -> str:
+    return _b64encode(hmac.new(DATE_TOKEN_SECRET, payload, hashlib.sha256).digest())
+
+def sign_date_verification(date_verification: Dict[str, Any]) -> str:
+    """
+    Issue a signed token for a date verification response.
+
+    Args:
+        date_verification: The /verify-date/ response (with 'english' and 'token_usage')
+
+    Returns:
+        Token string in the form "<payload>.<signature>"
+    """
+    english = date_verification.get("english", {}) or {}
+    payload = {
+        "status": english.get("status"),
+        "production_date": english.get("production_date"),
+        "days_elapsed": english.get("days_elapsed"),
+        "token_usage": date_verification.get("token_usage", {}),
+        "input_cost_thb": date_verification.get("input_cost_thb", 0),
+        "output_cost_thb": date_verification.get("output_cost_thb", 0),
+        "iat": int(time.time()),
+    }
+    encoded = _b64encode(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    return f"{encoded}.{_sign(encoded.encode('ascii'))}"
+
+def verify_date_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a token issued by sign_date_verification.
+
+    Args:
+        token: The token string
+
+    Returns:
+        The signed payload, or None if the token is malformed, forged or expired
+    """
+    try:
+        encoded, signature = token.split(".", 1)
+        if not hmac.compare_digest(signature, _sign(encoded.encode("ascii"))):
+            return None
+        payload = json.loads(_b64decode(encoded))
+    except (ValueError, UnicodeError):
+        return None
+
+    if time.time() - payload.get("iat", 0) > DATE_TOKEN_TTL_SECONDS:
+        return None
+    return payload
+
+def parse_date_verification(raw: Optional[Any]) -> Optional[Dict[str, Any]]:
+    """
+    Parse the date_verification form field into a dictionary.
+
+    Args:
+        raw: The form value (JSON string) or an already-parsed dict
+
+    Returns:
+        The parsed dictionary, or None if nothing was sent
+
+    Raises:
+        HTTPException: If the value is not a valid JSON object, or its
+            'english'/'thai' sections are not objects
+    """
+    if not raw:
+        return None
+    if isinstance(raw, dict):
+        parsed = raw
+    else:
+        try:
+            parsed = json.loads(raw)
+        except (TypeError, json.JSONDecodeError):
+            logger.error("Invalid JSON in date_verification parameter")
+            raise HTTPException(status_code=400, detail="Invalid JSON format for date_verification")
+    if not isinstance(parsed, dict):
+        raise HTTPException(status_code=400, detail="date_verification must be a JSON object")
+    for section in ("english", "thai"):
+        if parsed.get(section) is not None and not isinstance(parsed[section], dict):
+            raise HTTPException(status_code=400, detail=f"date_verification.{section} must be a JSON object")
+    return parsed
+
+def run_date_precheck(raw_date_verification: Optional[Any], token: Optional[str] = None) -> DatePrecheck:
+    """
+    Parse, validate and (when a token is available) authenticate the date check.
+
+    The token may be sent as its own form field or inside the date_verification
+    JSON as 'verification_token'. A valid token is authoritative: its status,
+    token usage and cost replace the client-supplied values.
+
+    Args:
+        raw_date_verification: The date_verification form value
+        token: Optional signed token from /verify-date/
+
+    Returns:
+        DatePrecheck describing the eligibility status
+
+    Raises:
+        HTTPException: On invalid JSON, an invalid/expired token, or a missing
+            token when REQUIRE_SIGNED_DATE_VERIFICATION is enabled
+    """
+    date_verification = parse_date_verification(raw_date_verification)
+    token = token or (date_verification or {}).get("verification_token")
+
+    if token:
+        payload = verify_date_token(token)
+        if payload is None:
+            raise HTTPException(status_code=400, detail="Invalid or expired date verification token")
+        date_verification = date_verification or {"english": {}, "thai": {}}
+        if date_verification.get("english") is None:
+            date_verification["english"] = {}
+        date_verification["english"]["status"] = payload["status"]
+        date_verification["token_usage"] = payload.get("token_usage", {})
+        date_verification["input_cost_thb"] = payload.get("input_cost_thb", 0)
+        date_verification["output_cost_thb"] = payload.get("output_cost_thb", 0)
+        return DatePrecheck(status=payload["status"], date_verification=date_verification, verified=True)
+
+    if REQUIRE_SIGNED_DATE_VERIFICATION:
+        raise HTTPException(status_code=400, detail="A signed date verification token is required")
+
+    if date_verification is None:
+        return DatePrecheck(status=None, date_verification=None)
+
+    status = (date_verification.get("english", {}) or {}).get("status")
+    if status not in VALID_STATUSES:
+        logger.warning(f"Unrecognised date verification status: {status}")
+        status = None
+    return DatePrecheck(status=status, date_verification=date_verification)
+
+def record_avoided_call() -> None:
+    """Record that a paid damage assessment call was skipped by the pre-check."""
+    metrics.increment("precheck.paid_calls_avoided")
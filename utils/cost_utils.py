@@ -1,21 +1,32 @@
 # utils/cost_utils.py
 
-# Model token cost per 1M tokens from Azure OpenAI Pricing (as of 2025-04)
+# Model token cost per 1M tokens from Azure OpenAI Pricing (as of 2025-04).
+# "cached_input" is the discounted rate for prompt-prefix tokens served from the provider's cache.
 MODEL_COSTS = {
-    "gpt-4.1": {"input": 2.00, "output": 8.00},
-    "gpt-4.1-mini": {"input": 0.40, "output": 1.60},
-    "gpt-4.1-nano": {"input": 0.10, "output": 0.40},
-    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
-    "gpt-4.5-preview": {"input": 75.00, "output": 150.00},
-    "o3": {"input": 10.00, "output": 40.00},
-    "o3-mini": {"input": 1.10, "output": 4.40},
-    "o1": {"input": 15.00, "output": 60.00},
-    "o1-mini": {"input": 1.10, "output": 4.40},
-    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+    "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+    "gpt-4.1-nano": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4.5-preview": {"input": 75.00, "cached_input": 37.50, "output": 150.00},
+    "o3": {"input": 10.00, "cached_input": 2.50, "output": 40.00},
+    "o3-mini": {"input": 1.10, "cached_input": 0.55, "output": 4.40},
+    "o1": {"input": 15.00, "cached_input": 7.50, "output": 60.00},
+    "o1-mini": {"input": 1.10, "cached_input": 0.55, "output": 4.40},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
 }
 
 # Exchange rate for conversion
 USD_TO_THB_RATE = 35.0
 
 def get_model_cost(model_name: str):
-    return MODEL_COSTS.get(model_name, {"input": 1.00, "output": 1.00})  # Fallback default 
\ No newline at end of file
+    return MODEL_COSTS.get(model_name, {"input": 1.00, "cached_input": 1.00, "output": 1.00})  # Fallback default
+
+def get_input_cost_usd(model_name: str, input_tokens: int, cached_tokens: int = 0) -> float:
+    """Input cost in USD, billing the cached part of the prompt at the discounted rate."""
+    cost = get_model_cost(model_name)
+    return ((input_tokens - cached_tokens) * cost["input"] + cached_tokens * cost["cached_input"]) / 1_000_000
+
+def get_cached_tokens(usage) -> int:
+    """Cached prompt tokens from a Responses (input_tokens_details) or Chat Completions (prompt_tokens_details) usage."""
+    details = getattr(usage, "input_tokens_details", None) or getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", 0) or 0 
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Criteria Selection Utility Module
+
+This module shrinks the damage assessment prompt by sending only the claim and
+unclaim criteria relevant to a case. The numbered criteria blocks in
+utils/prompts.py are indexed in-process as TF-IDF keyword vectors (numpy); the
+triage answers (break location, shattering, spillage) form the query, and the
+best-matching blocks of each list go into the prompt. A given set of blocks
+always renders the same prompt text, so provider-side prompt caching still applies.
+
+To check that accuracy holds, a sample of selected-criteria assessments is
+re-run with the full prompt in the background and the verdicts are compared.
+Per-mode token, latency and agreement totals are reported at /stats/.
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Set, Tuple
+import numpy as np
+
+# Import from our utilities
+from utils import metrics
+from utils.openai_client import estimate_request_tokens
+from utils.prompts import CLAIM_CRITERIAS, UNCLAIM_CRITERIAS, NEW_PROMPT, build_assessment_prompt
+from utils.story_generation import generate_story_from_multiple_images
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+CRITERIA_SELECTION_ENABLED = os.getenv("CRITERIA_SELECTION_ENABLED", "false").lower() == "true"
+CRITERIA_TOP_K = int(os.getenv("CRITERIA_TOP_K", "5"))  # Blocks kept from each list
+CRITERIA_SHADOW_RATE = float(os.getenv("CRITERIA_SHADOW_RATE", "0.1"))  # Share re-run with the full prompt
+CRITERIA_MODE = "selected" if CRITERIA_SELECTION_ENABLED else "full"
+
+# Query terms for each triage answer; answers not listed (e.g. "unsure") add nothing
+SIGNAL_TERMS = {
+    ("break_location", "neck"): "neck shoulder detached cap sealed",
+    ("break_location", "body"): "main body cracks label structurally compromised",
+    ("break_location", "base"): "base bottom separation clean",
+    ("shattered", "yes"): "shattering fragmentation fragments shards small pieces splinters",
+    ("shattered", "no"): "clean separation large pieces",
+    ("spillage", "yes"): "spillage liquid residue stains full pressurized",
+}
+
+# Background shadow comparisons (kept referenced until they finish)
+_shadow_tasks: Set["asyncio.Task"] = set()
+
+def _split_blocks(criteria: str) -> List[str]:
+    """Split a numbered criteria list into its items (each with its sub-points)."""
+    return [block.strip("\n") for block in re.split(r"\n(?=\d+\.\t)", criteria) if block.strip()]
+
+def _terms(text: str) -> List[str]:
+    """Lower-case words with a plural 's' stripped, so 'shards' matches 'shard'."""
+    return [word[:-1] if len(word) > 3 and word.endswith("s") else word for word in re.findall(r"[a-z]+", text.lower())]
+
+class CriteriaIndex:
+    """TF-IDF keyword vectors for the blocks of one criteria list."""
+
+    def __init__(self, criteria: str):
+        self.blocks = _split_blocks(criteria)
+        documents = [_terms(block) for block in self.blocks]
+        self.vocabulary = {term: i for i, term in enumerate(sorted({t for doc in documents for t in doc}))}
+
+        counts = np.zeros((len(documents), len(self.vocabulary)))
+        for row, doc in enumerate(documents):
+            for term in doc:
+                counts[row, self.vocabulary[term]] += 1
+        self.idf = np.log((1 + len(documents)) / (1 + (counts > 0).sum(axis=0))) + 1
+        vectors = counts * self.idf
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def top(self, query: str, k: int) -> Tuple[int, ...]:
+        """Indices of the k best-matching blocks (in list order), ignoring non-matches."""
+        query_vector = np.zeros(len(self.vocabulary))
+        for term in _terms(query):
+            if term in self.vocabulary:
+                query_vector[self.vocabulary[term]] += self.idf[self.vocabulary[term]]
+        scores = self.vectors @ query_vector
+        best = [i for i in np.argsort(-scores, kind="stable")[:k] if scores[i] > 0]
+        return tuple(sorted(int(i) for i in best))
+
+claim_index = CriteriaIndex(CLAIM_CRITERIAS)
+unclaim_index = CriteriaIndex(UNCLAIM_CRITERIAS)
+
+@lru_cache(maxsize=256)
+def _render_prompt(claim: Tuple[int, ...], unclaim: Tuple[int, ...]) -> str:
+    """The assessment prompt with only the given blocks (same text for the same blocks)."""
+    claim_text = "\n" + "\n".join(claim_index.blocks[i] for i in claim) + "\n"
+    unclaim_text = "\n" + "\n".join(unclaim_index.blocks[i] for i in unclaim) + "\n"
+    return build_assessment_prompt(claim_text, unclaim_text)
+
+def _block_numbers(index: CriteriaIndex, selected: Tuple[int, ...]) -> List[str]:
+    return [index.blocks[i].split(".", 1)[0] for i in selected]
+
+def select_assessment_prompt(triage: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Choose the assessment instructions for a claim from its triage answers.
+
+    Args:
+        triage: Result of triage_images, or None if triage did not run
+
+    Returns:
+        Tuple of the instructions and a description of the selection
+        ({"mode": "full"} when selection is disabled or there are no usable signals)
+    """
+    query = " ".join(SIGNAL_TERMS.get((key, value), "") for key, value in (triage or {}).items()).strip()
+    if not CRITERIA_SELECTION_ENABLED or not query:
+        return NEW_PROMPT, {"mode": "full"}
+
+    claim = claim_index.top(query, CRITERIA_TOP_K)
+    unclaim = unclaim_index.top(query, CRITERIA_TOP_K)
+    selection = {
+        "mode": "selected",
+        "claim_criteria": _block_numbers(claim_index, claim),
+        "unclaim_criteria": _block_numbers(unclaim_index, unclaim),
+    }
+    logger.info(f"Selected criteria for query {query!r}: {selection}")
+    return _render_prompt(claim, unclaim), selection
+
+def record_assessment(instructions: str, selection: Dict[str, Any], result: Dict[str, Any], request_ms: float,
+                      base64_images: List[str], detail: str) -> None:
+    """
+    Record an assessment's prompt size, tokens and latency under its mode, and
+    schedule a full-prompt shadow comparison for a sample of selected ones.
+
+    Args:
+        instructions: The instructions that were sent
+        selection: The selection returned by select_assessment_prompt
+        result: The assessment result (the selection is added under 'criteria')
+        request_ms: Time taken by the model call
+        base64_images: The images that were assessed (for the shadow re-run)
+        detail: Vision detail level that was used
+    """
+    mode = selection["mode"]
+    result["criteria"] = selection
+    metrics.increment(f"criteria.{mode}.requests")
+    metrics.increment(f"criteria.{mode}.prompt_tokens", estimate_request_tokens(instructions))
+    metrics.increment(f"criteria.{mode}.input_tokens", result.get("input_tokens", 0))
+    metrics.increment(f"criteria.{mode}.request_ms", request_ms)
+
+    if mode == "selected" and random.random() < CRITERIA_SHADOW_RATE:
+        task = asyncio.create_task(_shadow_compare(base64_images, detail, result.get("claimable")))
+        _shadow_tasks.add(task)
+        task.add_done_callback(_shadow_tasks.discard)
+
+async def _shadow_compare(base64_images: List[str], detail: str, claimable: Optional[bool]) -> None:
+    """Re-run an assessment with the full prompt and count whether the verdicts agree."""
+    try:
+        start = time.perf_counter()
+        full_result = await generate_story_from_multiple_images(base64_images, NEW_PROMPT, detail=detail)
+        request_ms = round((time.perf_counter() - start) * 1000, 1)
+    except Exception as e:
+        logger.warning(f"Full-prompt shadow comparison failed: {e}")
+        metrics.increment("criteria.shadow.errors")
+        return
+
+    metrics.increment("criteria.shadow.requests")
+    metrics.increment("criteria.shadow.input_tokens", full_result.get("input_tokens", 0))
+    metrics.increment("criteria.shadow.request_ms", request_ms)
+    agree = full_result.get("claimable") == claimable
+    metrics.increment("criteria.shadow.agree" if agree else "criteria.shadow.disagree")
+    if not agree:
+        logger.warning(f"Selected-criteria verdict ({claimable}) differs from the full prompt ({full_result.get('claimable')})")
+
+def stats() -> Dict[str, Any]:
+    """
+    Summarizes prompt size, input tokens and latency per mode, and shadow agreement.
+
+    Returns:
+        Dictionary with the active mode, per-mode means and the verdict agreement rate
+    """
+    summary: Dict[str, Any] = {"mode": CRITERIA_MODE}
+    for mode in ("full", "selected", "shadow"):
+        requests = metrics.get_counter(f"criteria.{mode}.requests")
+        summary[mode] = {
+            "requests": requests,
+            "mean_prompt_tokens": round(metrics.get_counter(f"criteria.{mode}.prompt_tokens") / requests, 1) if requests else None,
+            "mean_input_tokens": round(metrics.get_counter(f"criteria.{mode}.input_tokens") / requests, 1) if requests else None,
+            "mean_request_ms": round(metrics.get_counter(f"criteria.{mode}.request_ms") / requests, 1) if requests else None,
+        }
+    del summary["shadow"]["mean_prompt_tokens"]
+    compared = metrics.get_counter("criteria.shadow.agree") + metrics.get_counter("criteria.shadow.disagree")
+    summary["shadow"]["agreement_rate"] = round(metrics.get_counter("criteria.shadow.agree") / compared, 4) if compared else None
+    return summary
@@ -5,26 +5,154 @@ This module handles the extraction of production dates from Chang beer bottle la
 using OpenAI's vision model.
 """
 
+import os
+import time
+import asyncio
 import logging
 import base64
-from typing import Dict, Any, Optional, List
+import hashlib
+from typing import Dict, Any, Optional, List, Tuple
 from fastapi import UploadFile, HTTPException
-from openai import OpenAIError, APIStatusError
+from openai import OpenAIError
 
 # Import from our utilities
-from utils import openai_client
-from utils.prompts import DATE_EXTRACTION_PROMPT, DATE_EXTRACTION_PROMPT_O4
+from utils import openai_client, metrics
+from utils.circuit_breaker import CircuitOpenError
+from utils.prompts import DATE_CODE_PROMPT
+from utils.structured_output import DATE_CODE_SCHEMA, chat_response_format, parse_with_repair
+from utils.date_verification import parse_date_code, is_plausible_date_code, convert_date_code
 from utils.media_validation import validate_files
-from utils.cost_utils import get_model_cost, USD_TO_THB_RATE
+from utils.cost_utils import get_model_cost, get_input_cost_usd, get_cached_tokens
+from utils.image_preprocess import VISION_BUDGETS, fit_image_to_budget, preprocess_image_for_llm
+from utils.result_cache import CACHE_ENABLED, result_cache, make_cache_key, mark_cache_hit
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Dynamically determine cost based on model
-active_model = openai_client.get_active_model()
-model_cost = get_model_cost(active_model)
-INPUT_COST_USD_PER_MILLION = model_cost["input"]
-OUTPUT_COST_USD_PER_MILLION = model_cost["output"]
+# The model only returns {"date_code": "DDMMYY"} (or null), so a tiny output budget suffices
+DATE_CODE_MAX_TOKENS = 16
+
+# Which label payload to send: "processed" (cropped/enlarged label) or "original"
+DATE_IMAGE_MODE = os.getenv("DATE_IMAGE_MODE", "processed").lower()
+
+def _candidate_rank(code: Optional[str]) -> int:
+    """Rank a tier's date code: 2 if it converts to a date, 1 if merely present, 0 if None."""
+    if code is None:
+        return 0
+    try:
+        convert_date_code(code)
+    except ValueError:
+        return 1
+    return 2
+
+async def _run_date_cascade(messages: List[Dict[str, Any]]) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """
+    Reads the date code with each cascade tier in turn until one passes local validation.
+
+    A tier that fails (e.g. its model is not deployed or its circuit is open) is
+    skipped. If no tier passes, the last tier's answer is returned so date
+    verification can report the problem, unless an earlier tier read a better
+    code (see _candidate_rank) or the last tier failed outright; then the best
+    earlier code is kept.
+
+    Args:
+        messages: Chat messages with the prompt and label image
+
+    Returns:
+        Tuple of the date code (or None) and the per-tier results
+
+    Raises:
+        OpenAIError / CircuitOpenError: If the last tier's call fails and no earlier tier read a code
+        ValueError: If the last tier's answer does not match the schema after a repair call
+            and no earlier tier read a code
+    """
+    models = openai_client.get_date_extraction_models()
+    cascade: List[Dict[str, Any]] = []
+    date_code = None
+    # Best code read by an escalated (non-final) tier, and that tier's model
+    candidate, candidate_model = None, None
+
+    for index, model in enumerate(models):
+        is_last_tier = index == len(models) - 1
+        request_start = time.perf_counter()
+        try:
+            response = await openai_client.create_chat_completion(
+                model=model,
+                messages=messages,
+                max_completion_tokens=DATE_CODE_MAX_TOKENS,
+                response_format=chat_response_format("date_code", DATE_CODE_SCHEMA),
+            )
+            response_text = (response.choices[0].message.content or "").strip()
+            answer, repair_input, repair_output = await parse_with_repair(
+                response_text, "date_code", DATE_CODE_SCHEMA, model
+            )
+        except (OpenAIError, CircuitOpenError, ValueError) as e:
+            if is_last_tier and candidate is None:
+                raise
+            metrics.increment(f"date_cascade.{model}.errors")
+            if is_last_tier:
+                logger.warning(f"Last date extraction tier {model} failed ({type(e).__name__}).")
+                date_code = None
+                break
+            logger.warning(f"Date extraction tier {model} failed ({type(e).__name__}). Escalating.")
+            continue
+        request_ms = round((time.perf_counter() - request_start) * 1000, 1)
+
+        date_code = parse_date_code(answer["date_code"])
+        accepted = is_plausible_date_code(date_code)
+        input_tokens = response.usage.prompt_tokens + repair_input
+        output_tokens = response.usage.completion_tokens + repair_output
+        tier = {
+            "model": model,
+            "answer": response_text,
+            "accepted": accepted,
+            "request_ms": request_ms,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "input_cost_usd": get_input_cost_usd(model, input_tokens, get_cached_tokens(response.usage)),
+            "output_cost_usd": output_tokens * get_model_cost(model)["output"] / 1_000_000,
+        }
+        cascade.append(tier)
+        logger.info(f"Date extraction tier {model}: {response_text!r} (accepted={accepted}, {request_ms}ms)")
+
+        metrics.increment(f"date_cascade.{model}.requests")
+        metrics.increment(f"date_cascade.{model}.request_ms", request_ms)
+        metrics.increment(f"date_cascade.{model}.cost_usd", tier["input_cost_usd"] + tier["output_cost_usd"])
+        if accepted:
+            metrics.increment(f"date_cascade.{model}.accepted")
+            break
+        if not is_last_tier:
+            metrics.increment(f"date_cascade.{model}.escalated")
+            if _candidate_rank(date_code) > _candidate_rank(candidate):
+                candidate, candidate_model = date_code, model
+
+    # No tier passed: the last tier gave nothing better than an escalated tier's code
+    if candidate is not None and _candidate_rank(candidate) > _candidate_rank(date_code):
+        logger.info(f"Last date extraction tier gave no usable code. Keeping {candidate!r} from {candidate_model}")
+        metrics.increment(f"date_cascade.{candidate_model}.kept_after_escalation")
+        return candidate, cascade
+    return date_code, cascade
+
+def cascade_stats() -> Dict[str, Any]:
+    """
+    Summarizes the date extraction cascade per tier.
+
+    Returns:
+        Dictionary of model to request count, acceptance rate, mean latency, total cost
+        and how often its escalated code was kept because the last tier gave nothing usable
+    """
+    summary = {}
+    for model in openai_client.get_date_extraction_models():
+        requests = metrics.get_counter(f"date_cascade.{model}.requests")
+        summary[model] = {
+            "requests": requests,
+            "errors": metrics.get_counter(f"date_cascade.{model}.errors"),
+            "accept_rate": round(metrics.get_counter(f"date_cascade.{model}.accepted") / requests, 4) if requests else None,
+            "mean_request_ms": round(metrics.get_counter(f"date_cascade.{model}.request_ms") / requests, 1) if requests else None,
+            "cost_usd": round(metrics.get_counter(f"date_cascade.{model}.cost_usd"), 6),
+            "kept_after_escalation": metrics.get_counter(f"date_cascade.{model}.kept_after_escalation"),
+        }
+    return summary
 
 async def extract_date_from_image(file: UploadFile) -> Dict[str, Any]:
     """
@@ -36,101 +164,118 @@ async def extract_date_from_image(file: UploadFile) -> Dict[str, Any]:
     Returns:
         Dictionary containing:
         - status: "SUCCESS" or "ERROR"
-        - production_date: Extracted date in YYYY-MM-DD format or None
+        - production_date: The 6-digit DDMMYY code read from the label, or None
         - error: Error message if status is "ERROR"
-        - token_usage: Token usage information
+        - token_usage: Token usage information (summed over cascade tiers)
+        - input_cost_usd / output_cost_usd: Cost, each tier at its own model's rates
+        - cascade: Per-tier model, answer, acceptance, latency and cost
+        
+    Raises:
+        CircuitOpenError: If the OpenAI client or every deployment is unavailable
     """
-    # Ensure client is properly initialized
-    client = openai_client.get_client()
-    if client is None:
-        logger.error("OpenAI client is not initialized")
-        return {
-            "status": "ERROR",
-            "production_date": None,
-            "error": "OpenAI client is not available",
-            "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
-        }
-
     try:
         # Reset file position and read content
         await file.seek(0)
         contents = await file.read()
 
-        # ✅ [NEW] Save original file temporarily
-        temp_original_path = f"uploads/temp_{file.filename}"
-        with open(temp_original_path, "wb") as f:
-            f.write(contents)
+        # Serve identical re-submissions from the result cache before any network call
+        cache_key = None
+        if CACHE_ENABLED:
+            cache_key = make_cache_key(
+                "date", [hashlib.sha256(contents).hexdigest()],
+                [DATE_CODE_PROMPT, DATE_IMAGE_MODE], ",".join(openai_client.get_date_extraction_models())
+            )
+            cached_result = await result_cache.get(cache_key)
+            if cached_result is not None:
+                logger.info(f"Serving cached date extraction for: {file.filename}")
+                return mark_cache_hit(cached_result)
 
-        # ✅ [NEW] Preprocess the image
-        temp_processed_path = f"uploads/processed_{file.filename}"
-        from utils.image_preprocess import preprocess_image_for_llm
-        preprocess_image_for_llm(temp_original_path, temp_processed_path)
+        # Defer cache misses while the client is down
+        openai_client.require_client()
 
-        # ✅ [NEW] Read preprocessed image content
-        with open(temp_processed_path, "rb") as f:
-            processed_contents = f.read()
+        # Build the label payload in memory: the cropped/enlarged label ("processed")
+        # or the original photo fitted to the budget ("original"), for comparison
+        date_budget = VISION_BUDGETS["date"]
+        preprocess_start = time.perf_counter()
+        if DATE_IMAGE_MODE == "processed":
+            try:
+                image_bytes, image_stats = await asyncio.to_thread(preprocess_image_for_llm, contents, "date")
+            except ValueError as e:
+                logger.warning(f"Label preprocessing failed ({e}). Sending the original image.")
+                image_bytes, image_stats = await asyncio.to_thread(fit_image_to_budget, contents, "date")
+        else:
+            image_bytes, image_stats = await asyncio.to_thread(fit_image_to_budget, contents, "date")
+        image_stats["mode"] = DATE_IMAGE_MODE
+        image_stats["preprocess_ms"] = round((time.perf_counter() - preprocess_start) * 1000, 1)
+        logger.info(f"Date image payload: {image_stats}")
+        base64_image = base64.b64encode(image_bytes).decode("utf-8")
         
-        base64_image = base64.b64encode(contents).decode("utf-8")
-        
-        # Create input with the image and prompt for responses API
+        # Create the chat messages with the prompt and label image
         messages = [
             {
                 "role": "user",
                 "content": [
                     {
                         "type": "text",
-                        "text": DATE_EXTRACTION_PROMPT_O4
+                        "text": DATE_CODE_PROMPT
                     },
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:{file.content_type};base64,{base64_image}"
+                            "url": f"data:image/jpeg;base64,{base64_image}",
+                            "detail": date_budget["detail"]
                         }
                     }
                 ]
             }
         ]
         
-        # Call OpenAI API using responses endpoint
+        # Try the cheapest model first and escalate only when its answer fails local validation
         logger.info(f"Sending request to OpenAI for date extraction from: {file.filename}")
-        
-        # Using the responses API instead of chat completions
-        response = client.chat.completions.create(
-            model=openai_client.get_active_model(),  # Use the date extraction model from client
-            messages=messages,
-            max_completion_tokens=100,
-        )
-        
-        # Extract the response text
-        response_text = response.choices[0].message.content.strip()
-        logger.info(f"Date extraction response: {response_text}")
-        
-        # Check if a date was found
-        if response_text.lower() == "no production date visible":
+        date_code, cascade = await _run_date_cascade(messages)
+        image_stats["request_ms"] = round(sum(tier["request_ms"] for tier in cascade), 1)
+
+        # Per-mode totals so original vs processed payloads can be compared at /stats/
+        metrics.increment(f"date_extraction.{DATE_IMAGE_MODE}.requests")
+        metrics.increment(f"date_extraction.{DATE_IMAGE_MODE}.payload_bytes", image_stats["processed_bytes"])
+        metrics.increment(f"date_extraction.{DATE_IMAGE_MODE}.request_ms", image_stats["request_ms"])
+
+        usage = {
+            "token_usage": {
+                "input_tokens": sum(tier["input_tokens"] for tier in cascade),
+                "output_tokens": sum(tier["output_tokens"] for tier in cascade),
+                "total_tokens": sum(tier["input_tokens"] + tier["output_tokens"] for tier in cascade)
+            },
+            "input_cost_usd": sum(tier["input_cost_usd"] for tier in cascade),
+            "output_cost_usd": sum(tier["output_cost_usd"] for tier in cascade),
+            "cascade": cascade
+        }
+
+        # Check if a date code was found (conversion to a date happens locally)
+        if date_code is None:
             logger.warning(f"No production date found in image: {file.filename}")
             return {
                 "status": "ERROR",
                 "production_date": None,
                 "error": "No production date visible on the bottle label",
-                "token_usage": {
-                    "input_tokens": response.usage.prompt_tokens,
-                    "output_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
+                **usage
             }
         
         # Return the extracted date
-        return {
+        result = {
             "status": "SUCCESS",
-            "production_date": response_text,
+            "production_date": date_code,
             "error": None,
-            "token_usage": {
-                "input_tokens": response.usage.prompt_tokens,
-                "output_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
+            "image_stats": image_stats,
+            **usage
         }
+        if cache_key:
+            await result_cache.set(cache_key, result)
+        return result
     
+    except HTTPException:
+        # Includes CircuitOpenError (503 DEFERRED) when every deployment is down
+        raise
     except OpenAIError as e:
         logger.error(f"OpenAI API error during date extraction: {e}")
         detail = f"OpenAI API Error: {e.message}" if hasattr(e, 'message') else str(e)
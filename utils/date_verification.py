@@ -5,40 +5,139 @@ This module handles the verification of production dates for Chang beer bottles
 to determine eligibility for the claim process (within 120 days).
 """
 
+import os
+import re
+import json
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, Tuple
-import json
+from typing import Dict, Any, List, Optional, Tuple
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Constants
 MAX_ELIGIBLE_DAYS = 120  # Maximum days since production for eligibility
+DATE_CODE_PATTERN = re.compile(r"(?<!\d)\d{6}(?!\d)")
+
+# The label year (YY) is printed one year ahead of the production year
+DATE_CODE_CENTURY = 2000
+DATE_CODE_YEAR_OFFSET = int(os.getenv("DATE_CODE_YEAR_OFFSET", "-1"))
+
+# Year correction rules, applied in order after the offset. The first rule whose
+# [min_year, max_year] range contains the year replaces it with set_year.
+# Override with DATE_CODE_YEAR_RULES (a JSON list in the same shape).
+DEFAULT_YEAR_RULES: List[Dict[str, int]] = [
+    {"max_year": 2023, "set_year": 2025},  # Too old to be a current bottle
+    {"min_year": 2026, "set_year": 2025},  # Not produced yet
+]
+YEAR_RULES: List[Dict[str, int]] = json.loads(os.getenv("DATE_CODE_YEAR_RULES", "null")) or DEFAULT_YEAR_RULES
+
+# A code read from the label is only trusted if it converts to a date in this
+# window around today; anything else is treated as a misread
+PLAUSIBLE_PAST_DAYS = int(os.getenv("DATE_CODE_PLAUSIBLE_PAST_DAYS", "730"))
+PLAUSIBLE_FUTURE_DAYS = int(os.getenv("DATE_CODE_PLAUSIBLE_FUTURE_DAYS", "1"))
+
+def parse_date_code(text: Optional[str]) -> Optional[str]:
+    """
+    Extracts the 6-digit DDMMYY code from the model output.
+
+    Args:
+        text: Raw model output (e.g. "070526" or "NONE")
+
+    Returns:
+        The 6-digit code, or None if no standalone 6-digit group is present
+    """
+    match = DATE_CODE_PATTERN.search(text or "")
+    return match.group(0) if match else None
+
+def apply_year_rules(year: int, rules: Optional[List[Dict[str, int]]] = None) -> int:
+    """
+    Applies the year correction rule table to a production year.
+
+    Args:
+        year: Production year after the label offset
+        rules: Rule table (defaults to YEAR_RULES)
 
-def verify_production_date(production_date: Dict[str, str]) -> Dict[str, Any]:
+    Returns:
+        The corrected year
+    """
+    for rule in (YEAR_RULES if rules is None else rules):
+        if rule.get("min_year", year) <= year <= rule.get("max_year", year):
+            return rule["set_year"]
+    return year
+
+def convert_date_code(code: str) -> datetime:
+    """
+    Converts a DDMMYY label code into the production date.
+
+    Example with the default rules: "070526" -> 07/05/2025.
+
+    Args:
+        code: The 6-digit code
+
+    Returns:
+        The production date
+
+    Raises:
+        ValueError: If the code is not 6 digits or is not a valid calendar date
+    """
+    label_date = _label_date(code)
+    return label_date.replace(year=apply_year_rules(label_date.year))
+
+def _label_date(code: str) -> datetime:
+    """The date as printed (label year plus offset), before the year correction rules."""
+    if not code or not DATE_CODE_PATTERN.fullmatch(code):
+        raise ValueError(f"Expected a 6-digit DDMMYY code, got {code!r}")
+
+    day, month, label_year = int(code[0:2]), int(code[2:4]), int(code[4:6])
+    return datetime(DATE_CODE_CENTURY + label_year + DATE_CODE_YEAR_OFFSET, month, day)
+
+def is_plausible_date_code(code: Optional[str], today: Optional[datetime] = None) -> bool:
+    """
+    Checks that a code is a valid DDMMYY date within the plausible production window.
+
+    Args:
+        code: The 6-digit code (or None)
+        today: Reference date (defaults to now)
+
+    Returns:
+        True if the printed date (before the year rules, which would clamp a
+        misread year into range) is no more than PLAUSIBLE_PAST_DAYS old and no
+        more than PLAUSIBLE_FUTURE_DAYS ahead, and the code converts
+    """
+    try:
+        label_date = _label_date(code)
+        convert_date_code(code)
+    except ValueError:
+        return False
+    today = today or datetime.now()
+    return (today - timedelta(days=PLAUSIBLE_PAST_DAYS)
+            <= label_date
+            <= today + timedelta(days=PLAUSIBLE_FUTURE_DAYS))
+
+def verify_production_date(production_date: str) -> Dict[str, Any]:
     """
     Verifies if a Chang beer bottle with the given production date is eligible for claims
     based on the 120-day rule.
     
     Args:
-        production_date: The production date in YYYY-MM-DD format
+        production_date: The 6-digit DDMMYY code read from the label
     
     Returns:
         Dictionary containing:
         - status: "ELIGIBLE" or "INELIGIBLE"
-        - production_date: The original date received
+        - production_date: The production date in DD/MM/YYYY format
+        - date_code: The original code received
         - days_elapsed: Number of days since production
         - max_allowed_days: Maximum allowed days for eligibility (120)
         - message: A message explaining the eligibility status (English)
         - message_thai: A message explaining the eligibility status (Thai)
     """
     
+    date_code = production_date
     try:
-        production_date = json.loads(production_date)
-        production_date = production_date.get("manufactured_date")
-        # Parse the production date
-        prod_date = datetime.strptime(production_date, "%d/%m/%Y")
+        # Convert the label code into the production date
+        prod_date = convert_date_code(date_code)
         
         # Get current date (use UTC to avoid timezone issues)
         current_date = datetime.utcnow()
@@ -78,7 +177,8 @@ def verify_production_date(production_date: Dict[str, str]) -> Dict[str, Any]:
         # Return verification result
         return {
             "status": status,
-            "production_date": production_date,
+            "production_date": formatted_prod_date,
+            "date_code": date_code,
             "days_elapsed": days_elapsed,
             "max_allowed_days": MAX_ELIGIBLE_DAYS,
             "message": message,
@@ -93,8 +193,8 @@ def verify_production_date(production_date: Dict[str, str]) -> Dict[str, Any]:
             "production_date": production_date,
             "days_elapsed": None,
             "max_allowed_days": MAX_ELIGIBLE_DAYS,
-            "message": f"Invalid production date format: {production_date}. Expected format: YYYY-MM-DD.",
-            "message_thai": f"รูปแบบวันที่ผลิตไม่ถูกต้อง: {production_date} รูปแบบที่คาดหวัง: YYYY-MM-DD"
+            "message": f"Invalid production date code: {production_date}. Expected format: DDMMYY.",
+            "message_thai": f"รหัสวันที่ผลิตไม่ถูกต้อง: {production_date} รูปแบบที่คาดหวัง: DDMMYY"
         }
     
     except Exception as e:
@@ -143,6 +243,7 @@ def format_verification_response(verification_result: Dict[str, Any]) -> Dict[st
         "english": {
             "status": verification_result.get("status"),
             "production_date": verification_result.get("production_date"),
+            "date_code": verification_result.get("date_code"),
             "days_elapsed": verification_result.get("days_elapsed"),
             "max_allowed_days": verification_result.get("max_allowed_days"),
             "message": verification_result.get("message")
@@ -150,6 +251,7 @@ def format_verification_response(verification_result: Dict[str, Any]) -> Dict[st
         "thai": {
             "status": "มีสิทธิ์" if verification_result.get("status") == "ELIGIBLE" else "ไม่มีสิทธิ์",
             "production_date": verification_result.get("production_date"),
+            "date_code": verification_result.get("date_code"),
             "days_elapsed": verification_result.get("days_elapsed"),
             "max_allowed_days": verification_result.get("max_allowed_days"),
             "message": verification_result.get("message_thai")
@@ -0,0 +1,203 @@
+"""
+Deployment Pool Utility Module
+
+This module spreads OpenAI calls across several Azure OpenAI deployments
+(e.g. the same model in different regions) so throughput is not capped by one
+deployment's quota or one region's latency.
+
+Each deployment keeps a latency average and a circuit breaker. Calls are routed
+at random, weighted towards fast and healthy deployments. A deployment that
+fails repeatedly has its circuit opened and receives no calls until a background
+probe or a single trial call shows it has recovered. When every deployment for a
+model is open, calls fail fast with CircuitOpenError.
+
+Configuration (AZURE_OPENAI_DEPLOYMENTS) is a JSON list such as:
+    [{"name": "eastus-gpt41", "endpoint": "https://eastus.openai.azure.com",
+      "api_key_env": "AZURE_OPENAI_API_KEY_EASTUS", "deployment": "gpt-4.1", "model": "gpt-4.1"}]
+When it is not set, the pool holds the single AZURE_OPENAI_ENDPOINT client for every model.
+"""
+
+import os
+import json
+import time
+import random
+import logging
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, OPEN
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+ANY_MODEL = "*"
+LATENCY_EWMA_ALPHA = 0.2
+DEFAULT_LATENCY_SECONDS = 5.0  # Assumed latency before a deployment has been measured
+
+class Deployment:
+    """One Azure OpenAI deployment (endpoint + deployment name) and its health."""
+
+    def __init__(self, name: str, client: Any, model: str = ANY_MODEL, deployment: Optional[str] = None):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.deployment = deployment
+        self.latency_ewma: Optional[float] = None
+        self.breaker = CircuitBreaker(name)
+        self.successes = 0
+        self.failures = 0
+
+    def serves(self, model: str) -> bool:
+        return self.model in (ANY_MODEL, model)
+
+    def deployment_for(self, model: str) -> str:
+        """Azure deployment name to send as the 'model' parameter."""
+        return self.deployment or model
+
+    def is_available(self, now: float) -> bool:
+        return self.breaker.available(now)
+
+    def weight(self, default_latency: float = DEFAULT_LATENCY_SECONDS) -> float:
+        latency = self.latency_ewma or default_latency
+        return (1.0 / max(latency, 0.05)) * (0.5 ** self.breaker.consecutive_failures)
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "latency_ewma_seconds": round(self.latency_ewma, 3) if self.latency_ewma else None,
+            "successes": self.successes,
+            "failures": self.failures,
+            **self.breaker.stats(now),
+        }
+
+class DeploymentPool:
+    """Latency-weighted, health-aware router over a set of deployments."""
+
+    def __init__(self):
+        self.deployments: List[Deployment] = []
+
+    def configure(self, deployments: List[Deployment]) -> None:
+        self.deployments = deployments
+        logger.info(f"Deployment pool configured with: {[d.name for d in deployments]}")
+
+    def choose(self, model: str, exclude: Iterable[str] = (),
+               avoid: Iterable[str] = ()) -> Tuple[Deployment, Optional[float]]:
+        """
+        Pick a deployment for a call.
+
+        Args:
+            model: Model the call needs
+            exclude: Names of deployments already tried for this call
+            avoid: Names of deployments to use only if nothing else is available
+                (e.g. currently throttled)
+
+        Returns:
+            Tuple of the chosen deployment and, if the call claimed that
+            deployment's half-open trial, the trial token for release_trial
+
+        Raises:
+            RuntimeError: If no deployment serves the model
+            CircuitOpenError: If every deployment serving the model has an open circuit
+        """
+        candidates = [d for d in self.deployments if d.serves(model)]
+        if not candidates:
+            raise RuntimeError(f"No deployment configured for model '{model}'")
+
+        now = time.monotonic()
+        exclude, avoid = set(exclude), set(avoid)
+        for pool in (
+            [d for d in candidates if d.is_available(now) and d.name not in exclude | avoid],
+            [d for d in candidates if d.is_available(now) and d.name not in exclude],
+            [d for d in candidates if d.is_available(now)],
+        ):
+            if pool:
+                # Unmeasured deployments are assumed as fast as the best one so they get traffic
+                measured = [d.latency_ewma for d in pool if d.latency_ewma]
+                default_latency = min(measured) if measured else DEFAULT_LATENCY_SECONDS
+                chosen = random.choices(pool, weights=[d.weight(default_latency) for d in pool])[0]
+                return chosen, chosen.breaker.before_call(now)
+
+        # Every circuit is open: fail fast instead of waiting on connect/read timeouts
+        raise CircuitOpenError(min(d.breaker.retry_in(now) for d in candidates))
+
+    def record_success(self, deployment: Deployment, latency_seconds: float) -> None:
+        if deployment.latency_ewma is None:
+            deployment.latency_ewma = latency_seconds
+        else:
+            deployment.latency_ewma += LATENCY_EWMA_ALPHA * (latency_seconds - deployment.latency_ewma)
+        deployment.successes += 1
+        deployment.breaker.record_success()
+
+    def record_failure(self, deployment: Deployment) -> None:
+        deployment.failures += 1
+        deployment.breaker.record_failure()
+
+    def record_reachable(self, deployment: Deployment) -> None:
+        """A throttled or rejected (4xx) call still proves the deployment is up."""
+        deployment.breaker.record_success()
+
+    def release_trial(self, deployment: Deployment, trial: Optional[float]) -> None:
+        """Free a half-open trial that ended without a success or failure (e.g. cancelled)."""
+        if trial is not None:
+            deployment.breaker.release_trial(time.monotonic(), trial)
+
+    def serves(self, model: str) -> bool:
+        """Whether any deployment serves the model."""
+        return any(d.serves(model) for d in self.deployments)
+
+    def has_alternative(self, model: str, exclude: Iterable[str]) -> bool:
+        """Whether a healthy deployment outside `exclude` serves the model."""
+        now = time.monotonic()
+        exclude = set(exclude)
+        return any(d.serves(model) and d.is_available(now) and d.name not in exclude for d in self.deployments)
+
+    async def probe_open_deployments(self) -> None:
+        """
+        Check deployments whose circuit is open and due for a trial with a cheap
+        models.list call, so real requests are not used to discover recovery.
+        """
+        now = time.monotonic()
+        for deployment in self.deployments:
+            if deployment.breaker.state != OPEN or not deployment.is_available(now):
+                continue
+            trial = deployment.breaker.before_call(now)
+            try:
+                await deployment.client.models.list()
+            except Exception as e:
+                logger.warning(f"Recovery probe for {deployment.name} failed: {e}")
+                self.record_failure(deployment)
+            else:
+                deployment.breaker.record_success()
+            finally:
+                self.release_trial(deployment, trial)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {d.name: d.stats(now) for d in self.deployments}
+
+pool = DeploymentPool()
+
+def load_deployment_configs() -> List[Dict[str, Any]]:
+    """
+    Read the deployment list from AZURE_OPENAI_DEPLOYMENTS.
+
+    Returns:
+        List of deployment configs (empty when not configured or invalid)
+    """
+    raw = os.getenv("AZURE_OPENAI_DEPLOYMENTS")
+    if not raw:
+        return []
+    try:
+        configs = json.loads(raw)
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid AZURE_OPENAI_DEPLOYMENTS JSON: {e}")
+        return []
+
+    valid = []
+    for config in configs:
+        api_key = config.get("api_key") or os.getenv(config.get("api_key_env", ""), "")
+        if not config.get("endpoint") or not api_key:
+            logger.error(f"Skipping deployment without endpoint/key: {config.get('name', config.get('endpoint'))}")
+            continue
+        valid.append({**config, "api_key": api_key})
+    return valid
@@ -0,0 +1,158 @@
+"""
+Hedged Requests Utility Module
+
+This module cuts tail latency of slow vision calls. When hedging is enabled and
+a call runs longer than an adaptive threshold (a high percentile of recent
+latencies for the same kind of call), a second identical request is fired. The
+deployment pool may route it to the same or another deployment. Whichever
+answers first wins and the other is cancelled. Hedges are capped to a fraction
+of recent calls so the extra spend stays bounded. Streamed calls are hedged on
+their time to first output: the call opens the stream and waits for that event.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from utils import metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "5"))
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))  # At most 10% of calls are hedged
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))  # Recent calls used for the threshold and rate cap
+
+class HedgeTracker:
+    """Recent latencies and hedge decisions for one kind of call."""
+
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.hedged: Deque[bool] = deque(maxlen=window)
+
+    def threshold(self) -> Optional[float]:
+        """Hedge delay in seconds, or None until enough latencies are known."""
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(HEDGE_PERCENTILE * len(ordered)))
+        return max(HEDGE_MIN_DELAY_SECONDS, ordered[index])
+
+    def can_hedge(self) -> bool:
+        return sum(self.hedged) < HEDGE_MAX_RATE * max(len(self.hedged), 1)
+
+_trackers: Dict[str, HedgeTracker] = {}
+
+def _get_tracker(key: str) -> HedgeTracker:
+    if key not in _trackers:
+        _trackers[key] = HedgeTracker(HEDGE_WINDOW)
+    return _trackers[key]
+
+async def hedged_call(key: str, call_fn: Callable[[], Awaitable[Any]],
+                      discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> Any:
+    """
+    Run a call, hedging it with a duplicate if it exceeds the adaptive threshold.
+
+    Args:
+        key: Kind of call, used to keep separate latency history (e.g. the model)
+        call_fn: Zero-argument coroutine function performing the call; it is
+            invoked a second time for the hedge
+        discard: Frees the result of a call that also finished but lost the race
+            (e.g. closes a stream); cancelled calls must clean up themselves
+
+    Returns:
+        The result of whichever call finished first successfully
+
+    Raises:
+        Exception: The primary call's error if both calls fail
+    """
+    if not HEDGING_ENABLED:
+        return await call_fn()
+
+    tracker = _get_tracker(key)
+    threshold = tracker.threshold()
+    start = time.monotonic()
+    primary = asyncio.create_task(call_fn())
+
+    try:
+        if threshold is None:
+            result = await primary
+            tracker.latencies.append(time.monotonic() - start)
+            tracker.hedged.append(False)
+            return result
+
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done or not tracker.can_hedge():
+            result = await primary
+            tracker.latencies.append(time.monotonic() - start)
+            tracker.hedged.append(False)
+            if not done:
+                metrics.increment(f"hedge.{key}.suppressed_by_rate_cap")
+            return result
+
+        # The primary is in the tail: fire a duplicate and take the first answer
+        logger.info(f"Hedging {key} call after {threshold:.1f}s")
+        tracker.hedged.append(True)
+        metrics.increment(f"hedge.{key}.fired")
+        hedge = asyncio.create_task(call_fn())
+        result, winner = await _first_success(primary, hedge)
+        loser = primary if winner is hedge else hedge
+        if discard is not None and loser.done() and not loser.cancelled() and loser.exception() is None:
+            await discard(loser.result())
+
+        elapsed = time.monotonic() - start
+        tracker.latencies.append(elapsed)
+        if winner is hedge:
+            metrics.increment(f"hedge.{key}.hedge_wins")
+            # The primary was still running at `elapsed`, so its latency would have been
+            # longer: the sum of these is a lower bound on the tail latency removed
+            metrics.increment(f"hedge.{key}.hedge_win_latency_ms", round(elapsed * 1000, 1))
+        else:
+            metrics.increment(f"hedge.{key}.primary_wins")
+
+        # Extra spend: the losing call's input was (at least partly) billed
+        usage = getattr(result, "usage", None)
+        metrics.increment(f"hedge.{key}.extra_input_tokens_estimated", getattr(usage, "input_tokens", 0) or 0)
+        return result
+    finally:
+        if not primary.done():
+            primary.cancel()
+
+async def _first_success(primary: "asyncio.Task", hedge: "asyncio.Task"):
+    """Wait for the first task to succeed; cancel the other. Raise the primary's error if both fail."""
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    return task.result(), task
+        # Both failed
+        return primary.result(), primary
+    finally:
+        for task in (primary, hedge):
+            if not task.done():
+                task.cancel()
+
+def stats() -> Dict[str, Any]:
+    """
+    Get the current hedge thresholds and recent hedge rates.
+
+    Returns:
+        Dictionary of call kind to threshold/rate
+    """
+    return {
+        key: {
+            "enabled": HEDGING_ENABLED,
+            "threshold_seconds": round(tracker.threshold(), 2) if tracker.threshold() else None,
+            "recent_hedge_rate": round(sum(tracker.hedged) / len(tracker.hedged), 4) if tracker.hedged else 0.0,
+        }
+        for key, tracker in _trackers.items()
+    }
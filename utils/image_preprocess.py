@@ -1,28 +1,148 @@
+import os
+import math
 import cv2
 import numpy as np
-from pathlib import Path
+from typing import Any, Dict, Tuple
 
-def preprocess_image_for_llm(image_path: str, output_path: str) -> str:
+# Vision token budgets per use case (long edge in px, max 512px tiles, detail level)
+VISION_BUDGETS = {
+    "damage": {
+        "max_long_edge": int(os.getenv("DAMAGE_IMAGE_MAX_LONG_EDGE", "1536")),
+        "max_tiles": int(os.getenv("DAMAGE_IMAGE_MAX_TILES", "6")),
+        "detail": os.getenv("DAMAGE_IMAGE_DETAIL", "high"),
+    },
+    "date": {
+        "max_long_edge": int(os.getenv("DATE_IMAGE_MAX_LONG_EDGE", "1024")),
+        "max_tiles": int(os.getenv("DATE_IMAGE_MAX_TILES", "4")),
+        "detail": os.getenv("DATE_IMAGE_DETAIL", "high"),
+    },
+    "video_frame": {
+        "max_long_edge": int(os.getenv("VIDEO_FRAME_MAX_LONG_EDGE", "1024")),
+        "max_tiles": int(os.getenv("VIDEO_FRAME_MAX_TILES", "4")),
+        "detail": os.getenv("VIDEO_FRAME_DETAIL", "high"),
+    },
+    "triage": {
+        "max_long_edge": int(os.getenv("TRIAGE_IMAGE_MAX_LONG_EDGE", "512")),
+        "max_tiles": 1,
+        "detail": "low",
+    },
+}
+JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+
+def estimate_vision_tokens(width: int, height: int, detail: str = "high") -> int:
     """
-    Preprocess an image for LLM vision model:
-    - Convert to grayscale
-    - Resize to enlarge the label region
-    - Enhance contrast
-    - Crop the area with text heuristically (bounding box)
-    - Save and return the new image path
+    Estimate the input tokens billed for one image by the GPT-4o/4.1 vision models.
+
+    High detail: the image is fitted into 2048x2048, then its short side is
+    scaled to 768px, and each 512px tile costs 170 tokens plus a base of 85.
+    Low detail is a flat 85 tokens.
+
+    Args:
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        detail (str): "low", "high" or "auto" (treated as high)
+
+    Returns:
+        int: Estimated token count
+    """
+    if detail == "low" or width <= 0 or height <= 0:
+        return 85
+    return 85 + 170 * _count_tiles(width, height)
+
+def _count_tiles(width: int, height: int) -> int:
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return math.ceil(width / 512) * math.ceil(height / 512)
+
+def budget_scale(width: int, height: int, budget: str) -> float:
+    """
+    Compute the downscale factor that fits an image into a vision budget.
 
     Args:
-        image_path (str): Path to original image
-        output_path (str): Path to save processed image
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        budget (str): Key of VISION_BUDGETS to apply
 
     Returns:
-        str: Path to processed image
+        float: Scale factor (1.0 means no resize needed)
     """
-    image = cv2.imread(image_path)
+    settings = VISION_BUDGETS[budget]
+    scale = min(1.0, settings["max_long_edge"] / max(width, height))
+    while scale > 0.1 and _count_tiles(int(width * scale), int(height * scale)) > settings["max_tiles"]:
+        scale *= 0.9
+    return scale
 
+def fit_image_to_budget(contents: bytes, budget: str = "damage") -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Downscale and re-encode an image in memory so it fits a vision token budget.
+
+    The image is shrunk until its long edge is within max_long_edge and it costs
+    at most max_tiles 512px tiles. JPEGs that already fit are passed through
+    untouched to avoid a lossy re-encode.
+
+    Args:
+        contents (bytes): Original encoded image (JPEG or PNG)
+        budget (str): Key of VISION_BUDGETS to apply
+
+    Returns:
+        Tuple[bytes, dict]: JPEG bytes to send, and stats with original/processed
+        bytes, dimensions, detail level and estimated tokens
+    """
+    settings = VISION_BUDGETS[budget]
+    detail = settings["detail"]
+    stats = {
+        "original_bytes": len(contents),
+        "processed_bytes": len(contents),
+        "detail": detail,
+        "resized": False,
+    }
+
+    image = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
     if image is None:
-        raise ValueError("Image not found or invalid format.")
+        # Leave undecodable images to the model/validation to report
+        stats["estimated_tokens"] = estimate_vision_tokens(0, 0, detail)
+        return contents, stats
+
+    height, width = image.shape[:2]
+    stats["original_size"] = [width, height]
+    stats["original_estimated_tokens"] = estimate_vision_tokens(width, height, detail)
+
+    scale = budget_scale(width, height, budget)
+    new_width, new_height = max(1, int(width * scale)), max(1, int(height * scale))
+    stats["processed_size"] = [new_width, new_height]
+    stats["estimated_tokens"] = estimate_vision_tokens(new_width, new_height, detail)
+
+    is_jpeg = contents[:3] == b"\xff\xd8\xff"
+    if scale >= 1.0 and is_jpeg:
+        return contents, stats
 
+    if scale < 1.0:
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+        stats["resized"] = True
+
+    success, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not success:
+        return contents, stats
+
+    processed = encoded.tobytes()
+    stats["processed_bytes"] = len(processed)
+    return processed, stats
+
+def crop_label_region(image: np.ndarray) -> np.ndarray:
+    """
+    Crop the most text-like region of a label photo:
+    - Convert to grayscale
+    - Enhance contrast
+    - Threshold and find the largest text-like bounding box
+
+    Args:
+        image (np.ndarray): BGR image
+
+    Returns:
+        np.ndarray: Cropped BGR image (the original image if no suitable crop is found)
+    """
     # Convert to grayscale
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
@@ -33,28 +153,71 @@ def preprocess_image_for_llm(image_path: str, output_path: str) -> str:
     # Threshold to highlight text regions
     _, thresh = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
 
+    # Merge neighbouring characters into text lines so a whole code is one region
+    img_height, img_width = gray.shape
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, img_width // 40), max(3, img_height // 100)))
+    merged = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+
     # Find contours to detect regions of interest (likely text)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours, _ = cv2.findContours(merged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-    # Get bounding boxes and crop largest text-like area
+    # Get bounding boxes and crop largest text-like area (with a margin around it)
     cropped = None
     max_area = 0
     for cnt in contours:
         x, y, w, h = cv2.boundingRect(cnt)
         area = w * h
         if area > max_area and w > 50 and h > 10:
-            cropped = image[y:y + h, x:x + w]
+            pad_x, pad_y = w // 10, h // 10
+            x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+            cropped = image[y0:min(img_height, y + h + pad_y), x0:min(img_width, x + w + pad_x)]
             max_area = area
 
     if cropped is None:
         cropped = image  # Fallback to original if no suitable crop found
 
-    # Resize to enlarge text area (double size)
-    resized = cv2.resize(cropped, None, fx=2, fy=2, interpolation=cv2.INTER_LINEAR)
+    return cropped
+
+def preprocess_image_for_llm(contents: bytes, budget: str = "date") -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Preprocess a label image for the LLM vision model, entirely in memory:
+    - Decode the upload
+    - Crop the area with text heuristically (bounding box)
+    - Enlarge the label region (up to 2x, capped by the vision budget)
+    - Re-encode as JPEG
+
+    Args:
+        contents (bytes): Original encoded image
+        budget (str): Key of VISION_BUDGETS that caps the output size
+
+    Returns:
+        Tuple[bytes, dict]: JPEG bytes to send, and stats (bytes, sizes, estimated tokens)
+    """
+    image = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+
+    if image is None:
+        raise ValueError("Image not found or invalid format.")
+
+    cropped = crop_label_region(image)
+
+    # Enlarge the text area (double size), but never beyond the vision budget
+    height, width = cropped.shape[:2]
+    scale = 2.0 * budget_scale(width * 2, height * 2, budget)
+    new_width, new_height = max(1, int(width * scale)), max(1, int(height * scale))
+    interpolation = cv2.INTER_LINEAR if scale > 1.0 else cv2.INTER_AREA
+    resized = cv2.resize(cropped, (new_width, new_height), interpolation=interpolation)
 
-    # Save the result
-    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    print(f"[✅] Saving preprocessed image to: {output_path}")
-    cv2.imwrite(output_path, resized)
+    success, encoded = cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not success:
+        raise ValueError("Could not encode preprocessed image.")
 
-    return output_path
+    processed = encoded.tobytes()
+    detail = VISION_BUDGETS[budget]["detail"]
+    return processed, {
+        "original_bytes": len(contents),
+        "processed_bytes": len(processed),
+        "detail": detail,
+        "original_size": [image.shape[1], image.shape[0]],
+        "processed_size": [new_width, new_height],
+        "estimated_tokens": estimate_vision_tokens(new_width, new_height, detail),
+    }
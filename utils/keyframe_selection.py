@@ -0,0 +1,128 @@
+"""
+Keyframe Selection Utility Module
+
+This module picks the video frames sent to the vision model. Instead of a fixed
+number of evenly spaced frames (often several near-identical shots of a static
+bottle), candidate frames are scored as they are decoded:
+- a hue/saturation histogram and a tiny grayscale thumbnail detect scene changes
+- Laplacian variance measures sharpness, and the sharpest frame of each scene is kept
+- scene winners that look almost the same as a sharper one are dropped
+- if more remain than the token budget allows, the most distinct ones are kept
+"""
+
+import os
+import logging
+from typing import Iterable, List, Dict, Any, Tuple
+import cv2
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+KEYFRAME_CANDIDATE_FPS = float(os.getenv("KEYFRAME_CANDIDATE_FPS", "0.5"))  # Candidates scored per second of video
+KEYFRAME_MAX_CANDIDATES = int(os.getenv("KEYFRAME_MAX_CANDIDATES", "40"))
+SCENE_HIST_THRESHOLD = float(os.getenv("KEYFRAME_SCENE_HIST_THRESHOLD", "0.3"))  # Bhattacharyya distance
+SCENE_DIFF_THRESHOLD = float(os.getenv("KEYFRAME_SCENE_DIFF_THRESHOLD", "25"))  # Mean abs thumbnail difference (0-255)
+DUPLICATE_DIFF_THRESHOLD = float(os.getenv("KEYFRAME_DUPLICATE_DIFF_THRESHOLD", "8"))
+FEATURE_WIDTH = 320  # Features are computed on a small copy of the frame
+THUMBNAIL_SIZE = (32, 18)
+
+class _Candidate:
+    """A decoded frame and its cheap features."""
+
+    def __init__(self, index: int, frame: np.ndarray):
+        self.index = index
+        self.frame = frame
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (FEATURE_WIDTH, max(1, height * FEATURE_WIDTH // width)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        self.sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        self.thumbnail = cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        self.histogram = cv2.normalize(cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256]), None).flatten()
+
+    def difference(self, other: "_Candidate") -> float:
+        return float(np.mean(np.abs(self.thumbnail - other.thumbnail)))
+
+    def is_new_scene(self, reference: "_Candidate") -> bool:
+        distance = cv2.compareHist(self.histogram, reference.histogram, cv2.HISTCMP_BHATTACHARYYA)
+        return distance > SCENE_HIST_THRESHOLD or self.difference(reference) > SCENE_DIFF_THRESHOLD
+
+def candidate_count(duration_sec: float, min_count: int = 1) -> int:
+    """
+    Number of candidate frames to score: KEYFRAME_CANDIDATE_FPS per second, but
+    at least min_count (so short clips are still sampled densely) and at most
+    KEYFRAME_MAX_CANDIDATES.
+    """
+    count = int(duration_sec * KEYFRAME_CANDIDATE_FPS) if duration_sec > 0 else KEYFRAME_MAX_CANDIDATES
+    return max(1, min(max(count, min_count), KEYFRAME_MAX_CANDIDATES))
+
+def candidate_indices(frame_count: int, frame_rate: float, min_count: int = 1) -> List[int]:
+    """
+    Frame indices to decode and score, evenly spread over the video.
+
+    Args:
+        frame_count: Total frames in the video
+        frame_rate: Frames per second (0 if unknown)
+        min_count: Fewest candidates to score (capped by the frame count)
+
+    Returns:
+        Ascending frame indices
+    """
+    count = min(candidate_count(frame_count / frame_rate if frame_rate > 0 else 0, min_count), frame_count)
+    return [int(i * frame_count / count) for i in range(count)]
+
+def select_keyframes(frames: Iterable[Tuple[int, np.ndarray]], max_frames: int) -> Tuple[List[np.ndarray], Dict[str, Any]]:
+    """
+    Pick the sharpest frame of each scene, drop near-duplicates and fit the token budget.
+
+    Frames are consumed one at a time; only the current scene's best frame and
+    the previous scene winners are kept in memory.
+
+    Args:
+        frames: (frame index, BGR frame) pairs in decode order
+        max_frames: Most frames the token budget allows
+
+    Returns:
+        Tuple of the selected frames (in video order) and selection stats
+    """
+    winners: List[_Candidate] = []
+    scene_start = best = None
+    candidates = 0
+    for index, frame in frames:
+        candidate = _Candidate(index, frame)
+        candidates += 1
+        if scene_start is None or candidate.is_new_scene(scene_start):
+            if best is not None:
+                winners.append(best)
+            scene_start = best = candidate
+        elif candidate.sharpness > best.sharpness:
+            best = candidate
+    if best is not None:
+        winners.append(best)
+
+    # Near-duplicates: keep the sharper of any two winners that look the same
+    distinct: List[_Candidate] = []
+    for candidate in sorted(winners, key=lambda c: c.sharpness, reverse=True):
+        if all(candidate.difference(kept) >= DUPLICATE_DIFF_THRESHOLD for kept in distinct):
+            distinct.append(candidate)
+
+    # Over budget: start from the sharpest and keep adding the most distinct frame
+    selected = distinct[:1]
+    remaining = distinct[1:]
+    while remaining and len(selected) < max_frames:
+        farthest = max(remaining, key=lambda c: min(c.difference(kept) for kept in selected))
+        selected.append(farthest)
+        remaining.remove(farthest)
+
+    selected.sort(key=lambda c: c.index)
+    stats = {
+        "candidates": candidates,
+        "scenes": len(winners),
+        "duplicates_dropped": len(winners) - len(distinct),
+        "selected": len(selected),
+        "frame_indices": [c.index for c in selected],
+    }
+    logger.info(f"Keyframe selection: {stats}")
+    return [c.frame for c in selected], stats
@@ -6,22 +6,29 @@ It delegates to specialized submodules for validation, processing, and video han
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, AsyncIterator, Callable, Tuple
 from fastapi import HTTPException, UploadFile
 from openai import OpenAIError
 
 # Import from our utilities
-from utils import openai_client
+from utils import openai_client, request_coalescing, criteria_selection
 from utils.prompts import NEW_PROMPT
 from utils.story_generation import (
     generate_story_from_image,
     generate_story_from_multiple_images,
-    generate_story_from_video
+    generate_story_from_video,
+    stream_story_from_images
 )
 from utils.media_validation import validate_files
-from utils.media_processing import process_images
+from utils.media_processing import read_images, process_images, prepare_images
+from utils.image_preprocess import VISION_BUDGETS
+from utils.triage import triage_images, build_triage_rejection, add_triage_usage
 from utils.video_processing import extract_frames_and_analyze_video
+from utils.video_upload import receive_video
+from utils.result_cache import CACHE_ENABLED, result_cache, hash_upload, make_cache_key, mark_cache_hit
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -45,93 +52,282 @@ async def analyze_media(files: List[UploadFile], prompt: str) -> Dict[str, str]:
     # Validate the uploaded files
     await validate_files(files)
     
-    # Ensure client is initialized or try to reinitialize if needed
-    if openai_client.is_fallback_mode() or openai_client.get_client() is None:
-        # Try to reinitialize the client one more time
-        if not openai_client.reinitialize_client_if_needed():
-            logger.warning("OpenAI client still not available or in fallback mode. Returning fallback response.")
-            # Return a specific fallback response structure
-            return { 
-                "english": "Analysis service is currently unavailable due to configuration issues.",
-                "thai": "บริการวิเคราะห์ไม่พร้อมใช้งานในขณะนี้เนื่องจากปัญหาการกำหนดค่า"
-            }
-
     if not files:
         logger.warning("No files provided in the request to analyze_media.")
         raise HTTPException(status_code=400, detail="No media files provided.")
 
-    # Determine if we're processing a video or images
-    is_video = (len(files) == 1 and files[0].content_type and 
-                files[0].content_type.startswith('video/'))
+    # Serve identical re-submissions from the result cache before any network call
+    request_key, cached_result = await _cached_analysis(files, prompt)
+    if cached_result is not None:
+        return cached_result
+
+    # Defer cache misses while the client is down rather than re-initializing per request
+    openai_client.require_client()
+
+    # Concurrent duplicates (e.g. a double-tapped submit) share one in-flight analysis,
+    # which runs on the upload contents since it may outlive this request's UploadFiles
+    media = await receive_media(files)
+    return await request_coalescing.run_once(
+        request_key, lambda: _run_analysis(media, prompt, request_key), media.release
+    )
+
+class ReceivedMedia:
+    """The contents of a request's uploads: image bytes, or a video copied to a scratch file."""
+
+    def __init__(self, filenames: List[str], images: Optional[List[bytes]] = None,
+                 video_details: Optional[Dict[str, Any]] = None):
+        self.filenames = filenames
+        self.images = images
+        self.video_details = video_details
+
+    @property
+    def is_video(self) -> bool:
+        return self.video_details is not None
+
+    def release(self) -> None:
+        """Delete the video scratch file (if any)."""
+        if self.video_details and os.path.exists(self.video_details["file_path"]):
+            os.remove(self.video_details["file_path"])
+
+def _is_video(files: List[UploadFile]) -> bool:
+    """Whether the request is a single video upload."""
+    return bool(len(files) == 1 and files[0].content_type and files[0].content_type.startswith('video/'))
+
+async def receive_media(files: List[UploadFile]) -> ReceivedMedia:
+    """
+    Read validated media files so the analysis no longer needs the UploadFiles.
+
+    Args:
+        files: Validated media files (images are closed once read)
+
+    Returns:
+        The received media; call its release() once the analysis is done
 
+    Raises:
+        HTTPException: 413 if a video exceeds the size limit, 500 if reading fails
+    """
+    filenames = [f.filename for f in files]
     try:
-        if is_video:
-            # Process video file
-            video_file = files[0]
-            logger.info(f"Detected video file: {video_file.filename}")
-            result = await process_video(video_file, prompt)
+        # Determine if we're processing a video or images
+        if _is_video(files):
+            logger.info(f"Detected video file: {files[0].filename}")
+            return ReceivedMedia(filenames, video_details=await save_video(files[0]))
+        logger.info(f"Detected {len(files)} image file(s).")
+        return ReceivedMedia(filenames, images=await read_images(files))
+    except Exception as e:
+        raise _analysis_error(e)
+
+async def _cached_analysis(files: List[UploadFile], prompt: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Compute the content-addressed key of a request and look it up in the result cache.
+
+    Returns:
+        Tuple of the request key and the cached result (None on a miss)
+    """
+    digests = [await hash_upload(f) for f in files]
+    request_key = make_cache_key(
+        "damage", digests, [prompt, NEW_PROMPT, criteria_selection.CRITERIA_MODE], openai_client.get_active_model()
+    )
+    if CACHE_ENABLED:
+        cached_result = await result_cache.get(request_key)
+        if cached_result is not None:
+            logger.info(f"Serving cached analysis for: {[f.filename for f in files]}")
+            return request_key, mark_cache_hit(cached_result)
+    return request_key, None
+
+async def _run_analysis(media: ReceivedMedia, prompt: str, request_key: str) -> Dict[str, str]:
+    """
+    Run the vision analysis for a cache miss and store the answer in the result cache.
+
+    Args:
+        media: The received media files
+        prompt: Text prompt to guide the analysis
+        request_key: Content-addressed key of the request
+
+    Returns:
+        The analysis result
+
+    Raises:
+        HTTPException: On OpenAI or processing errors
+    """
+    try:
+        if media.is_video:
+            # Extract frames and analyze the video
+            result = await extract_frames_and_analyze_video(media.video_details, prompt)
         else:
-            # Process image files
-            logger.info(f"Detected {len(files)} image file(s).")
-            result = await process_images(files, prompt)
+            # Screen image files cheaply, then run the full assessment on plausible claims
+            triage = await triage_images(media.images)
+            if triage and triage["reject"]:
+                logger.info(f"Triage rejected submission ({triage['reject']}). Skipping full assessment.")
+                result = build_triage_rejection(triage)
+            else:
+                result = await process_images(media.images, prompt, triage)
+                if triage:
+                    add_triage_usage(result, triage)
             
-        logger.info(f"Successfully generated analysis for: {[f.filename for f in files]}")
+        logger.info(f"Successfully generated analysis for: {media.filenames}")
+
+        # Only cache real model answers (metadata-only fallbacks report no output tokens)
+        if CACHE_ENABLED and result.get("output_tokens"):
+            await result_cache.set(request_key, result)
         return result
     
-    except OpenAIError as e:
+    except Exception as e:
+        raise _analysis_error(e)
+
+def _analysis_error(e: Exception) -> HTTPException:
+    """
+    Map an analysis failure to the HTTPException returned to the client.
+
+    Args:
+        e: The exception raised during analysis
+
+    Returns:
+        The HTTPException to raise
+    """
+    if isinstance(e, HTTPException):
+        # Includes CircuitOpenError (503 DEFERRED) when every deployment is down
+        return e
+    if isinstance(e, OpenAIError):
         logger.error(f"OpenAI API error during analysis: {e}")
         detail = f"OpenAI API Error: {e.message}" if hasattr(e, 'message') else str(e)
         status_code = e.status_code if hasattr(e, 'status_code') else 503
-        raise HTTPException(status_code=status_code, detail=detail)
+        return HTTPException(status_code=status_code, detail=detail)
+    logger.exception("An unexpected error occurred during analysis function execution.")
+    return HTTPException(status_code=500, detail=f"An unexpected error occurred during analysis: {str(e)}")
+
+async def stream_media_analysis(files: List[UploadFile], prompt: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of analyze_media for progressive rendering.
+
+    The files must already be validated. For images, the model output is relayed
+    as it is generated; videos, cache hits, triage rejects and requests that join
+    an identical in-flight analysis (request coalescing) only produce the final result.
+
+    Yields:
+        {"type": "stage", "stage": ...} progress events, {"type": "delta", "text": ...}
+        chunks of model output, and finally {"type": "result", "result": ...}
+
+    Raises:
+        HTTPException: On OpenAI or processing errors (503 DEFERRED while Azure is down)
+    """
+    yield {"type": "stage", "stage": "cache"}
+    request_key, cached_result = await _cached_analysis(files, prompt)
+    if cached_result is not None:
+        yield {"type": "result", "result": cached_result}
+        return
+
+    openai_client.require_client()
+    if _is_video(files):
+        yield {"type": "stage", "stage": "analyzing"}
+    media = await receive_media(files)
+    if media.is_video:
+        # Nothing may yield between receiving the video and handing its scratch file to run_once
+        result = await request_coalescing.run_once(
+            request_key, lambda: _run_analysis(media, prompt, request_key), media.release
+        )
+        yield {"type": "result", "result": result}
+        return
+
+    # The analysis runs as the coalesced call and hands its events over a queue, so a
+    # concurrent duplicate (streamed or not) joins it instead of starting another one
+    events: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    result_task = asyncio.ensure_future(request_coalescing.run_once(
+        request_key, lambda: _run_streamed_analysis(media.images, prompt, request_key, events.put_nowait)
+    ))
+    try:
+        while not result_task.done() or not events.empty():
+            next_event = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({next_event, result_task}, return_when=asyncio.FIRST_COMPLETED)
+            if next_event in done:
+                yield next_event.result()
+            else:
+                next_event.cancel()
+        result = result_task.result()
+    finally:
+        # Client went away: stop waiting (the call is cancelled if nobody else waits for it)
+        result_task.cancel()
+    yield {"type": "result", "result": result}
+
+async def _run_streamed_analysis(images: List[bytes], prompt: str, request_key: str,
+                                 emit: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """
+    Run the image analysis of stream_media_analysis and store the answer in the result cache.
+
+    Args:
+        images: The image file contents
+        prompt: Text prompt to guide the analysis
+        request_key: Content-addressed key of the request
+        emit: Receives the stage and delta events as they happen
+
+    Returns:
+        The analysis result
+
+    Raises:
+        HTTPException: On OpenAI or processing errors
+    """
+    try:
+        emit({"type": "stage", "stage": "triage"})
+        triage = await triage_images(images)
+        if triage and triage["reject"]:
+            result = build_triage_rejection(triage)
+        else:
+            emit({"type": "stage", "stage": "preprocessing"})
+            base64_images, summary = await prepare_images(images)
+            instructions, selection = criteria_selection.select_assessment_prompt(triage)
+            emit({"type": "stage", "stage": "analyzing"})
+            detail = VISION_BUDGETS["damage"]["detail"]
+            request_start = time.perf_counter()
+            async for event in stream_story_from_images(base64_images, prompt, detail=detail, instructions=instructions):
+                if event["type"] == "delta":
+                    emit(event)
+                else:
+                    result = event["result"]
+            result["image_stats"] = summary
+            request_ms = round((time.perf_counter() - request_start) * 1000, 1)
+            criteria_selection.record_assessment(instructions, selection, result, request_ms, base64_images, detail)
+            if triage:
+                add_triage_usage(result, triage)
     except Exception as e:
-        logger.exception("An unexpected error occurred during analysis function execution.")
-        # Ensure any remaining open files are closed
-        for f in files: 
-            try:
-                await f.close()
-            except Exception:
-                pass
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during analysis: {str(e)}")
-
-async def process_video(video_file: UploadFile, prompt: str) -> Dict[str, str]:
-    """
-    Process a video file by saving it to a temporary location and analyzing it.
+        raise _analysis_error(e)
+
+    if CACHE_ENABLED and result.get("output_tokens"):
+        await result_cache.set(request_key, result)
+    return result
+
+async def save_video(video_file: UploadFile) -> Dict[str, Any]:
+    """
+    Copy an uploaded video to a temporary file and probe its metadata.
     
     Args:
         video_file: The uploaded video file
-        prompt: The analysis prompt
         
     Returns:
-        Analysis results as a dictionary
+        Video details dictionary; 'file_path' is the temporary file, which the
+        caller deletes when done (see ReceivedMedia.release)
     """
     import tempfile
     
-    # Save video file to temporary location
-    temp_file_path = None
-    try:
-        # Create temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{video_file.filename.split('.')[-1]}") as temp_file:
-            temp_file_path = temp_file.name
-            contents = await video_file.read()
-            temp_file.write(contents)
-        
-        # Create video details dictionary
-        video_details = {
-            "filename": video_file.filename or "unknown_video",
-            "mimetype": video_file.content_type,
-            "size": video_file.size or 0,
-            "duration": "Unknown", 
-            "thumbnailBase64": None,
-            "file_path": temp_file_path  # Store path for frame extraction
-        }
-        
-        # Extract frames and analyze the video
-        result = extract_frames_and_analyze_video(video_details, prompt)
-        return result
+    # Create temp file
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{video_file.filename.split('.')[-1]}") as temp_file:
+        temp_file_path = temp_file.name
     
-    finally:
-        # Reset file position for potential future reads
-        await video_file.seek(0)
-        # Delete temp file when done (if it exists)
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.remove(temp_file_path) 
\ No newline at end of file
+    # Create video details dictionary
+    video_details = {
+        "filename": video_file.filename or "unknown_video",
+        "mimetype": video_file.content_type,
+        "size": video_file.size or 0,
+        "duration": "Unknown", 
+        "thumbnailBase64": None,
+        "file_path": temp_file_path  # Store path for frame extraction
+    }
+    
+    try:
+        # Copy the upload in chunks; metadata is probed as soon as the moov box is on disk
+        await receive_video(video_file, video_details)
+    except BaseException:
+        # Delete temp file if the upload could not be received
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+    return video_details
@@ -4,13 +4,17 @@ Media Processing Utility Module
 This module handles the processing of image files for analysis.
 """
 
+import time
 import base64
+import asyncio
 import logging
-from typing import List, Dict
+from typing import List, Dict, Any, Optional, Tuple
 from fastapi import UploadFile
 
 # Import from our utilities
+from utils import criteria_selection
 from utils.prompts import NEW_PROMPT
+from utils.image_preprocess import VISION_BUDGETS, fit_image_to_budget
 from utils.story_generation import (
     generate_story_from_image,
     generate_story_from_multiple_images
@@ -19,42 +23,104 @@ from utils.story_generation import (
 # Configure logging
 logger = logging.getLogger(__name__)
 
-async def process_images(files: List[UploadFile], prompt: str) -> Dict[str, str]:
+async def read_images(files: List[UploadFile]) -> List[bytes]:
+    """
+    Read uploaded image files into memory, closing them.
+
+    The analysis works on the bytes, so it does not depend on how long the
+    request that uploaded them stays open (see request_coalescing).
+
+    Args:
+        files: The uploaded image files
+
+    Returns:
+        The contents of each file, in upload order
+    """
+    images = []
+    try:
+        for img_file in files:
+            await img_file.seek(0)
+            images.append(await img_file.read())
+    finally:
+        # Ensure files are closed even if reading fails
+        for img_file in files:
+            try:
+                await img_file.close()
+            except Exception:
+                pass
+    return images
+
+async def prepare_images(images: List[bytes]) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Downscale and base64-encode image contents for the vision model.
+    
+    Args:
+        images: The image file contents (see read_images)
+        
+    Returns:
+        Tuple of the base64-encoded images and a summary of the downscaling stats
+    """
+    base64_images = []
+    image_stats = []
+    for contents in images:
+        # Fit the image to the vision token budget (CPU bound, so off the event loop)
+        processed, stats = await asyncio.to_thread(fit_image_to_budget, contents, "damage")
+        base64_images.append(base64.b64encode(processed).decode('utf-8'))
+        image_stats.append(stats)
+
+    summary = summarize_image_stats(image_stats)
+    logger.info(f"Image payload: {summary}")
+    return base64_images, summary
+
+async def process_images(images: List[bytes], prompt: str,
+                         triage: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
     """
     Process image files by converting them to base64 and analyzing with OpenAI.
     
     Args:
-        files: The uploaded image files
+        images: The image file contents (see read_images)
         prompt: The analysis prompt
+        triage: Triage answers used to select the assessment criteria, if available
         
     Returns:
         Analysis results as a dictionary
     """
-    # Process images (read, encode, close) just before the API call
-    base64_images = []
+    detail = VISION_BUDGETS["damage"]["detail"]
     try:
-        for img_file in files:
-            try:
-                contents = await img_file.read()
-                base64_image = base64.b64encode(contents).decode('utf-8')
-                base64_images.append(base64_image)
-            finally:
-                await img_file.close()  # Ensure file is closed even if encoding fails
-        
+        base64_images, summary = await prepare_images(images)
+        instructions, selection = criteria_selection.select_assessment_prompt(triage)
+
         # Call the appropriate story generation function based on number of images
+        request_start = time.perf_counter()
         if len(base64_images) == 1:
-            result = generate_story_from_image(base64_images[0], prompt)
+            result = await generate_story_from_image(base64_images[0], prompt, detail=detail, instructions=instructions)
         else:
-            result = generate_story_from_multiple_images(base64_images, prompt)
+            result = await generate_story_from_multiple_images(base64_images, prompt, detail=detail, instructions=instructions)
+        request_ms = round((time.perf_counter() - request_start) * 1000, 1)
             
+        result["image_stats"] = summary
+        criteria_selection.record_assessment(instructions, selection, result, request_ms, base64_images, detail)
         return result
         
     except Exception as e:
         logger.error(f"Error in process_images function: {e}")
-        # Ensure files are closed in case of error
-        for img_file in files:
-            try:
-                await img_file.close()
-            except Exception:
-                pass
-        raise  # Re-raise the exception to be handled by the calling function 
\ No newline at end of file
+        raise  # Re-raise the exception to be handled by the calling function
+
+def summarize_image_stats(image_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Summarize per-image downscaling stats for logging and the API response.
+    
+    Args:
+        image_stats: Stats dictionaries returned by fit_image_to_budget
+        
+    Returns:
+        Totals of original/processed bytes and estimated image tokens
+    """
+    return {
+        "images": len(image_stats),
+        "original_bytes": sum(s["original_bytes"] for s in image_stats),
+        "processed_bytes": sum(s["processed_bytes"] for s in image_stats),
+        "original_estimated_tokens": sum(s.get("original_estimated_tokens", s["estimated_tokens"]) for s in image_stats),
+        "estimated_tokens": sum(s["estimated_tokens"] for s in image_stats),
+        "detail": image_stats[0]["detail"] if image_stats else None
+    }
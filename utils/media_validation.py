@@ -18,6 +18,13 @@ MAX_IMAGE_SIZE_MB = 10  # 10MB max per image
 MAX_VIDEO_SIZE_MB = 50  # 50MB max for video
 MB = 1024 * 1024  # 1MB in bytes
 
+def video_too_large() -> HTTPException:
+    """The 413 error for a video over MAX_VIDEO_SIZE_MB (also raised while an upload is copied)."""
+    return HTTPException(
+        status_code=413, 
+        detail=f"Video file too large. Maximum size allowed is {MAX_VIDEO_SIZE_MB}MB."
+    )
+
 async def validate_files(files: List[UploadFile]) -> None:
     """
     Validates the uploaded files for type and size.
@@ -36,10 +43,7 @@ async def validate_files(files: List[UploadFile]) -> None:
         # Video file validation
         video = files[0]
         if video.size and video.size > MAX_VIDEO_SIZE_MB * MB:
-            raise HTTPException(
-                status_code=413, 
-                detail=f"Video file too large. Maximum size allowed is {MAX_VIDEO_SIZE_MB}MB."
-            )
+            raise video_too_large()
     elif all(f.content_type in ALLOWED_IMAGE_TYPES for f in files):
         # Image files validation
         for img in files:
@@ -0,0 +1,48 @@
+"""
+Metrics Utility Module
+
+This module keeps simple process-wide counters used to observe the effect of
+cost and latency optimizations (e.g. paid calls avoided). Counters are safe to
+update from both the event loop and worker threads.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict
+
+_counters: Dict[str, float] = defaultdict(int)
+_lock = threading.Lock()
+
+def increment(name: str, value: float = 1) -> None:
+    """
+    Increment a named counter.
+
+    Args:
+        name: Counter name (e.g. "precheck.paid_calls_avoided")
+        value: Amount to add (default 1)
+    """
+    with _lock:
+        _counters[name] += value
+
+def get_counter(name: str) -> float:
+    """
+    Get the current value of a counter.
+
+    Args:
+        name: Counter name
+
+    Returns:
+        The counter value (0 if never incremented)
+    """
+    with _lock:
+        return _counters.get(name, 0)
+
+def snapshot() -> Dict[str, float]:
+    """
+    Get a copy of all counters.
+
+    Returns:
+        Dictionary of counter name to value, sorted by name
+    """
+    with _lock:
+        return dict(sorted(_counters.items()))
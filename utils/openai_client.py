@@ -3,13 +3,29 @@ OpenAI Client Initialization Utility
 
 This module handles the initialization and management of the OpenAI client,
 including API key validation, model selection, and error handling.
+
+The client is an AsyncAzureOpenAI instance backed by a single shared httpx
+connection pool, so every request handled by a worker reuses the same
+keep-alive (and, when available, HTTP/2) connections to Azure.
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import Optional, Tuple
+import threading
+import concurrent.futures
+from urllib.parse import urlparse
+from typing import Optional, Tuple, Any, Dict, List
 from pathlib import Path
-from openai import OpenAI, OpenAIError, APIStatusError, APIConnectionError, AuthenticationError, AzureOpenAI
+import httpx
+from openai import (
+    OpenAIError, APIStatusError, APIConnectionError, AuthenticationError,
+    AsyncAzureOpenAI, DefaultAsyncHttpxClient, RateLimitError, APITimeoutError, InternalServerError
+)
+
+from utils import metrics, rate_limiter, deployment_pool
+from utils.circuit_breaker import CircuitOpenError
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -17,15 +33,80 @@ logger = logging.getLogger(__name__)
 # Model selection
 VISION_MODEL = "gpt-4.1"
 DATE_EXTRACTION_MODEL = os.getenv("DATE_EXTRACTION_MODEL")
+# Date extraction tries cheaper models first and escalates when the answer fails local validation.
+# Empty by default (vision model only): list e.g. "gpt-4.1-nano,gpt-4.1-mini" once those are deployed
+DATE_EXTRACTION_CASCADE = os.getenv("DATE_EXTRACTION_CASCADE", "")
 FALLBACK_VISION_MODEL = os.getenv("FALLBACK_VISION_MODEL") # Fallback if preferred is unavailable
 api_version = "2025-03-01-preview"
 endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+
+# HTTP connection pool settings (shared by all requests in this worker)
+HTTP_MAX_CONNECTIONS = int(os.getenv("OPENAI_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("OPENAI_HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("OPENAI_HTTP_TIMEOUT_SECONDS", "120"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("OPENAI_HTTP_CONNECT_TIMEOUT_SECONDS", "10"))
+HTTP2_ENABLED = os.getenv("OPENAI_HTTP2_ENABLED", "true").lower() == "true"
+
+# Token estimates used to reserve TPM quota before a call
+IMAGE_TOKEN_ESTIMATE = {"low": 85, "high": 765, "auto": 765}
+DEFAULT_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("OPENAI_OUTPUT_TOKEN_ESTIMATE", "800"))
+
+# Background health probe (client re-initialization and open-circuit recovery checks)
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv("OPENAI_HEALTH_PROBE_INTERVAL_SECONDS", "10"))
+REINIT_BACKOFF_BASE_SECONDS = float(os.getenv("OPENAI_REINIT_BACKOFF_BASE_SECONDS", "5"))
+REINIT_BACKOFF_MAX_SECONDS = float(os.getenv("OPENAI_REINIT_BACKOFF_MAX_SECONDS", "300"))
+
 # Global client variable and state tracking
-client: Optional[AzureOpenAI] = None
+client: Optional[AsyncAzureOpenAI] = None
+http_client: Optional[httpx.AsyncClient] = None
 active_vision_model = VISION_MODEL
 using_fallback_mode = False
+health_probe_task: Optional[asyncio.Task] = None
+
+# Single-flight re-initialization shared by tasks and threads
+_reinit_lock = threading.Lock()
+_reinit_in_flight: Optional[concurrent.futures.Future] = None
+_reinit_failures = 0
+_next_reinit_at = 0.0
+
+def _http2_available() -> bool:
+    """Check whether the optional 'h2' package needed for HTTP/2 is installed."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
 
-def initialize_openai_client() -> Tuple[Optional[AzureOpenAI], str, bool]:
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP connection pool, creating it on first use.
+    
+    Returns:
+        The httpx.AsyncClient used by the OpenAI client
+    """
+    global http_client
+
+    if http_client is None or http_client.is_closed:
+        use_http2 = HTTP2_ENABLED and _http2_available()
+        if HTTP2_ENABLED and not use_http2:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed. Using HTTP/1.1.")
+        http_client = DefaultAsyncHttpxClient(
+            http2=use_http2,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+        )
+        logger.info(
+            f"Created shared HTTP connection pool (http2={use_http2}, "
+            f"max_connections={HTTP_MAX_CONNECTIONS}, keepalive={HTTP_MAX_KEEPALIVE_CONNECTIONS})"
+        )
+    return http_client
+
+async def initialize_openai_client() -> Tuple[Optional[AsyncAzureOpenAI], str, bool]:
     """
     Initialize and validate the OpenAI client with proper error handling.
     
@@ -37,7 +118,11 @@ def initialize_openai_client() -> Tuple[Optional[AzureOpenAI], str, bool]:
     """
     global client, active_vision_model, using_fallback_mode
     
-    API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+    deployment_configs = deployment_pool.load_deployment_configs()
+
+    # The primary client (used for validation) falls back to the first pooled deployment
+    API_KEY = os.getenv("AZURE_OPENAI_API_KEY") or (deployment_configs[0]["api_key"] if deployment_configs else None)
+    primary_endpoint = endpoint or (deployment_configs[0]["endpoint"] if deployment_configs else None)
 
     if not API_KEY:
         logger.error("❌ OPENAI_API_KEY environment variable is not set. Falling back.")
@@ -49,16 +134,19 @@ def initialize_openai_client() -> Tuple[Optional[AzureOpenAI], str, bool]:
     logger.info(f"OpenAI API key detected: {key_preview} ({'project-based' if is_project_based_key else 'standard'})")
 
     try:
-        client = AzureOpenAI(
+        client = AsyncAzureOpenAI(
             api_key=API_KEY,
             api_version=api_version,
-            azure_endpoint=endpoint
+            azure_endpoint=primary_endpoint,
+            http_client=get_http_client(),
+            # Retries are scheduled by call_with_retries so they respect the rate limiter
+            max_retries=0
         )
 
         # Test API key with a simple call
         logger.info(f"Attempting to validate API key and check model: {VISION_MODEL}")
         # Using a simple, low-cost call for validation
-        client.models.retrieve(VISION_MODEL) 
+        await client.models.retrieve(VISION_MODEL)
         logger.info(f"✅ OpenAI API key validated successfully. Using vision model: {VISION_MODEL}")
         active_vision_model = VISION_MODEL
         using_fallback_mode = False
@@ -77,7 +165,7 @@ def initialize_openai_client() -> Tuple[Optional[AzureOpenAI], str, bool]:
         if e.code == 'model_not_found':
             logger.warning(f"Model '{VISION_MODEL}' not found or not accessible with this key. Trying fallback '{FALLBACK_VISION_MODEL}'.")
             try:
-                client.models.retrieve(FALLBACK_VISION_MODEL)
+                await client.models.retrieve(FALLBACK_VISION_MODEL)
                 logger.info(f"✅ Fallback model '{FALLBACK_VISION_MODEL}' validated. Using fallback.")
                 active_vision_model = FALLBACK_VISION_MODEL
                 using_fallback_mode = False
@@ -97,9 +185,45 @@ def initialize_openai_client() -> Tuple[Optional[AzureOpenAI], str, bool]:
         client = None
         using_fallback_mode = True
 
+    if client is not None:
+        configure_deployment_pool(client, deployment_configs)
+
     return client, active_vision_model, using_fallback_mode
 
-def get_client() -> Optional[AzureOpenAI]:
+def configure_deployment_pool(primary: AsyncAzureOpenAI, deployment_configs: List[Dict[str, Any]]) -> None:
+    """
+    Build the deployment pool used to route calls.
+    
+    Without AZURE_OPENAI_DEPLOYMENTS the pool is just the primary client, serving
+    every model. Deployments on the same endpoint/key share one client, and all
+    clients share the HTTP connection pool.
+    
+    Args:
+        primary: The validated primary client
+        deployment_configs: Configs from deployment_pool.load_deployment_configs
+    """
+    if not deployment_configs:
+        deployment_pool.pool.configure([deployment_pool.Deployment("primary", primary)])
+        return
+
+    clients: Dict[Tuple[str, str], AsyncAzureOpenAI] = {}
+    deployments = []
+    for config in deployment_configs:
+        client_key = (config["endpoint"], config["api_key"])
+        if client_key not in clients:
+            clients[client_key] = AsyncAzureOpenAI(
+                api_key=config["api_key"],
+                api_version=config.get("api_version", api_version),
+                azure_endpoint=config["endpoint"],
+                http_client=get_http_client(),
+                max_retries=0
+            )
+        model = config.get("model", deployment_pool.ANY_MODEL)
+        name = config.get("name") or f"{urlparse(config['endpoint']).hostname}/{config.get('deployment') or model}"
+        deployments.append(deployment_pool.Deployment(name, clients[client_key], model, config.get("deployment")))
+    deployment_pool.pool.configure(deployments)
+
+def get_client() -> Optional[AsyncAzureOpenAI]:
     """
     Get the current OpenAI client instance.
     
@@ -117,15 +241,21 @@ def get_active_model() -> str:
     """
     return active_vision_model
 
-def get_date_extraction_model() -> str:
+def get_date_extraction_models() -> List[str]:
     """
-    Get the model used for date extraction.
+    Get the model cascade used for date extraction, cheapest first.
+    
+    DATE_EXTRACTION_MODEL (a single model) takes precedence over
+    DATE_EXTRACTION_CASCADE. Models no deployment serves are skipped, and the
+    active vision model is always the last tier.
     
     Returns:
-        The date extraction model name
+        The date extraction model names, in the order they are tried
     """
-    active_vision_model = DATE_EXTRACTION_MODEL
-    return active_vision_model # Placeholder for actual date extraction model
+    configured = DATE_EXTRACTION_MODEL or DATE_EXTRACTION_CASCADE
+    models = [m.strip() for m in configured.split(",") if m.strip()]
+    models = [m for m in models if m != active_vision_model and deployment_pool.pool.serves(m)]
+    return models + [active_vision_model]
 
 def is_fallback_mode() -> bool:
     """
@@ -136,24 +266,258 @@ def is_fallback_mode() -> bool:
     """
     return using_fallback_mode
 
-def reinitialize_client_if_needed() -> bool:
+async def reinitialize_client_if_needed() -> bool:
     """
     Re-initialize the OpenAI client if it's None or in fallback mode.
     
+    Concurrent callers (tasks or threads) share a single in-flight validation
+    and its result. After a failed attempt, further attempts are skipped until
+    an exponential backoff delay has passed.
+    
     Returns:
-        True if reinitialization was attempted, False otherwise
+        True if the client is available afterwards, False otherwise
     """
-    global client, using_fallback_mode, active_vision_model
+    global _reinit_in_flight, _reinit_failures, _next_reinit_at
+
+    if client is not None and not using_fallback_mode:
+        return True
+
+    with _reinit_lock:
+        shared = _reinit_in_flight
+        if shared is None:
+            if time.monotonic() < _next_reinit_at:
+                metrics.increment("openai_client.reinit_skipped_backoff")
+                return False
+            _reinit_in_flight = concurrent.futures.Future()
+    if shared is not None:
+        # Another task or thread is already validating: wait for its result
+        metrics.increment("openai_client.reinit_coalesced")
+        return await asyncio.wrap_future(shared)
+
+    leader = _reinit_in_flight
+    available = False
+    try:
+        logger.info("Attempting to reinitialize OpenAI client...")
+        metrics.increment("openai_client.reinit_attempts")
+        await initialize_openai_client()
+        available = client is not None and not using_fallback_mode
+    finally:
+        with _reinit_lock:
+            if available:
+                _reinit_failures = 0
+                _next_reinit_at = 0.0
+            else:
+                delay = min(REINIT_BACKOFF_MAX_SECONDS, REINIT_BACKOFF_BASE_SECONDS * (2 ** _reinit_failures))
+                _reinit_failures += 1
+                _next_reinit_at = time.monotonic() + delay
+                logger.warning(f"OpenAI client still unavailable. Next re-initialization in {delay:.0f}s.")
+            _reinit_in_flight = None
+        leader.set_result(available)
+    return available
+
+def require_client() -> None:
+    """
+    Fail fast when the OpenAI client is unavailable instead of re-initializing
+    it inside the request; the background health probe restores it.
     
+    Raises:
+        CircuitOpenError: If the client is not initialized or in fallback mode
+    """
     if client is None or using_fallback_mode:
-        logger.info("Attempting to reinitialize OpenAI client...")
-        client, active_vision_model, using_fallback_mode = initialize_openai_client()
-        return True
-    return False
-
-def cleanup_client():
-    """Clean up the OpenAI client resources"""
-    global client
-    # Note: OpenAI client doesn't have a close/cleanup method as of now
-    # but we can set it to None to help with garbage collection
-    client = None 
\ No newline at end of file
+        logger.warning("OpenAI client not available. Deferring request until the health probe restores it.")
+        raise CircuitOpenError(max(HEALTH_PROBE_INTERVAL_SECONDS, _next_reinit_at - time.monotonic()))
+
+async def run_health_probes() -> None:
+    """Background loop: re-initialize a missing client and probe deployments with open circuits."""
+    while True:
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL_SECONDS)
+        try:
+            if client is None or using_fallback_mode:
+                await reinitialize_client_if_needed()
+            else:
+                await deployment_pool.pool.probe_open_deployments()
+        except Exception as e:
+            logger.warning(f"OpenAI health probe failed: {e}")
+
+def start_health_probes() -> None:
+    """Start the background health probe (once per worker)."""
+    global health_probe_task
+    if health_probe_task is None or health_probe_task.done():
+        health_probe_task = asyncio.create_task(run_health_probes())
+
+async def cleanup_client():
+    """Clean up the OpenAI client, stop the health probe and close the shared connection pool"""
+    global client, http_client, health_probe_task
+    if health_probe_task is not None:
+        health_probe_task.cancel()
+        health_probe_task = None
+    if client is not None:
+        await client.close()
+    if http_client is not None and not http_client.is_closed:
+        await http_client.aclose()
+    client = None
+    http_client = None
+
+def estimate_request_tokens(payload: Any, max_output_tokens: Optional[int] = None) -> int:
+    """
+    Roughly estimate the tokens a request will consume (prompt + completion).
+    
+    Text is counted at ~4 characters per token; images use the typical cost of
+    their detail level. Base64 image data is never counted as text.
+    
+    Args:
+        payload: Messages/input (nested lists and dicts) and instructions text
+        max_output_tokens: Output cap, if any
+        
+    Returns:
+        Estimated total tokens
+    """
+    tokens = 0
+    stack: List[Any] = [payload]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            tokens += len(item) // 4
+        elif isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, dict):
+            if item.get("type") in ("input_image", "image_url"):
+                image = item.get("image_url")
+                detail = item.get("detail") or (image.get("detail") if isinstance(image, dict) else None)
+                tokens += IMAGE_TOKEN_ESTIMATE.get(detail or "auto", IMAGE_TOKEN_ESTIMATE["auto"])
+            else:
+                stack.extend(value for key, value in item.items() if key != "image_url")
+    return tokens + (max_output_tokens or DEFAULT_OUTPUT_TOKEN_ESTIMATE)
+
+def _get_limiter(deployment: "deployment_pool.Deployment", model: str) -> rate_limiter.DeploymentRateLimiter:
+    """Rate limiter for a model on one pooled deployment."""
+    deployment_name = deployment.deployment_for(model)
+    return rate_limiter.get_limiter(f"{deployment.name}/{deployment_name}", deployment_name)
+
+async def call_with_retries(model: str, estimated_tokens: int, request_fn) -> Any:
+    """
+    Run an OpenAI call on a deployment from the pool, through that deployment's
+    rate limiter. Throttled and transient failures fail over to another healthy
+    deployment immediately, or are retried with Retry-After aware, jittered
+    exponential backoff when there is no alternative.
+    
+    Args:
+        model: Model the call needs
+        estimated_tokens: Estimated tokens, reserved from the TPM quota
+        request_fn: Coroutine function taking (client, deployment_name) that performs the call
+        
+    Returns:
+        The API response
+        
+    Raises:
+        OpenAIError: The last error once retries are exhausted (or a non-retryable error)
+    """
+    tried: List[str] = []
+
+    for attempt in range(rate_limiter.MAX_RETRIES + 1):
+        throttled = [d.name for d in deployment_pool.pool.deployments
+                     if d.serves(model) and _get_limiter(d, model).is_paused()]
+        deployment, trial = deployment_pool.pool.choose(model, exclude=tried, avoid=throttled)
+        deployment_name = deployment.deployment_for(model)
+        limiter = _get_limiter(deployment, model)
+
+        try:
+            await limiter.acquire(estimated_tokens)
+            start = time.monotonic()
+            response = await request_fn(deployment.client, deployment_name)
+        except RateLimitError as e:
+            deployment_pool.pool.record_reachable(deployment)
+            retry_after = rate_limiter.parse_retry_after(getattr(e.response, "headers", None))
+            # Throttle every queued call for this deployment, not just this one
+            limiter.pause(retry_after if retry_after is not None else rate_limiter.backoff_delay(attempt))
+            metrics.increment(f"rate_limit.{limiter.name}.throttled")
+            if attempt == rate_limiter.MAX_RETRIES:
+                raise
+            delay = rate_limiter.backoff_delay(attempt, retry_after)
+        except (APIConnectionError, APITimeoutError, InternalServerError) as e:
+            deployment_pool.pool.record_failure(deployment)
+            if attempt == rate_limiter.MAX_RETRIES:
+                raise
+            delay = rate_limiter.backoff_delay(attempt)
+            logger.warning(f"Transient OpenAI error on {deployment.name} ({type(e).__name__}).")
+        except APIStatusError:
+            # Any other 4xx: the deployment answered, the request was at fault
+            deployment_pool.pool.record_reachable(deployment)
+            raise
+        else:
+            deployment_pool.pool.record_success(deployment, time.monotonic() - start)
+            usage = getattr(response, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                limiter.record_usage(estimated_tokens, usage.total_tokens)
+            return response
+        finally:
+            # A half-open trial this attempt claimed that was cancelled (hedge loser, coalesced
+            # waiter, ineligible date) or hit an unexpected error must not block the deployment
+            # until it times out
+            deployment_pool.pool.release_trial(deployment, trial)
+
+        tried.append(deployment.name)
+        metrics.increment(f"rate_limit.{limiter.name}.retries")
+        if deployment_pool.pool.has_alternative(model, exclude=tried):
+            # Another deployment can take the call right away
+            metrics.increment("deployment_pool.failovers")
+            continue
+        tried.clear()
+        logger.warning(f"Retrying {model} call in {delay:.2f}s (attempt {attempt + 1}/{rate_limiter.MAX_RETRIES})")
+        await asyncio.sleep(delay)
+
+async def create_response(**kwargs) -> Any:
+    """
+    Call the Responses API on a pooled deployment, through the rate limiter and retry scheduler.
+    
+    Args:
+        **kwargs: Arguments for client.responses.create (model is required)
+        
+    Returns:
+        The Responses API response
+    """
+    estimated = estimate_request_tokens(
+        [kwargs.get("input"), kwargs.get("instructions")], kwargs.get("max_output_tokens")
+    )
+    return await call_with_retries(
+        kwargs["model"], estimated,
+        lambda api_client, deployment_name: api_client.responses.create(**{**kwargs, "model": deployment_name})
+    )
+
+async def stream_response(**kwargs) -> Any:
+    """
+    Open a streaming Responses API call on a pooled deployment, through the rate
+    limiter and retry scheduler. Retries cover opening the stream only; the
+    deployment's latency is recorded as the time to open it.
+    
+    Args:
+        **kwargs: Arguments for client.responses.create (model is required)
+        
+    Returns:
+        The async stream of Responses API events
+    """
+    estimated = estimate_request_tokens(
+        [kwargs.get("input"), kwargs.get("instructions")], kwargs.get("max_output_tokens")
+    )
+    return await call_with_retries(
+        kwargs["model"], estimated,
+        lambda api_client, deployment_name: api_client.responses.create(
+            **{**kwargs, "model": deployment_name, "stream": True}
+        )
+    )
+
+async def create_chat_completion(**kwargs) -> Any:
+    """
+    Call the Chat Completions API on a pooled deployment, through the rate limiter and retry scheduler.
+    
+    Args:
+        **kwargs: Arguments for client.chat.completions.create (model is required)
+        
+    Returns:
+        The Chat Completions response
+    """
+    estimated = estimate_request_tokens(kwargs.get("messages"), kwargs.get("max_completion_tokens"))
+    return await call_with_retries(
+        kwargs["model"], estimated,
+        lambda api_client, deployment_name: api_client.chat.completions.create(**{**kwargs, "model": deployment_name})
+    )
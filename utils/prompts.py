@@ -4,6 +4,8 @@ Prompt Templates
 This module contains prompt templates used across the application.
 """
 
+import os
+
 
 # Story generation prompt template used for OpenAI vision model
 
@@ -73,7 +75,39 @@ UNCLAIM_CRITERIAS = """
 """
 
 
-NEW_PROMPT = f"""
+PROSE_OUTPUT_FORMAT = """# Output Format
+For each assessment, use the following format:
+
+**Bottle Assessment:**
+✅/❌ [Cap condition]
+✅/❌ [Neck condition]
+✅/❌ [Body condition]
+✅/❌ [Bottom condition]
+✅/❌ **CLAIM/UNCLAIM** [final decision]
+
+Respond with a JSON object with these keys:
+- english: The assessment in the output format above.
+- thai: The assessment translated to Thai.
+- claimable: true/false
+"""
+
+# Compact mode: a structured verdict only; the English and Thai text is rendered
+# locally from static/locales (see utils/verdict_rendering.py)
+VERDICT_OUTPUT_FORMAT = """# Output Format
+Do not write the assessment text. Respond with a compact JSON verdict:
+- claimable: true/false
+- chang_bottle: true/false
+- cap, neck, body, bottom: whether the part passes (✅) and the code of its condition
+- reason: the code of the rule that decided claim or unclaim
+"""
+
+VERDICT_MODE = os.getenv("VERDICT_MODE", "prose").lower()  # "prose" or "compact"
+ASSESSMENT_OUTPUT_FORMAT = VERDICT_OUTPUT_FORMAT if VERDICT_MODE == "compact" else PROSE_OUTPUT_FORMAT
+
+def build_assessment_prompt(claim_criterias: str = CLAIM_CRITERIAS, unclaim_criterias: str = UNCLAIM_CRITERIAS,
+                            output_format: str = ASSESSMENT_OUTPUT_FORMAT) -> str:
+    """Damage assessment prompt with the given criteria blocks (all of them by default)."""
+    return f"""
 You will receive an image or multiple images of one bottle or a video of a broken bottle.
 Your task is to classify claim or unclaim based on the provided images or video.
 The answer must clearly specify whether the bottle can claim or unclaim,
@@ -85,10 +119,10 @@ The answer must clearly specify whether the bottle can claim or unclaim,
    - if it is not "Chang" or "ช้าง" response as unclaim without considering next steps and give a reason "This bottle is not brand Chang cannot claim".
 
 2. **Keys characteristics of claimable bottle**
-   {CLAIM_CRITERIAS}
+   {claim_criterias}
 
 3. **Keys characteristics of unclaimable bottle**
-   {UNCLAIM_CRITERIAS}
+   {unclaim_criterias}
 
 4. **Detect, examine for each part of the bottle:**
    - **There are 4 main parts of a bottle:** 1.cap 2.neck 3.body 4.bottom
@@ -119,130 +153,39 @@ The answer must clearly specify whether the bottle can claim or unclaim,
 
 
 
-# Output Format
-For each assessment, use the following format:
+{output_format}"""
 
-**Bottle Assessment:**
-✅/❌ [Cap condition]
-✅/❌ [Neck condition]
-✅/❌ [Body condition]
-✅/❌ [Bottom condition]
-✅/❌ **CLAIM/UNCLAIM** [final decision]
+NEW_PROMPT = build_assessment_prompt()
 
-Then provide a JSON object with these keys:
-- english: Use output format to answer.
-- thai: The description translated to Thai.
-- claimable: true/false
-"""
+# The model only reads the code; DDMMYY -> date conversion and year rules are
+# applied locally in utils/date_verification.py
+DATE_CODE_PROMPT = """
+Find the 6-digit production date code (DDMMYY, e.g. 070526) printed on this Chang beer bottle label.
+Ignore any group with fewer or more than 6 digits, or with letters, spaces or symbols.
 
-# DATE_EXTRACTION_PROMPT = """
-# You are an AI image analyzer extracting the production date from a Chang beer bottle label.
-
-# Instructions:
-# - Look for a sequence of exactly 6 digits that represents the production date code (format: DDMMYY)
-# - Pay special attention to any numbers printed on the label, particularly those that appear in a different font or printing style 
-# - Focus on numbers that may appear near product codes or batch numbers
-# - When you find a 6-digit sequence (like 070526 in the sample image), parse it as:
-#   * First 2 digits = Day (07)
-#   * Middle 2 digits = Month (05)
-#   * Last 2 digits = Year (26)
-# - Convert year to 4-digit format by prepending "20" (26 → 2026)
-# - Subtract 1 year from the 4-digit year to determine the manufacture date (2026 → 2025)
-# - Format the final date as DD/MM/YYYY (07/05/2025)
-
-# Looking at the provided image, extract the 6-digit code and convert it to a manufacture date.
-
-# ⚠️ Output Format:
-# Return ONLY a JSON object:
-# { "manufactured_date": "DD/MM/YYYY" }
-# If no valid code is visible:
-# { "manufactured_date": "No production date visible" }
-
-# DO NOT include any explanation or additional text. NO markdown formatting.
-# """
-
-DATE_EXTRACTION_PROMPT = """
-You are an AI image analyzer extracting the production date from a Chang beer bottle label.
-
-Instructions:
-- Look for a sequence of exactly 6 digits that represents the production date code (format: DDMMYY)
-- Pay special attention to any numbers printed on the label, particularly those that appear in a different font or printing style 
-- Focus on numbers that may appear near product codes or batch numbers
-- When you find a 6-digit sequence (like 070526 in the sample image), parse it as:
-  * First 2 digits = Day (07)
-  * Middle 2 digits = Month (05)
-  * Last 2 digits = Year (26)
-- Convert year to 4-digit format by prepending "20" (26 → 2026)
-- Subtract 1 year from the 4-digit year to determine the initial manufacture date
-- Apply these additional year validation rules:
-  * If the resulting year is less than or equal to 2023, set the year to 2025
-  * If the resulting year is greater than or equal to 2026, set the year to 2025
-  * Otherwise keep the calculated year
-- Format the final date as DD/MM/YYYY (example: "070526" → "07/05/2025")
-
-Looking at the provided image, extract the 6-digit code and convert it to a manufacture date.
-
-⚠️ Output Format:
-Return ONLY a JSON object:
-{ "manufactured_date": "DD/MM/YYYY" }
-If no valid code is visible:
-{ "manufactured_date": "No production date visible" }
-
-DO NOT include any explanation or additional text. NO markdown formatting.
+Respond with a JSON object whose date_code is the 6 digits exactly as printed,
+or null if there is no valid 6-digit code.
 """
 
-
-# DATE_EXTRACTION_PROMPT = """
-# You are an AI image analyzer. Your task is to find and extract a 6-digit production date code from a Chang beer bottle label.
-
-# INSTRUCTIONS:
-
-# - Carefully scan the label in the image for a group of **exactly 6 digits** together (example: 070526).
-# - Do **not** use groups with more or less than 6 digits.
-# - Ignore groups that have non-digit characters, spaces, or special symbols.
-# - When you find the correct 6 digits, interpret as date in DDMMYY format:
-#     - First 2 digits = Day
-#     - Next 2 digits = Month
-#     - Last 2 digits = Year (YY)
-# - Convert year to 4 digits by adding "20" in front (example: 26 → 2026).
-# - Subtract 1 year from the 4-digit year (2026 - 1 = 2025).
-# - If the result year is less than or equal to 2023, set year to 2025.
-# - If the result year is greater than or equal to 2026, set year to 2025.
-# - Otherwise, keep the calculated year.
-# - Format the final date as DD/MM/YYYY. (example: "070526" → "07/05/2025")
-
-# RESPONSE FORMAT:
-# - Respond **ONLY** with a single-line JSON object, like:
-#     { "manufactured_date": "07/05/2025" }
-# - If no valid 6-digit code is visible, respond with:
-#     { "manufactured_date": "No production date visible" }
-# - Do NOT add any explanation.
-# - Do NOT use markdown, backticks, or any extra text.
-# - Do NOT write anything before or after the JSON object.
-
-# ONLY output the JSON object as described above. If you do not see a valid code, output the "No production date visible" JSON exactly.
-# """
-
-DATE_EXTRACTION_PROMPT_O4 = """
-You are an AI assistant. Your ONLY task is to extract a 6-digit production date from a Chang beer bottle label image.
-
-Instructions:
-- Find exactly 6 digits together, no spaces or symbols (for example: 070526).
-- Ignore any group with fewer or more than 6 digits, or with non-digit characters.
-- Interpret these 6 digits as DDMMYY:
-    - First 2 digits: Day
-    - Next 2 digits: Month
-    - Last 2 digits: Year (YY)
-- Convert year to 4 digits by adding '20' in front. (e.g., 26 → 2026)
-- Subtract 1 year from the year. (e.g., 2026 → 2025)
-- If the year is less than or equal to 2023, or greater than or equal to 2026, set year to 2025.
-- Format the final date as DD/MM/YYYY. (e.g., "070526" → "07/05/2025")
-
-OUTPUT RULES:
-- Output ONLY a single-line JSON object like:
-  { "manufactured_date": "07/05/2025" }
-- If there is no valid 6-digit group, output ONLY:
-  { "manufactured_date": "No production date visible" }
-- Do NOT add explanation, markdown, newlines, or extra text. Output ONLY the JSON object, nothing else.
-- Do NOT write anything before or after the JSON object.
+# Cheap screening before the full assessment; "no" answers short-circuit the claim
+TRIAGE_SCREENING_QUESTIONS = """- chang_bottle: Is this a Chang (ช้าง) beer bottle?
+- broken: Is the bottle broken or damaged?
+- usable: Is the photo clear enough to assess the bottle (not too blurry, dark or cropped)?"""
+
+# Damage signals, only asked when they select the assessment criteria (utils/criteria_selection.py)
+TRIAGE_SIGNAL_QUESTIONS = """
+- shattered: Is the glass broken into many small pieces or shards?
+- spillage: Is there liquid, residue or stains around the bottle?
+- break_location: Where is the main break? Answer "neck", "body", "base", "none" or "unsure"."""
+
+def build_triage_prompt(damage_signals: bool = False) -> str:
+    """Triage prompt with the screening questions, plus the damage signals if requested."""
+    keys = "chang_bottle, broken, usable, shattered, spillage and break_location" if damage_signals else "chang_bottle, broken and usable"
+    return f"""
+You are screening photos submitted for a Chang beer bottle damage claim.
+Answer each question with "yes", "no" or "unsure":
+{TRIAGE_SCREENING_QUESTIONS}{TRIAGE_SIGNAL_QUESTIONS if damage_signals else ""}
+Only answer "no" when you are certain; otherwise answer "yes" or "unsure".
+
+Output ONLY a JSON object with the keys {keys}.
 """
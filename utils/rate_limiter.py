@@ -0,0 +1,197 @@
+"""
+Rate Limiter Utility Module
+
+This module keeps Azure OpenAI calls under each deployment's requests-per-minute
+(RPM) and tokens-per-minute (TPM) quota. Every deployment gets two token buckets;
+callers wait in FIFO order until both buckets can cover the request, and a 429
+with Retry-After pauses the whole deployment instead of letting every queued
+call hit the same wall.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+
+from utils import metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+DEFAULT_RPM = int(os.getenv("AZURE_OPENAI_RPM", "0"))  # 0 disables the RPM bucket
+DEFAULT_TPM = int(os.getenv("AZURE_OPENAI_TPM", "0"))  # 0 disables the TPM bucket
+# Per-deployment overrides, e.g. '{"gpt-4.1": {"rpm": 300, "tpm": 50000}}'
+DEPLOYMENT_QUOTAS: Dict[str, Dict[str, int]] = json.loads(os.getenv("AZURE_OPENAI_QUOTAS", "{}"))
+QUOTA_HEADROOM = float(os.getenv("RATE_LIMIT_HEADROOM", "0.9"))  # Use 90% of quota
+BURST_WINDOW_SECONDS = 10  # Azure enforces quotas over short windows; allow 10s of burst
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+BACKOFF_BASE_SECONDS = float(os.getenv("OPENAI_BACKOFF_BASE_SECONDS", "1.0"))
+BACKOFF_MAX_SECONDS = float(os.getenv("OPENAI_BACKOFF_MAX_SECONDS", "30.0"))
+
+class TokenBucket:
+    """Continuously refilling bucket; a per-minute quota of 0 means unlimited."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute * QUOTA_HEADROOM / 60.0
+        self.capacity = max(1.0, self.rate * BURST_WINDOW_SECONDS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)."""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        # A single request larger than the burst capacity only waits for a full bucket
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+class DeploymentRateLimiter:
+    """RPM + TPM limiter for one deployment, with a shared Retry-After pause."""
+
+    def __init__(self, name: str, rpm: int, tpm: int):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.waiting = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        """
+        Wait (in FIFO order) until the request fits in both quotas, then reserve it.
+
+        Args:
+            estimated_tokens: Estimated prompt + completion tokens for the call
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, which keeps queuing fair
+            async with self._lock:
+                while True:
+                    wait = max(
+                        self.paused_until - time.monotonic(),
+                        self.requests.wait_time(1),
+                        self.tokens.wait_time(estimated_tokens)
+                    )
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+        finally:
+            self.waiting -= 1
+
+        waited_ms = (time.monotonic() - start) * 1000
+        if waited_ms >= 1:
+            metrics.increment(f"rate_limit.{self.name}.queued_requests")
+            metrics.increment(f"rate_limit.{self.name}.queued_ms", round(waited_ms, 1))
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the TPM bucket once the real usage of a call is known."""
+        self.tokens.take(actual_tokens - estimated_tokens)
+
+    def is_paused(self) -> bool:
+        return time.monotonic() < self.paused_until
+
+    def pause(self, seconds: float) -> None:
+        """Stop issuing calls to this deployment for `seconds` (e.g. Retry-After)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "waiting": self.waiting,
+            "paused_for_seconds": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            "rpm_limit": None if self.requests.unlimited else round(self.requests.rate * 60),
+            "tpm_limit": None if self.tokens.unlimited else round(self.tokens.rate * 60),
+        }
+
+_limiters: Dict[str, DeploymentRateLimiter] = {}
+
+def get_limiter(name: str, quota_key: Optional[str] = None) -> DeploymentRateLimiter:
+    """
+    Get the process-wide limiter for a deployment, creating it on first use.
+
+    Args:
+        name: Unique limiter name (e.g. "<pool deployment>/<azure deployment>")
+        quota_key: Fallback key into AZURE_OPENAI_QUOTAS (e.g. the deployment name)
+
+    Returns:
+        The deployment's rate limiter
+    """
+    if name not in _limiters:
+        quota = DEPLOYMENT_QUOTAS.get(name) or DEPLOYMENT_QUOTAS.get(quota_key or "", {})
+        _limiters[name] = DeploymentRateLimiter(
+            name,
+            rpm=int(quota.get("rpm", DEFAULT_RPM)),
+            tpm=int(quota.get("tpm", DEFAULT_TPM))
+        )
+    return _limiters[name]
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Delay before the next retry: Retry-After when the server sent one, otherwise
+    exponential backoff with full jitter.
+
+    Args:
+        attempt: Zero-based retry attempt
+        retry_after: Seconds requested by the server, if any
+
+    Returns:
+        Seconds to wait
+    """
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX_SECONDS) + random.uniform(0, BACKOFF_BASE_SECONDS)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """
+    Read the retry delay from response headers (retry-after-ms or retry-after).
+
+    Args:
+        headers: Response headers (httpx.Headers or a dict)
+
+    Returns:
+        Seconds to wait, or None if absent/unparseable
+    """
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+def stats() -> Dict[str, Any]:
+    """
+    Get the state of every deployment limiter.
+
+    Returns:
+        Dictionary of deployment name to limiter state
+    """
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
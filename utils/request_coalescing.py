@@ -0,0 +1,83 @@
+"""
+Request Coalescing Utility Module
+
+This module makes concurrent identical requests (e.g. an agent double-tapping
+submit) share one in-flight analysis instead of paying for a vision call each.
+Unlike the result cache, nothing is kept once the call finishes: it only joins
+callers that overlap in time.
+
+The shared call keeps running while at least one caller is waiting for it; if
+every caller is cancelled (e.g. the claim turned out to be ineligible) the call
+is cancelled too. The call must not use anything tied to the request that
+started it (such as its UploadFiles, which FastAPI closes when that request
+ends): callers pass in the upload contents, and scratch files are freed by the
+call's `release` hook once the call finishes.
+"""
+
+import copy
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils import metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class _InFlight:
+    """A shared call and the number of callers waiting for it."""
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+_in_flight: Dict[str, _InFlight] = {}
+
+async def run_once(key: str, call_fn: Callable[[], Awaitable[Any]],
+                   release: Optional[Callable[[], None]] = None) -> Any:
+    """
+    Run a call, or join an identical one that is already in flight.
+
+    Args:
+        key: Identity of the request (e.g. content hash + prompt + model)
+        call_fn: Zero-argument coroutine function performing the call
+        release: Frees this caller's inputs to the call (e.g. a scratch file);
+            run when the call finishes if this caller started it, otherwise
+            right away since the joined call does not use them
+
+    Returns:
+        The call's result (a private copy for every caller, so callers may mutate it)
+
+    Raises:
+        Exception: Whatever the shared call raised
+    """
+    entry = _in_flight.get(key)
+    if entry is None:
+        entry = _InFlight(asyncio.create_task(call_fn()))
+        _in_flight[key] = entry
+        entry.task.add_done_callback(lambda _: _in_flight.pop(key, None))
+        if release is not None:
+            entry.task.add_done_callback(lambda _: release())
+        metrics.increment("coalescing.leader_requests")
+    else:
+        logger.info("Joining an identical in-flight analysis")
+        metrics.increment("coalescing.coalesced_requests")
+        if release is not None:
+            release()
+
+    entry.waiters += 1
+    try:
+        # shield: one caller being cancelled must not cancel the others' call
+        result = await asyncio.shield(entry.task)
+    except asyncio.CancelledError:
+        entry.waiters -= 1
+        if entry.waiters == 0 and not entry.task.done():
+            entry.task.cancel()
+            metrics.increment("coalescing.abandoned_calls_cancelled")
+        raise
+    entry.waiters -= 1
+    return copy.deepcopy(result)
+
+def in_flight_count() -> int:
+    """Number of distinct calls currently in flight."""
+    return len(_in_flight)
@@ -0,0 +1,253 @@
+"""
+Result Cache Utility Module
+
+This module provides a content-addressed cache for analysis results so that
+re-submitting the exact same media (e.g. after a flaky mobile upload) does not
+pay for another vision call. Keys are SHA-256 digests of the uploaded bytes,
+the prompt text and the model name.
+
+There are two tiers:
+- an in-memory LRU (fast, per worker)
+- a SQLite file on disk (shared between workers, survives restarts) with a TTL
+  and a total size limit
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from fastapi import UploadFile
+
+from utils import metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+CACHE_MEMORY_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MEMORY_MAX_ENTRIES", "256"))
+CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_DISK_MAX_MB = int(os.getenv("RESULT_CACHE_DISK_MAX_MB", "100"))
+CACHE_DB_PATH = Path(os.getenv(
+    "RESULT_CACHE_DB_PATH",
+    str(Path(__file__).parent.parent.resolve() / "cache" / "result_cache.sqlite3")
+))
+HASH_CHUNK_SIZE = 1024 * 1024  # Read uploads 1MB at a time when hashing
+
+class ResultCache:
+    """Two-tier (memory LRU + SQLite) cache of JSON-serialisable results."""
+
+    def __init__(self, db_path: Path, memory_max_entries: int, ttl_seconds: int, disk_max_bytes: int):
+        self.db_path = db_path
+        self.memory_max_entries = memory_max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results(accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def _get_sync(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    metrics.increment("cache.memory_hits")
+                    return value
+                del self._memory[key]
+
+            conn = self._connection()
+            row = conn.execute("SELECT value, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                metrics.increment("cache.misses")
+                return None
+            if now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                conn.commit()
+                metrics.increment("cache.misses")
+                return None
+
+            conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            metrics.increment("cache.disk_hits")
+            return value
+
+    def _set_sync(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        serialized = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            # Keep a private copy: callers go on adding fields to the result they stored
+            self._remember(key, now, json.loads(serialized))
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, serialized, len(serialized), now, now)
+            )
+            # Drop expired entries, then least recently used ones until under the size limit
+            conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,))
+            total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total_size > self.disk_max_bytes:
+                rows = conn.execute("SELECT key, size FROM results ORDER BY accessed_at ASC").fetchall()
+                for old_key, size in rows:
+                    if total_size <= self.disk_max_bytes:
+                        break
+                    conn.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                    total_size -= size
+                    metrics.increment("cache.disk_evictions")
+            conn.commit()
+            metrics.increment("cache.stores")
+
+    def _remember(self, key: str, created_at: float, value: Dict[str, Any]) -> None:
+        """Insert into the memory LRU (caller holds the lock)."""
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            A copy of the cached result, or None on a miss
+        """
+        try:
+            value = await asyncio.to_thread(self._get_sync, key)
+        except sqlite3.Error as e:
+            logger.warning(f"Result cache lookup failed: {e}")
+            return None
+        return json.loads(json.dumps(value)) if value is not None else None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        Store a result in both tiers. Failures are logged and ignored.
+
+        Args:
+            key: Cache key from make_cache_key
+            value: JSON-serialisable result
+        """
+        try:
+            await asyncio.to_thread(self._set_sync, key, value)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Result cache store failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache sizes and hit/miss counters.
+
+        Returns:
+            Dictionary with entry counts, disk usage and hit rate
+        """
+        with self._lock:
+            memory_entries = len(self._memory)
+            try:
+                disk_entries, disk_bytes = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+                ).fetchone()
+            except sqlite3.Error:
+                disk_entries, disk_bytes = 0, 0
+
+        hits = metrics.get_counter("cache.memory_hits") + metrics.get_counter("cache.disk_hits")
+        lookups = hits + metrics.get_counter("cache.misses")
+        return {
+            "enabled": CACHE_ENABLED,
+            "memory_entries": memory_entries,
+            "disk_entries": disk_entries,
+            "disk_bytes": disk_bytes,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+result_cache = ResultCache(
+    db_path=CACHE_DB_PATH,
+    memory_max_entries=CACHE_MEMORY_MAX_ENTRIES,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    disk_max_bytes=CACHE_DISK_MAX_MB * 1024 * 1024
+)
+
+async def hash_upload(file: UploadFile) -> str:
+    """
+    Compute the SHA-256 digest of an uploaded file without keeping it in memory.
+
+    Args:
+        file: The uploaded file (its position is reset to 0 afterwards)
+
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    await file.seek(0)
+    while True:
+        chunk = await file.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+def make_cache_key(namespace: str, content_digests: List[str], prompts: List[str], model: str) -> str:
+    """
+    Build a content-addressed cache key.
+
+    Args:
+        namespace: Kind of result (e.g. "damage", "date")
+        content_digests: SHA-256 digests of the media (order does not matter)
+        prompts: Prompt texts that influence the result
+        model: Model/deployment name
+
+    Returns:
+        Hex SHA-256 cache key
+    """
+    key = hashlib.sha256()
+    key.update(namespace.encode("utf-8"))
+    for content_digest in sorted(content_digests):
+        key.update(content_digest.encode("ascii"))
+    for prompt in prompts:
+        key.update(hashlib.sha256((prompt or "").encode("utf-8")).digest())
+    key.update((model or "").encode("utf-8"))
+    return key.hexdigest()
+
+def mark_cache_hit(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flag a cached result and zero its usage, since serving it cost no tokens.
+
+    Args:
+        result: A result returned by result_cache.get
+
+    Returns:
+        The same result with cache_hit set and token/cost fields zeroed
+    """
+    result["cache_hit"] = True
+    for field in ("input_tokens", "cached_input_tokens", "output_tokens", "cost_usd", "cost_thb", "input_cost_usd", "output_cost_usd"):
+        if field in result:
+            result[field] = 0
+    if isinstance(result.get("token_usage"), dict):
+        result["token_usage"] = {name: 0 for name in result["token_usage"]}
+    return result
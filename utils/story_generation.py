@@ -5,84 +5,174 @@ This module handles the generation of stories from various media types
 (single image, multiple images, video) using OpenAI's vision model.
 """
 
-import json
-import re
 import logging
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Any, AsyncIterator, Tuple
 
 # Import from our utilities
-from utils import openai_client
-from utils.prompts import NEW_PROMPT
+from utils import openai_client, hedging, metrics
+from utils.prompts import NEW_PROMPT, VERDICT_MODE
+from utils.cost_utils import get_model_cost, get_input_cost_usd, get_cached_tokens, USD_TO_THB_RATE
+from utils.structured_output import (
+    STORY_SCHEMA, VERDICT_SCHEMA, text_format, parse_with_repair, partial_string_field
+)
+from utils.verdict_rendering import render_assessment
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Constants
+# In compact mode the model returns only a verdict and the text is rendered locally
+OUTPUT_SCHEMA_NAME, OUTPUT_SCHEMA = (
+    ("bottle_verdict", VERDICT_SCHEMA) if VERDICT_MODE == "compact" else ("bottle_assessment", STORY_SCHEMA)
+)
+OUTPUT_FORMAT = text_format(OUTPUT_SCHEMA_NAME, OUTPUT_SCHEMA)
 
-def parse_openai_response(content: Optional[str]) -> Dict[str, str]:
+async def _create_story_response(**kwargs) -> Any:
     """
-    Parse the response from OpenAI, extracting and validating the JSON.
+    Call the Responses API for a story, hedging slow calls when HEDGING_ENABLED is set.
     
     Args:
-        content: The raw response content from OpenAI
+        **kwargs: Arguments for openai_client.create_response (model is required)
         
     Returns:
-        Dict with parsed content, containing 'english' and 'thai' fields
-        
+        The Responses API response
+    """
+    return await hedging.hedged_call(
+        f"story.{kwargs['model']}", lambda: openai_client.create_response(**kwargs)
+    )
+
+async def _open_story_stream(**kwargs) -> Tuple[Any, Any]:
+    """
+    Open a streaming story call and wait for its first output event.
+
+    The lifecycle events sent as soon as the call is accepted are skipped, so the
+    wait (which hedging measures) covers the model's time to first output.
+
+    Args:
+        **kwargs: Arguments for openai_client.stream_response (model is required)
+
+    Returns:
+        Tuple of the stream and its first output event (None if the stream ended)
+    """
+    stream = await openai_client.stream_response(**kwargs)
+    try:
+        async for event in stream:
+            if event.type not in ("response.created", "response.in_progress"):
+                return stream, event
+        return stream, None
+    except BaseException:
+        # Includes cancellation of the losing hedge
+        await stream.close()
+        raise
+
+async def _close_stream(opened: Tuple[Any, Any]) -> None:
+    await opened[0].close()
+
+def _response_text(response: Any) -> str:
+    """
+    Get the output text of a Responses API response.
+    
     Raises:
-        ValueError: If the response can't be parsed or is missing required fields
+        ValueError: If the response has no output_text
     """
-    if not content:
-        raise ValueError("No content received from OpenAI")
+    # Prefer the output_text attribute if available (as in SDK example)
+    if getattr(response, "output_text", None):
+        return response.output_text
+    # Otherwise, search for the first output_text block in response.output
+    for block in getattr(response, "output", None) or []:
+        for content in getattr(block, "content", None) or []:
+            if getattr(content, "type", None) == "output_text":
+                return getattr(content, "text", "")
+    raise ValueError("No output_text found in OpenAI response")
+
+def _response_usage(response: Any) -> Tuple[int, int, int]:
+    """Get (input_tokens, output_tokens, cached_input_tokens) of a Responses API response."""
+    # Token usage is stored in usage field in newer versions of the API
+    if getattr(response, "usage", None):
+        usage = response.usage
+        return getattr(usage, "input_tokens", 0), getattr(usage, "output_tokens", 0), get_cached_tokens(usage)
+    # Fallback to direct attributes (older API versions)
+    return getattr(response, "input_tokens", 0), getattr(response, "output_tokens", 0), 0
+
+async def build_story_result(content: str, model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> Dict[str, Any]:
+    """
+    Parse the schema-constrained model output (rendering the text of a compact
+    verdict) and add token usage and cost.
     
-    try:
-        # Attempt to extract JSON from markdown code blocks first
-        # More robust regex to handle optional language specifier and whitespace
-        match = re.search(r"```(?:json)?\s*(\{.*?\})\s*", content, re.DOTALL)
-        if match:
-            json_content = match.group(1)
-            logger.info("Extracted JSON content from markdown code block.")
-        else:
-            # If no code block, assume the content might be raw JSON (or need cleaning)
-            # Basic cleaning: remove potential leading/trailing ``` if they exist without proper JSON structure
-            json_content = content.strip().strip("`")
-            if json_content.lower().startswith('json'):
-                json_content = json_content[4:].lstrip()
-        
-        # Parse the JSON
-        parsed_data = json.loads(json_content)
-        
-        # Validate expected fields (basic validation)
-        if not isinstance(parsed_data, dict) or 'english' not in parsed_data:
-             raise ValueError("Parsed JSON does not contain the required 'english' field.")
+    Args:
+        content: The raw output text
+        model: The model that produced the output (for its rates)
+        input_tokens: Input tokens used
+        output_tokens: Output tokens used
+        cached_tokens: Input tokens served from the provider's prompt cache
         
-        # Ensure english is string, thai is string or None
-        english = str(parsed_data.get('english', ''))
-        thai = str(parsed_data.get('thai', '')) if parsed_data.get('thai') is not None else None
-        claimable = parsed_data.get('claimable', False)
+    Returns:
+        Dict with 'english', 'thai', 'claimable', token counts, and input/output/total cost fields
         
-        return {
-            "english": english, 
-            "thai": thai or "",
-            "claimable": claimable
-        } # Return empty string if thai is None/missing
+    Raises:
+        ValueError: If the output does not match the schema even after one repair call
+    """
+    parsed_response, repair_input, repair_output = await parse_with_repair(
+        content, OUTPUT_SCHEMA_NAME, OUTPUT_SCHEMA, model
+    )
+    if VERDICT_MODE == "compact":
+        parsed_response = render_assessment(parsed_response)
+    input_tokens += repair_input
+    output_tokens += repair_output
 
-    except json.JSONDecodeError as e:
-        logger.error(f"Error decoding JSON from OpenAI response: {e}")
-        logger.error(f"Raw content: {content[:500]}...") # Log partial raw content
-        raise ValueError(f"Could not parse JSON response from AI: {e}")
-    except Exception as e:
-        logger.error(f"Error processing OpenAI response content: {e}")
-        logger.error(f"Raw content: {content[:500]}...")
-        raise ValueError(f"Error processing AI response: {e}")
+    # Calculate costs; the cached prompt prefix is billed at the discounted rate
+    input_cost_usd = get_input_cost_usd(model, input_tokens, cached_tokens)
+    output_cost_usd = output_tokens * get_model_cost(model)["output"] / 1_000_000
+    total_cost_usd = input_cost_usd + output_cost_usd
+    total_cost_thb = total_cost_usd * USD_TO_THB_RATE
+
+    # Add token usage and cost to the response
+    parsed_response["input_tokens"] = input_tokens
+    parsed_response["cached_input_tokens"] = cached_tokens
+    parsed_response["output_tokens"] = output_tokens
+    parsed_response["input_cost_usd"] = input_cost_usd
+    parsed_response["output_cost_usd"] = output_cost_usd
+
+    # Use more precision for very small amounts
+    precision = 6 if total_cost_usd < 0.01 else 4
+    parsed_response["cost_usd"] = round(total_cost_usd, precision)
+    parsed_response["cost_thb"] = round(total_cost_thb, precision)
+
+    # Per-mode output totals so prose and compact verdicts can be compared at /stats/
+    metrics.increment(f"verdict_mode.{VERDICT_MODE}.requests")
+    metrics.increment(f"verdict_mode.{VERDICT_MODE}.output_tokens", output_tokens)
+
+    # Log token usage and cost for debugging
+    logger.info(f"Token usage - Input: {input_tokens} ({cached_tokens} cached), Output: {output_tokens}")
+    logger.info(f"Cost - USD: {total_cost_usd:.6f}, THB: {total_cost_thb:.6f}")
+    return parsed_response
 
-def generate_story_from_image(base64_image: str, user_prompt: str) -> Dict[str, str]:
+def _image_input(base64_images: List[str], user_prompt: str, detail: str) -> List[Dict[str, Any]]:
+    """
+    Build the Responses API input: stable text first, then the images.
+
+    The instructions (NEW_PROMPT, or the same rendering of a criteria selection)
+    are the byte-identical prefix of every call, so the provider can serve them
+    from its prompt cache. The user prompt is only added when it is not NEW_PROMPT
+    itself, instead of sending the prompt twice.
+    """
+    user_content: List[Dict[str, Any]] = []
+    if user_prompt and user_prompt != NEW_PROMPT:
+        user_content.append({"type": "input_text", "text": user_prompt})
+    for img_b64 in base64_images:
+        user_content.append({"type": "input_image", "image_url": f"data:image/jpeg;base64,{img_b64}", "detail": detail})
+    return [{"role": "user", "content": user_content}]
+
+async def generate_story_from_image(base64_image: str, user_prompt: str, detail: str = "high",
+                                   instructions: str = NEW_PROMPT) -> Dict[str, str]:
     """
     Generates story from a single base64 encoded image using the OpenAI Responses API.
     
     Args:
         base64_image: The base64-encoded image data
         user_prompt: Optional user prompt to guide the story generation
+        detail: Vision detail level ("low", "high" or "auto")
+        instructions: Assessment instructions (the full NEW_PROMPT by default)
         
     Returns:
         Dict with 'english', 'thai', 'input_tokens', 'output_tokens', 'cost_usd', and 'cost_thb' fields
@@ -92,99 +182,18 @@ def generate_story_from_image(base64_image: str, user_prompt: str) -> Dict[str,
         ValueError: If response parsing fails
     """
     logger.info("Generating story from single image (Responses API).")
-    if openai_client.get_client() is None:
-        raise RuntimeError("OpenAI client not initialized")
-
-    # Cost constants for gpt-4.1-mini (per 1M tokens)
-    INPUT_COST_USD_PER_MILLION = 0.40
-    OUTPUT_COST_USD_PER_MILLION = 1.60
-    USD_TO_THB_RATE = 35.0
+    return await generate_story_from_multiple_images([base64_image], user_prompt, detail=detail, instructions=instructions)
 
-    input_data = [
-        {
-            "role": "user",
-            "content": [
-                {"type": "input_text", "text": user_prompt},
-                {"type": "input_image", "image_url": f"data:image/jpeg;base64,{base64_image}"}
-            ]
-        }
-    ]
-
-    try:
-        response = openai_client.get_client().responses.create(
-            model=openai_client.get_active_model(),
-            input=input_data,
-            instructions=NEW_PROMPT,
-            # max_tokens is not supported in Responses API; control output length via prompt/instructions
-            temperature=0,
-            top_p=1,
-        )
-        
-        # Extract token usage information
-        # Token usage is stored in usage field in newer versions of the API
-        input_tokens = 0
-        output_tokens = 0
-        
-        if hasattr(response, "usage") and response.usage:
-            input_tokens = getattr(response.usage, "input_tokens", 0)
-            output_tokens = getattr(response.usage, "output_tokens", 0)
-        else:
-            # Fallback to direct attributes (older API versions)
-            input_tokens = getattr(response, "input_tokens", 0)
-            output_tokens = getattr(response, "output_tokens", 0)
-        
-        # Parse the text response
-        parsed_response = {}
-        
-        # Prefer the output_text attribute if available (as in SDK example)
-        if hasattr(response, "output_text") and response.output_text:
-            parsed_response = parse_openai_response(response.output_text)
-        # Otherwise, search for the first output_text block in response.output
-        else:
-            for block in response.output:
-                for content in getattr(block, "content", []):
-                    if getattr(content, "type", None) == "output_text":
-                        parsed_response = parse_openai_response(getattr(content, "text", ""))
-                        break
-                if parsed_response:
-                    break
-            if not parsed_response:
-                raise ValueError("No output_text found in OpenAI response")
-        
-        # Calculate costs
-        input_cost_usd = (input_tokens / 1000000) * INPUT_COST_USD_PER_MILLION
-        output_cost_usd = (output_tokens / 1000000) * OUTPUT_COST_USD_PER_MILLION
-        total_cost_usd = input_cost_usd + output_cost_usd
-        total_cost_thb = total_cost_usd * USD_TO_THB_RATE
-        
-        # Add token usage and cost to the response
-        parsed_response["input_tokens"] = input_tokens
-        parsed_response["output_tokens"] = output_tokens
-        
-        # Use more precision for very small amounts
-        if total_cost_usd < 0.01:
-            parsed_response["cost_usd"] = round(total_cost_usd, 6)
-            parsed_response["cost_thb"] = round(total_cost_thb, 6)
-        else:
-            parsed_response["cost_usd"] = round(total_cost_usd, 4)
-            parsed_response["cost_thb"] = round(total_cost_thb, 4)
-        
-        # Log token usage and cost for debugging
-        logger.info(f"Token usage - Input: {input_tokens}, Output: {output_tokens}")
-        logger.info(f"Cost - USD: {total_cost_usd:.6f}, THB: {total_cost_thb:.6f}")
-        
-        return parsed_response
-    except Exception as e:
-        logger.error(f"Error in generate_story_from_image (Responses API): {e}")
-        raise
-
-def generate_story_from_multiple_images(base64_images: List[str], user_prompt: str) -> Dict[str, str]:
+async def generate_story_from_multiple_images(base64_images: List[str], user_prompt: str, detail: str = "high",
+                                              instructions: str = NEW_PROMPT) -> Dict[str, str]:
     """
     Generates story from multiple base64 encoded images using the OpenAI Responses API.
     
     Args:
         base64_images: List of base64-encoded image data
         user_prompt: Optional user prompt to guide the story generation
+        detail: Vision detail level ("low", "high" or "auto")
+        instructions: Assessment instructions (the full NEW_PROMPT by default)
         
     Returns:
         Dict with 'english', 'thai', 'input_tokens', 'output_tokens', 'cost_usd', and 'cost_thb' fields
@@ -197,88 +206,89 @@ def generate_story_from_multiple_images(base64_images: List[str], user_prompt: s
     if openai_client.get_client() is None:
         raise RuntimeError("OpenAI client not initialized")
 
-    # Cost constants for gpt-4.1-mini (per 1M tokens)
-    INPUT_COST_USD_PER_MILLION = 0.40
-    OUTPUT_COST_USD_PER_MILLION = 1.60
-    USD_TO_THB_RATE = 35.0
-
-    user_content: List[Dict[str, Any]] = [
-        {"type": "input_text", "text": user_prompt}
-    ]
-    for img_b64 in base64_images:
-        user_content.append({"type": "input_image", "image_url": f"data:image/jpeg;base64,{img_b64}"})
-
-    input_data = [
-        {"role": "user", "content": user_content}
-    ]
-
+    model = openai_client.get_active_model()
     try:
-        response = openai_client.get_client().responses.create(
-            model=openai_client.get_active_model(),
-            input=input_data,
-            instructions=NEW_PROMPT,
+        response = await _create_story_response(
+            model=model,
+            input=_image_input(base64_images, user_prompt, detail),
+            instructions=instructions,
+            text=OUTPUT_FORMAT,
             # max_tokens is not supported in Responses API; control output length via prompt/instructions
             temperature=0,
             top_p=1,
         )
-        
-        # Extract token usage information
-        # Token usage is stored in usage field in newer versions of the API
-        input_tokens = 0
-        output_tokens = 0
-        
-        if hasattr(response, "usage") and response.usage:
-            input_tokens = getattr(response.usage, "input_tokens", 0)
-            output_tokens = getattr(response.usage, "output_tokens", 0)
-        else:
-            # Fallback to direct attributes (older API versions)
-            input_tokens = getattr(response, "input_tokens", 0)
-            output_tokens = getattr(response, "output_tokens", 0)
-        
-        # Parse the text response
-        parsed_response = {}
-        
-        if hasattr(response, "output_text") and response.output_text:
-            parsed_response = parse_openai_response(response.output_text)
-        else:
-            for block in response.output:
-                for content in getattr(block, "content", []):
-                    if getattr(content, "type", None) == "output_text":
-                        parsed_response = parse_openai_response(getattr(content, "text", ""))
-                        break
-                if parsed_response:
-                    break
-            if not parsed_response:
-                raise ValueError("No output_text found in OpenAI response")
-        
-        # Calculate costs
-        input_cost_usd = (input_tokens / 1000000) * INPUT_COST_USD_PER_MILLION
-        output_cost_usd = (output_tokens / 1000000) * OUTPUT_COST_USD_PER_MILLION
-        total_cost_usd = input_cost_usd + output_cost_usd
-        total_cost_thb = total_cost_usd * USD_TO_THB_RATE
-        
-        # Add token usage and cost to the response
-        parsed_response["input_tokens"] = input_tokens
-        parsed_response["output_tokens"] = output_tokens
-        
-        # Use more precision for very small amounts
-        if total_cost_usd < 0.01:
-            parsed_response["cost_usd"] = round(total_cost_usd, 6)
-            parsed_response["cost_thb"] = round(total_cost_thb, 6)
-        else:
-            parsed_response["cost_usd"] = round(total_cost_usd, 4)
-            parsed_response["cost_thb"] = round(total_cost_thb, 4)
-        
-        # Log token usage and cost for debugging
-        logger.info(f"Token usage - Input: {input_tokens}, Output: {output_tokens}")
-        logger.info(f"Cost - USD: {total_cost_usd:.6f}, THB: {total_cost_thb:.6f}")
-        
-        return parsed_response
+        return await build_story_result(_response_text(response), model, *_response_usage(response))
     except Exception as e:
         logger.error(f"Error in generate_story_from_multiple_images (Responses API): {e}")
         raise
 
-def generate_story_from_video(video_details: Dict[str, Any], user_prompt: str) -> Dict[str, str]:
+async def stream_story_from_images(base64_images: List[str], user_prompt: str, detail: str = "high",
+                                   instructions: str = NEW_PROMPT) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams story generation from base64 encoded images using the OpenAI Responses API.
+    
+    Args:
+        base64_images: List of base64-encoded image data
+        user_prompt: Optional user prompt to guide the story generation
+        detail: Vision detail level ("low", "high" or "auto")
+        instructions: Assessment instructions (the full NEW_PROMPT by default)
+        
+    Yields:
+        {"type": "delta", "text": ...} for each decoded chunk of the English assessment, then
+        {"type": "result", "result": ...} with the same dict generate_story_from_multiple_images returns
+        
+    Raises:
+        RuntimeError: If OpenAI client is not initialized
+        ValueError: If the stream ends without a completed response or parsing fails
+    """
+    logger.info(f"Streaming story from {len(base64_images)} images (Responses API).")
+    if openai_client.get_client() is None:
+        raise RuntimeError("OpenAI client not initialized")
+
+    model = openai_client.get_active_model()
+    # Hedge the time to first output: a stalled stream is replaced by whichever starts first
+    stream, first_event = await hedging.hedged_call(
+        f"story_stream.{model}",
+        lambda: _open_story_stream(
+            model=model,
+            input=_image_input(base64_images, user_prompt, detail),
+            instructions=instructions,
+            text=OUTPUT_FORMAT,
+            temperature=0,
+            top_p=1,
+        ),
+        discard=_close_stream,
+    )
+    response = None
+    content = ""
+    shown = ""
+    try:
+        async for event in _prepend(first_event, stream):
+            if event.type == "response.output_text.delta":
+                # The output is JSON; show the English assessment as it is decoded
+                content += event.delta
+                english = partial_string_field(content, "english")
+                if len(english) > len(shown):
+                    yield {"type": "delta", "text": english[len(shown):]}
+                    shown = english
+            elif event.type in ("response.completed", "response.incomplete"):
+                response = event.response
+            elif event.type in ("response.failed", "error"):
+                raise ValueError(f"Streaming response failed: {getattr(event, 'message', None) or event.type}")
+    finally:
+        await stream.close()
+    if response is None:
+        raise ValueError("Stream ended without a completed response")
+    yield {"type": "result", "result": await build_story_result(_response_text(response), model, *_response_usage(response))}
+
+async def _prepend(first_event: Any, stream: Any) -> AsyncIterator[Any]:
+    """Iterate a stream whose first event was already read."""
+    if first_event is not None:
+        yield first_event
+        async for event in stream:
+            yield event
+
+async def generate_story_from_video(video_details: Dict[str, Any], user_prompt: str) -> Dict[str, str]:
     """
     Generates a story based on video metadata when frame extraction fails.
     Uses available metadata like duration, resolution, filename, etc.
@@ -297,11 +307,6 @@ def generate_story_from_video(video_details: Dict[str, Any], user_prompt: str) -
     if openai_client.get_client() is None:
         raise RuntimeError("OpenAI client not initialized")
     
-    # Cost constants for gpt-4.1-mini (per 1M tokens)
-    INPUT_COST_USD_PER_MILLION = 0.40
-    OUTPUT_COST_USD_PER_MILLION = 1.60
-    USD_TO_THB_RATE = 35.0
-    
     # Prepare metadata description
     filename = video_details.get('filename', 'Unknown file')
     duration = video_details.get('duration', 'Unknown')
@@ -325,70 +330,20 @@ def generate_story_from_video(video_details: Dict[str, Any], user_prompt: str) -
     if file_ext:
         metadata_description += f"The video format is {file_ext}. "
     
-    # Create a prompt with the metadata description
-    prompt = (
-        f"User prompt: {user_prompt}"
-    )
+    # The instructions are the cached prefix; only the metadata (and any extra user prompt) varies
+    prompt = metadata_description if user_prompt == NEW_PROMPT else f"User prompt: {user_prompt}\n{metadata_description}"
     
+    model = openai_client.get_active_model()
     try:
         # Make an actual API call using text only (since we don't have frames)
-        response = openai_client.get_client().responses.create(
-            model=openai_client.get_active_model(),
+        response = await _create_story_response(
+            model=model,
             input=[{"role": "user", "content": [{"type": "input_text", "text": prompt}]}],
-            instructions=NEW_PROMPT
+            instructions=NEW_PROMPT,
+            text=OUTPUT_FORMAT
         )
         
-        # Extract token usage information
-        input_tokens = 0
-        output_tokens = 0
-        
-        if hasattr(response, "usage") and response.usage:
-            input_tokens = getattr(response.usage, "input_tokens", 0)
-            output_tokens = getattr(response.usage, "output_tokens", 0)
-        else:
-            # Fallback to direct attributes (older API versions)
-            input_tokens = getattr(response, "input_tokens", 0)
-            output_tokens = getattr(response, "output_tokens", 0)
-        
-        # Parse the text response
-        parsed_response = {}
-        
-        if hasattr(response, "output_text") and response.output_text:
-            parsed_response = parse_openai_response(response.output_text)
-        else:
-            for block in response.output:
-                for content in getattr(block, "content", []):
-                    if getattr(content, "type", None) == "output_text":
-                        parsed_response = parse_openai_response(getattr(content, "text", ""))
-                        break
-                if parsed_response:
-                    break
-            if not parsed_response:
-                raise ValueError("No output_text found in OpenAI response")
-        
-        # Calculate costs
-        input_cost_usd = (input_tokens / 1000000) * INPUT_COST_USD_PER_MILLION
-        output_cost_usd = (output_tokens / 1000000) * OUTPUT_COST_USD_PER_MILLION
-        total_cost_usd = input_cost_usd + output_cost_usd
-        total_cost_thb = total_cost_usd * USD_TO_THB_RATE
-        
-        # Add token usage and cost to the response
-        parsed_response["input_tokens"] = input_tokens
-        parsed_response["output_tokens"] = output_tokens
-        
-        # Use more precision for very small amounts
-        if total_cost_usd < 0.01:
-            parsed_response["cost_usd"] = round(total_cost_usd, 6)
-            parsed_response["cost_thb"] = round(total_cost_thb, 6)
-        else:
-            parsed_response["cost_usd"] = round(total_cost_usd, 4)
-            parsed_response["cost_thb"] = round(total_cost_thb, 4)
-        
-        # Log token usage and cost for debugging
-        logger.info(f"Token usage from video metadata - Input: {input_tokens}, Output: {output_tokens}")
-        logger.info(f"Cost - USD: {total_cost_usd:.6f}, THB: {total_cost_thb:.6f}")
-        
-        return parsed_response
+        return await build_story_result(_response_text(response), model, *_response_usage(response))
         
     except Exception as e:
         logger.error(f"Error generating story from video metadata: {e}")
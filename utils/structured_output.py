@@ -0,0 +1,195 @@
+"""
+Structured Output Utility Module
+
+This module defines the strict JSON schemas the models answer in (the bottle
+assessment or compact verdict, and the date code) and parses answers against them. Instead of
+recovering JSON from free text, a schema-constrained answer is loaded and
+type-checked directly; if it still fails (e.g. the output was cut short), one
+text-only repair call reformats it before the request is failed.
+"""
+
+import re
+import json
+import logging
+from typing import Dict, Any, Tuple
+
+# Import from our utilities
+from utils import openai_client, metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+STORY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "english": {"type": "string"},
+        "thai": {"type": "string"},
+        "claimable": {"type": "boolean"},
+    },
+    "required": ["english", "thai", "claimable"],
+    "additionalProperties": False,
+}
+
+# Condition codes per bottle part and decision reason codes of the compact verdict;
+# their English/Thai text lives under "verdict" in static/locales/*.json
+PART_CONDITIONS = {
+    "cap": ["sealed", "loose", "missing", "unclear"],
+    "neck": ["intact", "clean_separation", "shattered", "missing", "unclear"],
+    "body": ["intact", "minor_damage", "cracked", "shattered", "unclear"],
+    "bottom": ["intact", "clean_separation", "shattered", "missing", "unclear"],
+}
+VERDICT_REASONS = [
+    "not_chang", "intact", "cap_sealed", "clean_base_separation", "clean_neck_separation",
+    "minor_damage", "bottom_missing", "shattered", "structure_lost", "unclear_photo",
+]
+
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "claimable": {"type": "boolean"},
+        "chang_bottle": {"type": "boolean"},
+        **{
+            part: {
+                "type": "object",
+                "properties": {
+                    "pass": {"type": "boolean"},
+                    "condition": {"type": "string", "enum": conditions},
+                },
+                "required": ["pass", "condition"],
+                "additionalProperties": False,
+            }
+            for part, conditions in PART_CONDITIONS.items()
+        },
+        "reason": {"type": "string", "enum": VERDICT_REASONS},
+    },
+    "required": ["claimable", "chang_bottle", *PART_CONDITIONS, "reason"],
+    "additionalProperties": False,
+}
+
+DATE_CODE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "date_code": {"type": ["string", "null"]},
+    },
+    "required": ["date_code"],
+    "additionalProperties": False,
+}
+
+REPAIR_INSTRUCTIONS = (
+    "Rewrite the text below as a JSON object matching the given schema. "
+    "Keep the original wording and decisions; do not add new information."
+)
+
+_JSON_TYPES = {"string": str, "boolean": bool, "null": type(None), "object": dict}
+
+def text_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Responses API `text` argument requesting a strict JSON schema."""
+    return {"format": {"type": "json_schema", "name": name, "schema": schema, "strict": True}}
+
+def chat_response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Chat Completions `response_format` argument requesting a strict JSON schema."""
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+
+def parse_structured(content: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Load a schema-constrained answer and check its keys and types.
+
+    Args:
+        content: The raw output text
+        schema: The JSON schema the answer was requested in
+
+    Returns:
+        The parsed object (only the schema's keys)
+
+    Raises:
+        ValueError: If the content is not a JSON object matching the schema
+    """
+    if not content:
+        raise ValueError("No content received from OpenAI")
+    parsed = json.loads(content)  # JSONDecodeError is a ValueError
+    if not isinstance(parsed, dict):
+        raise ValueError("Response is not a JSON object")
+    return _check_object(parsed, schema, "Response")
+
+def _check_object(value: Dict[str, Any], schema: Dict[str, Any], path: str) -> Dict[str, Any]:
+    """Check an object's required keys (recursing into nested objects); returns only those keys."""
+    checked = {}
+    for key in schema["required"]:
+        field, field_path = schema["properties"][key], f"{path} field '{key}'"
+        if key not in value:
+            raise ValueError(f"{path} is missing the '{key}' field")
+        types = field["type"] if isinstance(field["type"], list) else [field["type"]]
+        if not any(isinstance(value[key], _JSON_TYPES[name]) for name in types):
+            raise ValueError(f"{field_path} is not of type {types}")
+        if "enum" in field and value[key] not in field["enum"]:
+            raise ValueError(f"{field_path} has an unknown value: {value[key]!r}")
+        checked[key] = _check_object(value[key], field, field_path) if "required" in field else value[key]
+    return checked
+
+async def parse_with_repair(content: str, name: str, schema: Dict[str, Any], model: str) -> Tuple[Dict[str, Any], int, int]:
+    """
+    Parse a schema-constrained answer, making one text-only repair call if it fails.
+
+    Args:
+        content: The raw output text
+        name: Schema name, used for the repair call and metrics
+        schema: The JSON schema the answer was requested in
+        model: Model to send the repair call to
+
+    Returns:
+        Tuple of the parsed object and the repair call's input and output tokens (0 if none)
+
+    Raises:
+        ValueError: If the answer is empty or still does not match after the repair
+    """
+    try:
+        parsed = parse_structured(content, schema)
+        metrics.increment(f"structured_output.{name}.parsed")
+        return parsed, 0, 0
+    except ValueError as e:
+        if not content:
+            metrics.increment(f"structured_output.{name}.failed")
+            raise
+        logger.warning(f"Structured {name} output did not parse ({e}). Sending one repair call.")
+
+    response = await openai_client.create_response(
+        model=model,
+        instructions=REPAIR_INSTRUCTIONS,
+        input=[{"role": "user", "content": [{"type": "input_text", "text": content}]}],
+        text=text_format(name, schema),
+        temperature=0,
+    )
+    usage = getattr(response, "usage", None)
+    input_tokens = getattr(usage, "input_tokens", 0)
+    output_tokens = getattr(usage, "output_tokens", 0)
+    try:
+        parsed = parse_structured(getattr(response, "output_text", ""), schema)
+    except ValueError:
+        logger.error(f"Repaired {name} output still did not parse. Raw content: {content[:500]}...")
+        metrics.increment(f"structured_output.{name}.failed")
+        raise
+    # A parse failure that would otherwise have been a 500 and a manual resubmit
+    metrics.increment(f"structured_output.{name}.repaired")
+    return parsed, input_tokens, output_tokens
+
+def partial_string_field(content: str, key: str) -> str:
+    """
+    Decode the part of a string field received so far in a streamed JSON answer.
+
+    Args:
+        content: The JSON text received so far
+        key: The field to read
+
+    Returns:
+        The decoded value so far ("" if the field has not started)
+    """
+    start = re.search(rf'"{key}"\s*:\s*"', content)
+    if not start:
+        return ""
+    # Complete characters and escapes only, up to the closing quote or the end of the text
+    value = re.match(r'(?:[^"\\]|\\u[0-9a-fA-F]{4}|\\[^u])*', content[start.end():]).group(0)
+    try:
+        return json.loads(f'"{value}"', strict=False)
+    except ValueError:
+        return ""
@@ -0,0 +1,176 @@
+"""
+Triage Utility Module
+
+This module screens damage photos with a small model, a tiny prompt and
+low-detail downscaled images before the full assessment. Submissions that are
+clearly not a Chang bottle or too poor to assess are rejected at a fraction of
+the cost; everything else (including "unsure" answers) goes on to the full
+assessment.
+"""
+
+import os
+import json
+import base64
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional
+from openai import OpenAIError
+
+# Import from our utilities
+from utils import openai_client, metrics, deployment_pool
+from utils.prompts import build_triage_prompt
+from utils.criteria_selection import CRITERIA_SELECTION_ENABLED
+from utils.cost_utils import get_model_cost, get_input_cost_usd, get_cached_tokens, USD_TO_THB_RATE
+from utils.image_preprocess import VISION_BUDGETS, fit_image_to_budget
+from utils.circuit_breaker import CircuitOpenError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "false").lower() == "true"  # Opt-in: needs a TRIAGE_MODEL deployment
+TRIAGE_MODEL = os.getenv("TRIAGE_MODEL", "gpt-4.1-mini")
+TRIAGE_ANSWERS = ("yes", "no", "unsure")
+
+# Allowed answers per question; anything else is treated as "unsure". The damage
+# signals (shattered, spillage, break_location) are only asked for when they
+# select the criteria for the full assessment.
+TRIAGE_QUESTIONS = {
+    "chang_bottle": TRIAGE_ANSWERS,
+    "broken": TRIAGE_ANSWERS,
+    "usable": TRIAGE_ANSWERS,
+}
+if CRITERIA_SELECTION_ENABLED:
+    TRIAGE_QUESTIONS.update({
+        "shattered": TRIAGE_ANSWERS,
+        "spillage": TRIAGE_ANSWERS,
+        "break_location": ("neck", "body", "base", "none", "unsure"),
+    })
+TRIAGE_PROMPT = build_triage_prompt(damage_signals=CRITERIA_SELECTION_ENABLED)
+TRIAGE_MAX_TOKENS = 60 if CRITERIA_SELECTION_ENABLED else 40
+
+# Clear rejects, checked in order: (question, english reason, thai reason)
+TRIAGE_REJECTIONS = [
+    ("chang_bottle", "This bottle is not brand Chang cannot claim.",
+     "ขวดนี้ไม่ใช่ยี่ห้อช้าง ไม่สามารถเคลมได้"),
+    ("usable", "The photo is not clear enough to assess the bottle. Please retake the photo.",
+     "ภาพไม่ชัดเจนพอสำหรับการประเมินขวด กรุณาถ่ายภาพใหม่"),
+]
+
+async def triage_images(images: List[bytes]) -> Optional[Dict[str, Any]]:
+    """
+    Ask the triage model whether the photos show a usable, Chang, broken bottle,
+    and (with criteria selection enabled) for the damage signals used to select
+    the assessment criteria.
+
+    Args:
+        images: The image file contents (see media_processing.read_images)
+
+    Returns:
+        Dictionary with the answers, 'reject' (the failed question or None),
+        model, token usage and cost; None if triage is disabled, the model is
+        not deployed or the call fails (the full assessment then runs as usual)
+    """
+    if not TRIAGE_ENABLED or not deployment_pool.pool.serves(TRIAGE_MODEL):
+        return None
+
+    content: List[Dict[str, Any]] = [{"type": "text", "text": TRIAGE_PROMPT}]
+    for contents in images:
+        processed, _ = await asyncio.to_thread(fit_image_to_budget, contents, "triage")
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{base64.b64encode(processed).decode('utf-8')}",
+                "detail": VISION_BUDGETS["triage"]["detail"]
+            }
+        })
+
+    try:
+        response = await openai_client.create_chat_completion(
+            model=TRIAGE_MODEL,
+            messages=[{"role": "user", "content": content}],
+            max_completion_tokens=TRIAGE_MAX_TOKENS,
+            response_format={"type": "json_object"},
+        )
+        answers = json.loads(response.choices[0].message.content or "{}")
+    except (OpenAIError, CircuitOpenError, ValueError) as e:
+        logger.warning(f"Triage failed ({type(e).__name__}: {e}). Running the full assessment.")
+        metrics.increment("triage.errors")
+        return None
+
+    answers = {key: str(answers.get(key, "unsure")).strip().lower() for key in TRIAGE_QUESTIONS}
+    answers = {key: value if value in TRIAGE_QUESTIONS[key] else "unsure" for key, value in answers.items()}
+    reject = next((question for question, _, _ in TRIAGE_REJECTIONS if answers[question] == "no"), None)
+
+    input_tokens = response.usage.prompt_tokens
+    output_tokens = response.usage.completion_tokens
+    input_cost_usd = get_input_cost_usd(TRIAGE_MODEL, input_tokens, get_cached_tokens(response.usage))
+    output_cost_usd = output_tokens * get_model_cost(TRIAGE_MODEL)["output"] / 1_000_000
+    cost_usd = input_cost_usd + output_cost_usd
+
+    metrics.increment("triage.requests")
+    metrics.increment("triage.cost_usd", cost_usd)
+    metrics.increment(f"triage.rejected.{reject}" if reject else "triage.forwarded")
+    logger.info(f"Triage answers: {answers} (reject={reject})")
+
+    return {
+        **answers,
+        "reject": reject,
+        "model": TRIAGE_MODEL,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "input_cost_usd": input_cost_usd,
+        "output_cost_usd": output_cost_usd,
+        "cost_usd": cost_usd,
+    }
+
+def _triage_answers(triage: Dict[str, Any]) -> Dict[str, Any]:
+    """The triage result without its usage and cost fields."""
+    return {key: value for key, value in triage.items() if not key.endswith(("_tokens", "cost_usd"))}
+
+def build_triage_rejection(triage: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build an UNCLAIM assessment for a submission rejected by triage.
+
+    Args:
+        triage: Result of triage_images with a 'reject' question
+
+    Returns:
+        Assessment in the same shape as the full analysis result
+    """
+    english_reason, thai_reason = next(
+        (english, thai) for question, english, thai in TRIAGE_REJECTIONS if question == triage["reject"]
+    )
+    return {
+        "english": f"**Bottle Assessment:**\n❌ **UNCLAIM** {english_reason}",
+        "thai": f"**ผลการประเมินขวด:**\n❌ **เคลมไม่ได้** {thai_reason}",
+        "claimable": False,
+        "triage_rejected": True,
+        "triage": _triage_answers(triage),
+        "input_tokens": triage["input_tokens"],
+        "output_tokens": triage["output_tokens"],
+        "input_cost_usd": triage["input_cost_usd"],
+        "output_cost_usd": triage["output_cost_usd"],
+        "cost_usd": round(triage["cost_usd"], 6),
+        "cost_thb": round(triage["cost_usd"] * USD_TO_THB_RATE, 6),
+    }
+
+def add_triage_usage(result: Dict[str, Any], triage: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fold the triage call's usage into a full assessment result.
+
+    Args:
+        result: The full analysis result (modified in place)
+        triage: Result of triage_images
+
+    Returns:
+        The same result with triage tokens/cost added and the answers under 'triage'
+    """
+    result["input_tokens"] = result.get("input_tokens", 0) + triage["input_tokens"]
+    result["output_tokens"] = result.get("output_tokens", 0) + triage["output_tokens"]
+    result["input_cost_usd"] = result.get("input_cost_usd", 0) + triage["input_cost_usd"]
+    result["output_cost_usd"] = result.get("output_cost_usd", 0) + triage["output_cost_usd"]
+    result["cost_usd"] = round(result.get("cost_usd", 0) + triage["cost_usd"], 6)
+    result["cost_thb"] = round(result.get("cost_thb", 0) + triage["cost_usd"] * USD_TO_THB_RATE, 6)
+    result["triage"] = _triage_answers(triage)
+    return result
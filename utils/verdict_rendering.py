@@ -0,0 +1,73 @@
+"""
+Verdict Rendering Utility Module
+
+This module writes the English and Thai assessment text for a compact verdict
+(VERDICT_MODE=compact), so the model only generates a few dozen tokens of codes
+instead of the assessment prose in two languages. The wording comes from the
+"verdict" templates in static/locales/en.json and th.json, the same files the
+web UI is translated from.
+"""
+
+import json
+import logging
+from pathlib import Path
+from functools import lru_cache
+from typing import Dict, Any
+
+# Import from our utilities
+from utils.structured_output import PART_CONDITIONS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+LOCALES_DIR = Path(__file__).resolve().parent.parent / "static" / "locales"
+
+@lru_cache(maxsize=None)
+def _templates(language: str) -> Dict[str, Any]:
+    """The "verdict" templates of a locale file (loaded once)."""
+    with open(LOCALES_DIR / f"{language}.json", encoding="utf-8") as f:
+        return json.load(f)["verdict"]
+
+def render_verdict(verdict: Dict[str, Any], language: str) -> str:
+    """
+    Render a compact verdict in the assessment output format.
+
+    Args:
+        verdict: The parsed verdict (claimable, chang_bottle, per-part checks, reason)
+        language: Locale name ("en" or "th")
+
+    Returns:
+        The assessment text, e.g. "**Bottle Assessment:**\n✅ Cap: ...\n...\n✅ **CLAIM** ..."
+    """
+    templates = _templates(language)
+    lines = [f"**{templates['title']}**"]
+
+    # A non-Chang bottle is rejected without checking the parts
+    if verdict["reason"] != "not_chang":
+        for part in PART_CONDITIONS:
+            check = verdict[part]
+            condition = templates["conditions"][part].get(check["condition"], check["condition"])
+            lines.append(f"{'✅' if check['pass'] else '❌'} {templates['parts'][part]}: {condition}")
+
+    decision = templates["claim"] if verdict["claimable"] else templates["unclaim"]
+    reason = templates["reasons"].get(verdict["reason"], verdict["reason"])
+    lines.append(f"{'✅' if verdict['claimable'] else '❌'} **{decision}** {reason}")
+    return "\n".join(lines)
+
+def render_assessment(verdict: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the english/thai/claimable fields of an assessment from a compact verdict.
+
+    Args:
+        verdict: The parsed verdict
+
+    Returns:
+        Dict with 'english', 'thai', 'claimable' and the raw 'verdict'
+    """
+    return {
+        "english": render_verdict(verdict, "en"),
+        "thai": render_verdict(verdict, "th"),
+        "claimable": verdict["claimable"],
+        "verdict": verdict,
+    }
@@ -5,16 +5,21 @@ This module handles the extraction of frames from videos and their analysis.
 """
 
 import os
+import asyncio
 import base64
-import tempfile
 import cv2
 import ffmpeg
-import shutil
 import logging
-from typing import List, Dict, Any
+import threading
+import subprocess
+import numpy as np
+from collections import deque
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
 
 # Import from our utilities
 from utils.prompts import NEW_PROMPT
+from utils.image_preprocess import VISION_BUDGETS, budget_scale, estimate_vision_tokens
+from utils.keyframe_selection import candidate_count, candidate_indices, select_keyframes
 from utils.story_generation import (
     generate_story_from_multiple_images,
     generate_story_from_video
@@ -23,10 +28,25 @@ from utils.story_generation import (
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def extract_frames_and_analyze_video(video_details: Dict[str, Any], user_prompt: str) -> Dict[str, str]:
+# Constants
+# Beyond this gap a forward seek (decode from the previous keyframe) beats grabbing
+# every frame; ~30 frames of 720p-1080p decode is about the cost of one seek
+VIDEO_SEEK_MIN_GAP_FRAMES = int(os.getenv("VIDEO_SEEK_MIN_GAP_FRAMES", "30"))
+# Vision tokens analyze_frames may spend on the frames of one video
+VIDEO_FRAME_TOKEN_BUDGET = int(os.getenv("VIDEO_FRAME_TOKEN_BUDGET", "8000"))
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "10"))
+# Short clips still get this many keyframe candidates, so the selector sees the whole clip
+VIDEO_MIN_CANDIDATES = 2 * VIDEO_MAX_FRAMES
+# ffmpeg is killed if frame extraction takes longer than this (e.g. a stalled decode)
+VIDEO_FFMPEG_TIMEOUT_SECONDS = float(os.getenv("VIDEO_FFMPEG_TIMEOUT_SECONDS", "120"))
+
+async def extract_frames_and_analyze_video(video_details: Dict[str, Any], user_prompt: str) -> Dict[str, str]:
     """
     Extract frames from video, analyze them and generate a story.
     
+    Probing and frame decoding are CPU/subprocess bound, so they run in a worker
+    thread to keep the event loop free for other requests.
+    
     Args:
         video_details: Dictionary containing video details
         user_prompt: Optional user prompt to guide the story generation
@@ -34,10 +54,60 @@ def extract_frames_and_analyze_video(video_details: Dict[str, Any], user_prompt:
     Returns:
         Dict with video details, story, and other metadata
     """
-    temp_dir = tempfile.mkdtemp()
     logger.info(f"Processing video: {video_details.get('filename')}")
     
     # Extract more detailed metadata using FFmpeg before attempting frame extraction
+    # (uploads are usually probed already while they are copied to disk)
+    if not video_details.get('width'):
+        await asyncio.to_thread(probe_video_metadata, video_details)
+    
+    # Videos larger than the frame budget (4K phone videos) are decoded by ffmpeg, which
+    # scales them down before any frame reaches this process; OpenCV only has full-size frames
+    width, height = video_details.get('width') or 0, video_details.get('height') or 0
+    if width and height and budget_scale(width, height, "video_frame") < 1.0:
+        extractors = (extract_frames_ffmpeg, extract_frames_opencv)
+    else:
+        extractors = (extract_frames_opencv, extract_frames_ffmpeg)
+    
+    # If the first extractor fails to extract any frames, try the other as fallback
+    frames = []
+    for extract in extractors:
+        frames = await asyncio.to_thread(extract, video_details, VIDEO_FRAME_TOKEN_BUDGET)
+        if frames:
+            break
+    
+    # If we have frames, convert them to base64 and analyze
+    frame_images = []
+    if frames:
+        try:
+            for frame in frames:
+                # Frames are BGR end to end and already fit the video frame budget
+                success, encoded_img = cv2.imencode('.jpg', frame)
+                if success:
+                    img_base64 = base64.b64encode(encoded_img).decode('utf-8')
+                    frame_images.append(img_base64)
+            
+            video_details['frame_count'] = len(frame_images)
+            return await analyze_frames(frame_images, video_details, user_prompt)
+            
+        except Exception as e:
+            logger.error(f"Error processing frames: {e}")
+            # Fall through to metadata-only analysis
+    
+    # If we couldn't extract any frames, generate a story based on metadata only
+    logger.warning("No frames could be extracted. Falling back to metadata-only analysis.")
+    result = video_details.copy()
+    story_result = await generate_story_from_video(video_details, user_prompt)
+    result.update(story_result)
+    return result
+
+def probe_video_metadata(video_details: Dict[str, Any]) -> None:
+    """
+    Populate video_details in place with stream metadata read by ffprobe.
+    
+    Args:
+        video_details: Dictionary containing video details (must include 'file_path')
+    """
     try:
         probe = ffmpeg.probe(video_details.get('file_path'))
         # Extract video stream info
@@ -60,6 +130,12 @@ def extract_frames_and_analyze_video(video_details: Dict[str, Any], user_prompt:
             if 'nb_frames' in video_stream:
                 video_details['total_frames'] = int(video_stream['nb_frames'])
             
+            # Phone videos are often stored sideways with a rotation that ffmpeg applies on decode
+            rotation = video_stream.get('tags', {}).get('rotate') or next(
+                (side_data['rotation'] for side_data in video_stream.get('side_data_list', []) if 'rotation' in side_data), 0
+            )
+            video_details['rotation'] = int(float(rotation))
+            
         # Check for audio streams
         audio_stream = next((stream for stream in probe['streams'] 
                            if stream['codec_type'] == 'audio'), None)
@@ -69,53 +145,46 @@ def extract_frames_and_analyze_video(video_details: Dict[str, Any], user_prompt:
             
     except Exception as e:
         logger.warning(f"Failed to extract detailed metadata with FFmpeg: {e}")
+
+def max_frames_for_budget(width: int, height: int, token_budget: int) -> int:
+    """
+    How many frames of the given size fit in a vision token budget.
     
-    frames = extract_frames_opencv(video_details)
-    
-    # If OpenCV failed to extract any frames, try with FFmpeg as fallback
-    if not frames:
-        frames = extract_frames_ffmpeg(video_details, temp_dir)
-    
-    # If we have frames, convert them to base64 and analyze
-    frame_images = []
-    if frames:
-        try:
-            for frame in frames:
-                # Convert to base64
-                success, encoded_img = cv2.imencode('.jpg', cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
-                if success:
-                    img_base64 = base64.b64encode(encoded_img).decode('utf-8')
-                    frame_images.append(img_base64)
-            
-            video_details['frame_count'] = len(frame_images)
-            result = analyze_frames(frame_images, video_details, user_prompt)
-            
-            # Clean up temporary files
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error processing frames: {e}")
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            # Fall through to metadata-only analysis
-    
-    # If we couldn't extract any frames, generate a story based on metadata only
-    logger.warning("No frames could be extracted. Falling back to metadata-only analysis.")
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    result = video_details.copy()
-    story_result = generate_story_from_video(video_details, user_prompt)
-    result.update(story_result)
-    return result
+    Args:
+        width: Frame width before fitting to the video frame budget
+        height: Frame height before fitting to the video frame budget
+        token_budget: Vision tokens available for the video's frames
+        
+    Returns:
+        Frame count between 1 and VIDEO_MAX_FRAMES
+    """
+    scale = budget_scale(width, height, "video_frame")
+    tokens = estimate_vision_tokens(int(width * scale), int(height * scale), VISION_BUDGETS["video_frame"]["detail"])
+    return max(1, min(VIDEO_MAX_FRAMES, token_budget // tokens))
+
+def _fit_to_budget(frames: Iterable[Tuple[int, np.ndarray]]) -> Iterator[Tuple[int, np.ndarray]]:
+    """Downscale decoded frames to the video frame budget as they arrive."""
+    for index, frame in frames:
+        height, width = frame.shape[:2]
+        scale = budget_scale(width, height, "video_frame")
+        if scale < 1.0:
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        yield index, frame
 
-def extract_frames_opencv(video_details: Dict[str, Any]) -> List[Any]:
+def extract_frames_opencv(video_details: Dict[str, Any], token_budget: int = VIDEO_FRAME_TOKEN_BUDGET) -> List[Any]:
     """
-    Extract frames from a video using OpenCV.
+    Extract keyframes from a video using OpenCV.
+    
+    Candidate frames are decoded in one forward pass, fitted to the video frame
+    budget and scored as they arrive (see utils/keyframe_selection.py); the
+    sharpest distinct frame of each scene is kept, up to what token_budget allows.
     
     Args:
-        video_details: Dictionary containing video metadata
+        video_details: Dictionary containing video metadata (selection stats are added under 'keyframes')
+        token_budget: Vision tokens available for the selected frames
         
     Returns:
-        List of extracted frames (empty if extraction failed)
+        List of extracted BGR frames (empty if extraction failed)
     """
     frames = []
     try:
@@ -137,18 +206,11 @@ def extract_frames_opencv(video_details: Dict[str, Any]) -> List[Any]:
             video_details['duration_seconds'] = duration
             video_details['duration'] = f"{int(duration // 60)}:{int(duration % 60):02d}"
         
-        # Extract frames - aim for 10 evenly spaced frames
         if frame_count > 0:
-            target_frames = min(10, frame_count)
-            frame_indices = [int(i * frame_count / target_frames) for i in range(target_frames)]
-            
-            for frame_idx in frame_indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-                ret, frame = cap.read()
-                if ret:
-                    # Convert from BGR to RGB
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    frames.append(frame_rgb)
+            width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            max_frames = max_frames_for_budget(width, height, token_budget)
+            candidates = read_frames_forward(cap, candidate_indices(frame_count, fps, VIDEO_MIN_CANDIDATES))
+            frames, video_details['keyframes'] = select_keyframes(_fit_to_budget(candidates), max_frames)
                     
         cap.release()
         logger.info(f"Successfully extracted {len(frames)} frames with OpenCV")
@@ -158,54 +220,129 @@ def extract_frames_opencv(video_details: Dict[str, Any]) -> List[Any]:
     
     return frames
 
-def extract_frames_ffmpeg(video_details: Dict[str, Any], temp_dir: str) -> List[Any]:
+def read_frames_forward(cap: "cv2.VideoCapture", frame_indices: List[int]) -> Iterator[Tuple[int, np.ndarray]]:
     """
-    Extract frames from a video using FFmpeg as a fallback method.
+    Read the given frames in one forward pass over an opened capture, yielding
+    each as soon as it is decoded.
+    
+    Short gaps between targets are skipped with grab(), which advances the
+    decoder without converting or copying the frame; a seek only pays off for
+    gaps longer than VIDEO_SEEK_MIN_GAP_FRAMES, since it restarts decoding at
+    the previous keyframe. The capture never moves backwards.
     
     Args:
-        video_details: Dictionary containing video metadata
-        temp_dir: Temporary directory to store extracted frames
+        cap: An opened cv2.VideoCapture positioned at the first frame
+        frame_indices: Ascending frame indices to keep
+        
+    Yields:
+        (frame index, BGR frame) pairs (fewer if the stream ends early)
+    """
+    position = 0  # Index of the next frame grab() would return
+    for target in frame_indices:
+        if target - position > VIDEO_SEEK_MIN_GAP_FRAMES:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = target
+        while position < target and cap.grab():
+            position += 1
+        if position < target or not cap.grab():
+            break  # Stream ended early
+        position += 1
+        ret, frame = cap.retrieve()
+        if ret:
+            yield target, frame
+
+def extract_frames_ffmpeg(video_details: Dict[str, Any], token_budget: int = VIDEO_FRAME_TOKEN_BUDGET) -> List[Any]:
+    """
+    Extract keyframes from a video using FFmpeg.
+    
+    A single ffmpeg process samples evenly spaced candidate frames (fps filter),
+    scales them to the video frame budget while decoding (scale filter) and pipes
+    them as raw BGR to stdout. Each frame is read straight into a budget-sized
+    NumPy array and scored by keyframe selection, so no full-resolution frame is
+    ever materialised in this process: one process spawn and one demux per video,
+    and no temporary files.
+    
+    Args:
+        video_details: Dictionary containing video metadata (probed size and duration)
+        token_budget: Vision tokens available for the selected frames
         
     Returns:
-        List of extracted frames (empty if extraction failed)
+        List of extracted BGR frames (empty if extraction failed)
     """
+    logger.info("Extracting frames with FFmpeg")
+    duration_sec = video_details.get('duration_seconds') or 0
+    width, height = video_details.get('width') or 0, video_details.get('height') or 0
+    if duration_sec <= 0 or width <= 0 or height <= 0:
+        logger.warning("Could not determine video duration or size for FFmpeg frame extraction")
+        return []
+    if abs(video_details.get('rotation', 0)) % 180 == 90:
+        width, height = height, width  # ffmpeg outputs the rotated (display) orientation
+
+    scale = budget_scale(width, height, "video_frame")
+    frame_shape = (max(1, int(height * scale)), max(1, int(width * scale)), 3)
+    count = candidate_count(duration_sec, VIDEO_MIN_CANDIDATES)
+    if video_details.get('total_frames'):
+        count = min(count, video_details['total_frames'])
     frames = []
-    logger.info("Falling back to FFmpeg for frame extraction")
     try:
-        # Create output directory for frames
-        frame_files = []
-        
-        # Calculate timestamps for 10 evenly distributed frames
-        if 'duration_seconds' in video_details and video_details['duration_seconds'] > 0:
-            duration_sec = video_details['duration_seconds']
-            timestamps = [i * duration_sec / 10 for i in range(10)]
-            
-            for i, timestamp in enumerate(timestamps):
-                out_file = os.path.join(temp_dir, f"frame_{i:03d}.jpg")
-                ffmpeg.input(video_details.get('file_path'), ss=timestamp).output(
-                    out_file, vframes=1, format='image2', vcodec='mjpeg'
-                ).overwrite_output().run(quiet=True, capture_stdout=True, capture_stderr=True)
-                
-                frame_files.append(out_file)
-                
-            # Read the extracted frames
-            for frame_file in frame_files:
-                if os.path.exists(frame_file) and os.path.getsize(frame_file) > 0:
-                    img = cv2.imread(frame_file)
-                    if img is not None:
-                        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                        frames.append(img_rgb)
-            
-            logger.info(f"Successfully extracted {len(frames)} frames with FFmpeg")
-        else:
-            logger.warning("Could not determine video duration for FFmpeg frame extraction")
-            
+        process = (
+            ffmpeg.input(video_details.get('file_path'))
+            .filter('fps', fps=f"{count / duration_sec:.6f}")
+            .filter('scale', frame_shape[1], frame_shape[0])
+            .output('pipe:', format='rawvideo', pix_fmt='bgr24', vframes=count)
+            .global_args('-nostdin', '-loglevel', 'error')
+            .run_async(pipe_stdout=True, pipe_stderr=True)
+        )
+        # Drain stderr alongside stdout: a corrupt upload logs an error per frame, and a
+        # full stderr pipe would block ffmpeg (and this thread reading stdout) forever
+        stderr_tail: deque = deque(maxlen=5)  # Last lines, for the error message
+        drain = threading.Thread(target=lambda: stderr_tail.extend(iter(process.stderr.readline, b'')), daemon=True)
+        drain.start()
+        watchdog = threading.Timer(VIDEO_FFMPEG_TIMEOUT_SECONDS, process.kill)
+        watchdog.start()
+        try:
+            frames, video_details['keyframes'] = select_keyframes(
+                _read_pipe_frames(process.stdout, count, frame_shape), max_frames_for_budget(width, height, token_budget)
+            )
+        finally:
+            watchdog.cancel()
+            process.stdout.close()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            drain.join()
+        if process.returncode != 0 and not frames:
+            stderr = b''.join(stderr_tail).decode('utf-8', errors='replace').strip()
+            raise RuntimeError(stderr or f"ffmpeg exited with {process.returncode}")
+        logger.info(f"Successfully extracted {len(frames)} frames with FFmpeg")
     except Exception as e:
-        logger.error(f"FFmpeg frame extraction also failed: {e}")
+        logger.error(f"FFmpeg frame extraction failed: {e}")
+        return []
         
     return frames
 
-def analyze_frames(frame_images: List[str], video_details: Dict[str, Any], user_prompt: str) -> Dict[str, str]:
+def _read_pipe_frames(stream: Any, count: int, frame_shape: Tuple[int, int, int]) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield up to count raw BGR frames of the given shape from a pipe, one array per frame."""
+    for index in range(count):
+        frame = np.empty(frame_shape, dtype=np.uint8)
+        if not _read_exactly(stream, frame):
+            return
+        yield index, frame
+
+def _read_exactly(stream: Any, frame: np.ndarray) -> bool:
+    """Fill a preallocated frame from a pipe; False if the stream ends first."""
+    view = memoryview(frame).cast('B')
+    filled = 0
+    while filled < len(view):
+        read = stream.readinto(view[filled:])
+        if not read:
+            return False
+        filled += read
+    return True
+
+async def analyze_frames(frame_images: List[str], video_details: Dict[str, Any], user_prompt: str) -> Dict[str, str]:
     """
     Analyzes video frames and generates a story based on the content of those frames.
     
@@ -225,8 +362,9 @@ def analyze_frames(frame_images: List[str], video_details: Dict[str, Any], user_
     try:
         # Reuse the multiple images story generation function as it already handles
         # multiple base64-encoded images, which is what our frames are
-        story_result = generate_story_from_multiple_images(frame_images, 
-        NEW_PROMPT)
+        story_result = await generate_story_from_multiple_images(
+            frame_images, NEW_PROMPT, detail=VISION_BUDGETS["video_frame"]["detail"]
+        )
         
         # Log the token usage for debugging
         logger.info(f"Token usage for frame analysis - Input: {story_result.get('input_tokens', 0)}, "
@@ -239,7 +377,7 @@ def analyze_frames(frame_images: List[str], video_details: Dict[str, Any], user_
     except Exception as e:
         logger.error(f"Error in analyze_frames function: {e}")
         # Fall back to metadata-only analysis if frame analysis fails
-        fallback_result = generate_story_from_video(video_details, user_prompt)
+        fallback_result = await generate_story_from_video(video_details, user_prompt)
         
         # Log the fallback token usage for debugging
         logger.info(f"Fallback token usage - Input: {fallback_result.get('input_tokens', 0)}, "
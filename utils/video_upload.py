@@ -0,0 +1,97 @@
+"""
+Video Upload Utility Module
+
+This module copies an uploaded video to a scratch file for frame extraction.
+The upload is copied in fixed-size chunks, so memory stays bounded by the chunk
+size instead of the video size, and the size limit is enforced as bytes arrive
+(the declared upload size is not always known). MP4 metadata lives in the
+'moov' box; top-level boxes are tracked while writing, and as soon as moov is
+on disk (first in "fast start" files) ffprobe runs alongside the rest of the copy.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+from fastapi import UploadFile
+
+# Import from our utilities
+from utils.media_validation import MAX_VIDEO_SIZE_MB, MB, video_too_large
+from utils.video_processing import probe_video_metadata
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+VIDEO_UPLOAD_CHUNK_SIZE = int(os.getenv("VIDEO_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1MB
+
+class MoovLocator:
+    """Finds where the top-level MP4 'moov' box ends while the file is written in chunks."""
+
+    def __init__(self):
+        self.box_start = 0  # Offset of the next top-level box
+        self.header = b""  # Header bytes of that box seen so far
+        self.moov_end: Optional[int] = None
+        self.done = False
+
+    def feed(self, offset: int, chunk: bytes) -> None:
+        """Scan the box headers in a chunk written at the given offset."""
+        end = offset + len(chunk)
+        while not self.done and self.box_start + len(self.header) < end:
+            position = self.box_start + len(self.header) - offset
+            self.header += chunk[position:position + 16 - len(self.header)]
+            if len(self.header) < 8:
+                return  # Header continues in the next chunk
+            size = int.from_bytes(self.header[:4], "big")
+            if size == 1:  # 64-bit size follows the type
+                if len(self.header) < 16:
+                    return
+                size = int.from_bytes(self.header[8:16], "big")
+            if size < 8:
+                self.done = True  # Box runs to the end of the file, or not an MP4
+            elif self.header[4:8] == b"moov":
+                self.moov_end = self.box_start + size
+                self.done = True
+            else:
+                self.box_start += size
+                self.header = b""
+
+async def receive_video(video_file: UploadFile, video_details: Dict[str, Any]) -> None:
+    """
+    Copy an uploaded video to video_details['file_path'] and probe its metadata.
+
+    Args:
+        video_file: The uploaded video (its position is reset to 0 afterwards)
+        video_details: Dictionary containing video details; 'size' is set to the
+            bytes received and the probed metadata is added
+
+    Raises:
+        HTTPException: 413 if the video exceeds MAX_VIDEO_SIZE_MB
+    """
+    locator = MoovLocator()
+    probe_task = None
+    received = 0
+    await video_file.seek(0)
+    try:
+        with open(video_details["file_path"], "wb") as scratch:
+            while chunk := await video_file.read(VIDEO_UPLOAD_CHUNK_SIZE):
+                if received + len(chunk) > MAX_VIDEO_SIZE_MB * MB:
+                    raise video_too_large()
+                scratch.write(chunk)
+                locator.feed(received, chunk)
+                received += len(chunk)
+                if probe_task is None and locator.moov_end is not None and received >= locator.moov_end:
+                    scratch.flush()
+                    logger.info(f"moov box received after {received} bytes; probing while the upload is copied")
+                    probe_task = asyncio.create_task(asyncio.to_thread(probe_video_metadata, video_details))
+        video_details["size"] = received
+        if probe_task is not None:
+            await probe_task
+        # moov at the end of the file (or a failed early probe): probe the complete file
+        if not video_details.get("width"):
+            await asyncio.to_thread(probe_video_metadata, video_details)
+    finally:
+        await video_file.seek(0)
+        if probe_task is not None and not probe_task.done():
+            # Let the probe thread finish before the caller removes the scratch file
+            await asyncio.gather(probe_task, return_exceptions=True)